@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bus import Bus
+from ticket_table import TicketTable
+from trips import bus_trip_key, ticket_trip_key
+
+# Running totals are kept per route, per departure hour and per trip (a bus
+# on one travel date); per-bus figures are summed from the trips.
+DIMENSIONS = ("route", "hour", "trip")
+
+
+def departure_hour(departure_time: str) -> int:
+    try:
+        return int(departure_time.split(":")[0]) % 24
+    except ValueError:
+        return 0
+
+
+def sales_keys(ticket: Dict[str, Any]) -> Tuple[str, str, str]:
+    return (
+        ticket["origin"] + "|" + ticket["destination"],
+        str(departure_hour(ticket["departure_time"])),
+        ticket_trip_key(ticket) + "|" + (ticket.get("travel_date") or ""),
+    )
+
+
+class SalesTotals:
+    """Tickets, seats and revenue summed per route, hour and trip.
+
+    Stores keep one of these current as tickets are booked and cancelled,
+    so reports never rescan the ticket history. ``totals`` is plain JSON:
+    ``{dimension: {key: [tickets, seats, revenue]}}``.
+    """
+
+    def __init__(self, totals: Optional[Dict[str, Dict[str, List[int]]]] = None):
+        self.totals = totals if totals is not None else {}
+        for dimension in DIMENSIONS:
+            self.totals.setdefault(dimension, {})
+
+    def add(self, ticket: Dict[str, Any], sign: int = 1) -> None:
+        seats = int(ticket["seat_count"]) * sign
+        revenue = int(ticket["price_paid"]) * sign
+        for dimension, key in zip(DIMENSIONS, sales_keys(ticket)):
+            group = self.totals[dimension]
+            row = group.setdefault(key, [0, 0, 0])
+            row[0] += sign
+            row[1] += seats
+            row[2] += revenue
+            if row[0] <= 0:
+                del group[key]
+
+    def remove(self, ticket: Dict[str, Any]) -> None:
+        self.add(ticket, -1)
+
+    def to_dict(self) -> Dict[str, Dict[str, List[int]]]:
+        return {d: {k: list(v) for k, v in g.items()} for d, g in self.totals.items()}
+
+    @classmethod
+    def from_table(cls, table: TicketTable) -> "SalesTotals":
+        """Totals for a whole ticket history in one pass over its columns."""
+        strings = table.strings
+        pooled = {name: table.column(name) for name in _TRIP_COLUMNS}
+        seats = table.column("seat_count")
+        revenue = table.column("price_paid")
+        hour_of = [departure_hour(s) for s in strings]
+        np = _numpy()
+        if np is not None:
+            hours = np.array(hour_of, dtype=np.intc)[
+                _np_column(pooled["departure_time"])
+            ]
+        else:
+            hours = [hour_of[i] for i in pooled["departure_time"]]
+        totals = cls()
+        groups = (
+            ("route", [pooled["origin"], pooled["destination"]]),
+            ("hour", [hours]),
+            ("trip", [pooled[name] for name in _TRIP_COLUMNS]),
+        )
+        for dimension, columns in groups:
+            for key, row in _group_sums(columns, seats, revenue).items():
+                if dimension == "hour":
+                    name = str(key[0])
+                else:
+                    name = "|".join(strings[i] for i in key)
+                totals.totals[dimension][name] = row
+        return totals
+
+
+_TRIP_COLUMNS = ("bus_name", "origin", "destination", "departure_time", "travel_date")
+
+
+def _numpy() -> Any:
+    # Imported on first use rather than with this module, which every start
+    # loads; only rebuilding totals from a whole history needs it.
+    try:
+        import numpy
+    except ImportError:  # NumPy is optional; the same sums run in plain Python.
+        return None
+    return numpy
+
+
+def _np_column(column: Any) -> Any:
+    # TicketTable columns are arrays ("i" pooled indexes, "q" numbers), which
+    # NumPy can view without copying.
+    np = _numpy()
+    return np.frombuffer(column, dtype=np.intc if column.typecode == "i" else np.int64)
+
+
+def _group_sums(
+    keys: Sequence[Any], seats: Any, revenue: Any
+) -> Dict[Tuple[int, ...], List[int]]:
+    """[tickets, seats, revenue] per distinct combination of key columns."""
+    if not len(seats):
+        return {}
+    np = _numpy()
+    if np is not None:
+        columns = [k if isinstance(k, np.ndarray) else _np_column(k) for k in keys]
+        # Fold the key columns into one dense code, one column at a time, so
+        # grouping is a 1-D sort rather than a row-wise unique.
+        codes = np.zeros(len(seats), dtype=np.int64)
+        for column in columns:
+            codes = codes * (int(column.max()) + 1) + column
+            _, codes = np.unique(codes, return_inverse=True)
+        codes = codes.reshape(-1)
+        _, first = np.unique(codes, return_index=True)
+        counts = np.bincount(codes)
+        seat_sums = np.bincount(codes, weights=_np_column(seats))
+        revenue_sums = np.bincount(codes, weights=_np_column(revenue))
+        return {
+            tuple(int(column[row]) for column in columns): [int(c), int(s), int(r)]
+            for row, c, s, r in zip(first, counts, seat_sums, revenue_sums)
+        }
+    sums: Dict[Tuple[int, ...], List[int]] = {}
+    for key, s, r in zip(zip(*keys), seats, revenue):
+        row = sums.get(key)
+        if row is None:
+            sums[key] = [1, s, r]
+        else:
+            row[0] += 1
+            row[1] += s
+            row[2] += r
+    return sums
+
+
+@dataclass
+class RouteSales:
+    origin: str
+    destination: str
+    tickets: int
+    seats: int
+    revenue: int
+
+
+@dataclass
+class BusLoad:
+    bus_name: str
+    origin: str
+    destination: str
+    departure_time: str
+    departures: int
+    seats_sold: int
+    load_factor: float
+
+
+@dataclass
+class HourSales:
+    hour: int
+    tickets: int
+    seats: int
+    revenue: int
+
+
+class SalesReport:
+    """Management figures from a store's running totals.
+
+    A bus's load factor is the share of seats sold on the departures that
+    sold at least one ticket (an undated bus counts as one departure).
+    """
+
+    def __init__(self, totals: SalesTotals, buses: Iterable[Bus]) -> None:
+        self.totals = totals
+        self.buses = list(buses)
+
+    def revenue_by_route(self) -> List[RouteSales]:
+        routes = []
+        for key, (tickets, seats, revenue) in self.totals.totals["route"].items():
+            origin, destination = key.split("|", 1)
+            routes.append(RouteSales(origin, destination, tickets, seats, revenue))
+        routes.sort(key=lambda r: (-r.revenue, r.origin, r.destination))
+        return routes
+
+    def load_factor_by_bus(self) -> List[BusLoad]:
+        by_bus: Dict[str, List[int]] = {}
+        for key, (_, seats, _) in self.totals.totals["trip"].items():
+            row = by_bus.setdefault(key.rsplit("|", 1)[0], [0, 0])
+            row[0] += 1
+            row[1] += seats
+        loads = []
+        for bus in self.buses:
+            departures, sold = by_bus.get(bus_trip_key(bus), (0, 0))
+            capacity = departures * bus.total_seats
+            loads.append(
+                BusLoad(
+                    bus.name,
+                    bus.origin,
+                    bus.destination,
+                    bus.departure_time,
+                    departures,
+                    sold,
+                    sold / capacity if capacity else 0.0,
+                )
+            )
+        return loads
+
+    def bookings_by_hour(self) -> List[HourSales]:
+        hours = self.totals.totals["hour"]
+        return [HourSales(h, *hours.get(str(h), (0, 0, 0))) for h in range(24)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "revenue_by_route": [asdict(r) for r in self.revenue_by_route()],
+            "load_factor_by_bus": [asdict(b) for b in self.load_factor_by_bus()],
+            "bookings_by_hour": [asdict(h) for h in self.bookings_by_hour()],
+        }
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+# (metric, True if bigger is better)
+_METRICS = (
+    ("throughput", True),
+    ("peak_rss_kb", False),
+    ("disk_bytes", False),
+)
+_OP_METRICS = (("p50_ms", False), ("p99_ms", False))
+
+
+def _run_key(run: Dict[str, Any]) -> Tuple:
+    return (run["backend"], run["buses"], run["tickets"], run["clients"], run["mix"])
+
+
+def _load(path: str) -> Dict[Tuple, Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return {_run_key(run): run for run in json.load(f)["runs"]}
+
+
+def _metrics(run: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    values = {name: (run[name], better) for name, better in _METRICS}
+    for op, stats in run["operations"].items():
+        for name, better in _OP_METRICS:
+            values[f"{op} {name}"] = (stats[name], better)
+    return values
+
+
+def compare(
+    before: Dict[Tuple, Dict[str, Any]],
+    after: Dict[Tuple, Dict[str, Any]],
+    threshold: float,
+) -> List[str]:
+    """Print every shared metric's change and return the regressions, the
+    changes for the worse by more than ``threshold`` (a fraction)."""
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        label = "{} {}:{} x{} [{}]".format(*key)
+        print(label)
+        old, new = _metrics(before[key]), _metrics(after[key])
+        for name in sorted(old.keys() & new.keys()):
+            (a, better), (b, _) = old[name], new[name]
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            print(f"  {name:>16} {a:>14.3f} {b:>14.3f} {change:>+8.1%} {flag}")
+            if flag:
+                regressions.append(f"{label} {name} {change:+.1%}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmarks.load result files."
+    )
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="flag changes for the worse above this fraction (default 0.1)",
+    )
+    args = parser.parse_args()
+    regressions = compare(_load(args.before), _load(args.after), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
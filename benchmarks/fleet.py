@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+from typing import Iterator, List
+
+from booking_system import DataStore, demo_buses
+from bus import Bus
+from ticket import Ticket
+
+_OPERATORS = sorted({b.name for b in demo_buses()})
+_FIRST_NAMES = [
+    "Abdul", "Amina", "Farhan", "Fatema", "Habib", "Jannat", "Karim", "Lima",
+    "Mahmud", "Nasrin", "Rafiq", "Rumana", "Sabbir", "Shirin", "Tanvir", "Yasmin",
+]  # fmt: skip
+_LAST_NAMES = [
+    "Ahmed", "Akter", "Begum", "Chowdhury", "Hasan", "Hossain", "Islam", "Khan",
+    "Miah", "Rahman", "Sarkar", "Uddin",
+]  # fmt: skip
+
+
+def make_fleet(size: int, seed: int = 0) -> List[Bus]:
+    """The demo schedule for small sizes; beyond it, ``size`` synthetic buses
+    over about sqrt(size) cities, the same for a given seed."""
+    demo = demo_buses()
+    if size <= len(demo):
+        return demo[:size]
+    rng = random.Random(seed)
+    cities = sorted({b.origin for b in demo} | {b.destination for b in demo})
+    cities += [f"Town {i}" for i in range(max(0, int(size**0.5) - len(cities)))]
+    buses = demo
+    for i in range(len(demo), size):
+        origin, destination = rng.sample(cities, 2)
+        hour, minute = rng.randrange(24), rng.choice((0, 15, 30, 45))
+        buses.append(
+            Bus(
+                name=f"{rng.choice(_OPERATORS)} {i}",
+                origin=origin,
+                destination=destination,
+                departure_time=f"{hour:02d}:{minute:02d}",
+                total_seats=rng.choice((36, 40, 40, 40, 52)),
+                price_per_ticket=rng.randrange(40, 200) * 10,
+            )
+        )
+    return buses
+
+
+def passenger(rng: random.Random) -> str:
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+
+def contact(rng: random.Random) -> str:
+    return f"01{rng.randrange(3, 10)}{rng.randrange(10**8):08d}"
+
+
+def make_history(
+    buses: List[Bus], count: int, first_id: int = 1, seed: int = 0
+) -> Iterator[Ticket]:
+    """``count`` past tickets on random buses, generated lazily so a large
+    history never sits in memory at once."""
+    rng = random.Random(seed)
+    today = date.today()
+    for ticket_id in range(first_id, first_id + count):
+        bus = rng.choice(buses)
+        seat_count = rng.choice((1, 1, 1, 2, 2, 3, 4))
+        start = rng.randrange(1, bus.total_seats - seat_count + 2)
+        yield Ticket(
+            ticket_id=ticket_id,
+            bus_id=bus.name,
+            passenger_name=passenger(rng),
+            contact_number=contact(rng),
+            bus_name=bus.name,
+            origin=bus.origin,
+            destination=bus.destination,
+            departure_time=bus.departure_time,
+            seat_count=seat_count,
+            price_paid=seat_count * bus.price_per_ticket,
+            travel_date=(today - timedelta(days=rng.randrange(1, 730))).isoformat(),
+            seats=range(start, start + seat_count),
+        )
+
+
+def seed_store(store: DataStore, buses: int, tickets: int, seed: int = 0) -> None:
+    """Fill an empty store with a fleet and a ticket history."""
+    fleet = make_fleet(buses, seed)
+    # Reserve the history's IDs first so new bookings are numbered after it.
+    first_id = store.allocate_ticket_ids(tickets)
+    store.save_buses(fleet)
+    store.save_tickets(make_history(fleet, tickets, first_id, seed))
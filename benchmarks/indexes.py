@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks.fleet import seed_store
+from benchmarks.load import store_path
+from booking_system import STORE_BACKENDS, BookingSystem, DataStore, make_store
+from bus import Bus
+
+
+class _MemoryStore(DataStore):
+    # Keeps persistence out of the measurement so only index cost is timed;
+    # lookups and searches never reach the store.
+    def _ensure_file(self) -> None:
+        self._data: Dict = {"buses": [], "next_ticket_id": 1}
+
+    def _read(self, keys: Optional[Tuple[str, ...]] = None) -> Dict:
+        return self._data
+
+    def _write(self, data: Dict) -> None:
+        self._data = data
+
+    def save_buses(self, buses: List[Bus]) -> None:
+        pass
+
+
+def _make_buses(count: int) -> List[Bus]:
+    cities = [f"City {i}" for i in range(max(2, int(count**0.5)))]
+    rng = random.Random(count)
+    return [
+        Bus(
+            name=f"Bus {i}",
+            origin=rng.choice(cities),
+            destination=rng.choice(cities),
+            departure_time=f"{i % 24:02d}:00",
+            total_seats=40,
+            price_per_ticket=500 + i % 1000,
+            available_seats=20,
+        )
+        for i in range(count)
+    ]
+
+
+def _median_us(op: Callable[[int], object], keys: Sequence[int]) -> float:
+    samples = []
+    for k in keys:
+        start = time.perf_counter()
+        op(k)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6
+
+
+def _new_system() -> BookingSystem:
+    path = os.path.join(tempfile.mkdtemp(), "bench.json")
+    return BookingSystem(_MemoryStore(path))
+
+
+def bench_buses(sizes: Sequence[int], ops: int) -> None:
+    print(f"{'buses':>10} {'lookup us':>10} {'search us':>10}")
+    for size in sizes:
+        system = _new_system()
+        system.buses = _make_buses(size)
+        rng = random.Random(0)
+        keys = [rng.randrange(size) for _ in range(ops)]
+        lookup = _median_us(lambda k: system.get_bus_by_name(f"bus {k}"), keys)
+        routes = [(b.origin, b.destination) for b in system.buses]
+        search = _median_us(lambda k: system.search_buses(*routes[k]), keys)
+        print(f"{size:>10} {lookup:>10.2f} {search:>10.2f}")
+
+
+def bench_tickets(sizes: Sequence[int], backends: Sequence[str], ops: int) -> None:
+    # Cancels go through the real store: finding the ticket and writing its
+    # removal is most of the cost once the history is large.
+    print(f"{'backend':>8} {'tickets':>10} {'cancel ms':>10}")
+    for backend in backends:
+        for size in sizes:
+            directory = tempfile.mkdtemp(prefix="bus-bench-")
+            try:
+                store = make_store(backend, store_path(directory, backend))
+                seed_store(store, 24, size)
+                system = BookingSystem(store)
+                rng = random.Random(0)
+                keys = rng.sample(range(1, size + 1), min(ops, size))
+                cancel = _median_us(system.cancel_ticket, keys) / 1000
+                close = getattr(store, "close", None)
+                if close:
+                    close()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            print(f"{backend:>8} {size:>10} {cancel:>10.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Lookup, search and cancel latency as the fleet grows."
+    )
+    parser.add_argument(
+        "--buses", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000]
+    )
+    parser.add_argument(
+        "--tickets", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--backend", choices=STORE_BACKENDS, nargs="+", default=list(STORE_BACKENDS)
+    )
+    parser.add_argument("--ops", type=int, default=1_000)
+    parser.add_argument(
+        "--cancels", type=int, default=100, help="cancellations per ticket count"
+    )
+    args = parser.parse_args()
+    bench_buses(args.buses, args.ops)
+    bench_tickets(args.tickets, args.backend, args.cancels)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fleet import contact, passenger, seed_store
+from booking_system import STORE_BACKENDS, BookingRequest, BookingSystem, make_store
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported.
+    resource = None
+
+OPERATIONS = ("search", "book", "cancel", "lookup")
+DEFAULT_MIX = "search=70,book=20,cancel=8,lookup=2"
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}")
+        mix[name] = int(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError("Mix needs a positive weight")
+    return mix
+
+
+def parse_scale(text: str) -> Tuple[int, int]:
+    buses, _, tickets = text.partition(":")
+    return int(buses), int(tickets or 0)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    # Nearest rank on sorted samples.
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, math.ceil(p / 100 * len(samples)) - 1))]
+
+
+def store_path(directory: str, backend: str) -> str:
+    return os.path.join(directory, "bench.db" if backend == "sqlite" else "bench.json")
+
+
+def disk_usage(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _Client:
+    """One simulated user: a thread running its share of the mix and timing
+    each call. Cancellations and lookups use the client's own bookings."""
+
+    def __init__(self, system: BookingSystem, seed: int, mix: Dict[str, int]):
+        self.system = system
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.booked: List[Tuple[int, str]] = []
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Dict[str, int] = {op: 0 for op in OPERATIONS}
+        today = date.today()
+        self.days = [
+            (today + timedelta(days=d)).isoformat()
+            for d in range(1, system.horizon_days + 1)
+        ]
+
+    def run(self, count: int, start: threading.Barrier) -> None:
+        ops: Dict[str, Callable[[], bool]] = {
+            "search": self.search,
+            "book": self.book,
+            "cancel": self.cancel,
+            "lookup": self.lookup,
+        }
+        choices = self.rng.choices(self.names, self.weights, k=count)
+        start.wait()
+        for name in choices:
+            if name in ("cancel", "lookup") and not self.booked:
+                name = "book"
+            began = time.perf_counter()
+            ok = ops[name]()
+            self.latencies[name].append(time.perf_counter() - began)
+            if not ok:
+                self.errors[name] += 1
+
+    def search(self) -> bool:
+        bus = self.rng.choice(self.system.buses)
+        if self.rng.random() < 0.5:
+            return bool(self.system.search_buses(bus.origin, bus.destination))
+        # As-you-type: a few letters of each end.
+        return bool(
+            self.system.search_routes(
+                bus.origin[: self.rng.randrange(1, 4)],
+                bus.destination[: self.rng.randrange(0, 4)],
+            )
+        )
+
+    def book(self) -> bool:
+        bus = self.rng.choice(self.system.buses)
+        request = BookingRequest(
+            bus.name,
+            passenger(self.rng),
+            contact(self.rng),
+            self.rng.choice((1, 1, 1, 2, 2, 3, 4)),
+            travel_date=self.rng.choice(self.days),
+            origin=bus.origin,
+            destination=bus.destination,
+        )
+        (result,) = self.system.book_many([request])
+        if result.ticket is None:
+            return False
+        self.booked.append((result.ticket.ticket_id, request.contact))
+        return True
+
+    def cancel(self) -> bool:
+        i = self.rng.randrange(len(self.booked))
+        self.booked[i], self.booked[-1] = self.booked[-1], self.booked[i]
+        ticket_id, _ = self.booked.pop()
+        return self.system.cancel_ticket(ticket_id)
+
+    def lookup(self) -> bool:
+        _, number = self.rng.choice(self.booked)
+        return bool(self.system.find_tickets(contact=number, limit=10))
+
+
+def run_workload(
+    system: BookingSystem, clients: int, ops: int, mix: Dict[str, int], seed: int = 0
+) -> Dict[str, Any]:
+    """Run ``ops`` operations split across ``clients`` threads sharing one
+    system, the way the HTTP service runs requests on its executor."""
+    workers = [_Client(system, seed + i, mix) for i in range(clients)]
+    start = threading.Barrier(clients + 1)
+    threads = [
+        threading.Thread(
+            target=w.run, args=(ops // clients + (i < ops % clients), start)
+        )
+        for i, w in enumerate(workers)
+    ]
+    for t in threads:
+        t.start()
+    start.wait()
+    began = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - began
+    summary = {}
+    for op in OPERATIONS:
+        samples = sorted(s for w in workers for s in w.latencies[op])
+        if not samples:
+            continue
+        summary[op] = {
+            "count": len(samples),
+            "errors": sum(w.errors[op] for w in workers),
+            "p50_ms": percentile(samples, 50) * 1e3,
+            "p99_ms": percentile(samples, 99) * 1e3,
+        }
+    done = sum(s["count"] for s in summary.values())
+    return {
+        "wall_seconds": wall,
+        "throughput": done / wall if wall else 0.0,
+        "operations": summary,
+    }
+
+
+def _worker(config: Dict[str, Any]) -> Dict[str, Any]:
+    # Runs in its own process so peak RSS belongs to this configuration.
+    began = time.perf_counter()
+    store = make_store(config["backend"], config["path"])
+    system = BookingSystem(store)
+    opened = time.perf_counter() - began
+    result = run_workload(
+        system,
+        config["clients"],
+        config["ops"],
+        parse_mix(config["mix"]),
+        config["seed"],
+    )
+    result["open_seconds"] = opened
+    result["peak_rss_kb"] = peak_rss_kb()
+    close = getattr(store, "close", None)
+    if close:
+        close()
+    return result
+
+
+def run_config(
+    backend: str,
+    buses: int,
+    tickets: int,
+    clients: int,
+    ops: int,
+    mix: str,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Seed a fresh store in a temporary directory, then measure it from a
+    separate process."""
+    directory = tempfile.mkdtemp(prefix="bus-bench-")
+    try:
+        path = store_path(directory, backend)
+        began = time.perf_counter()
+        store = make_store(backend, path)
+        seed_store(store, buses, tickets, seed)
+        close = getattr(store, "close", None)
+        if close:
+            close()
+        seeded = time.perf_counter() - began
+        config = {
+            "backend": backend,
+            "path": path,
+            "clients": clients,
+            "ops": ops,
+            "mix": mix,
+            "seed": seed,
+        }
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.load", "--worker", json.dumps(config)],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        result.update(
+            backend=backend,
+            buses=buses,
+            tickets=tickets,
+            clients=clients,
+            ops=ops,
+            mix=mix,
+            seed_seconds=seeded,
+            disk_bytes=disk_usage(directory),
+        )
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": date.today().isoformat(),
+    }
+
+
+def print_run(run: Dict[str, Any]) -> None:
+    rss = run["peak_rss_kb"]
+    print(
+        f"{run['backend']:>8} {run['buses']:>8} {run['tickets']:>10} "
+        f"{run['clients']:>3} {run['throughput']:>9.0f} "
+        f"{(rss or 0) / 1024:>8.1f} {run['disk_bytes'] / 2**20:>9.1f}"
+    )
+    for op, stats in run["operations"].items():
+        print(
+            f"{'':>12}{op:>8} n={stats['count']:<7} errors={stats['errors']:<5} "
+            f"p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Throughput, latency, memory and disk use under a mixed load."
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--backend", choices=STORE_BACKENDS, nargs="+", default=list(STORE_BACKENDS)
+    )
+    parser.add_argument(
+        "--scale",
+        type=parse_scale,
+        nargs="+",
+        default=[(24, 1_000), (1_000, 100_000)],
+        metavar="BUSES:TICKETS",
+    )
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--ops", type=int, default=2_000)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(_worker(json.loads(args.worker))))
+        return
+    parse_mix(args.mix)
+    runs = []
+    print(
+        f"{'backend':>8} {'buses':>8} {'tickets':>10} {'cl':>3} {'ops/s':>9} "
+        f"{'rss MiB':>8} {'disk MiB':>9}"
+    )
+    for buses, tickets in args.scale:
+        for backend in args.backend:
+            for clients in args.clients:
+                run = run_config(
+                    backend, buses, tickets, clients, args.ops, args.mix, args.seed
+                )
+                print_run(run)
+                runs.append(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
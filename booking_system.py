@@ -1,173 +1,1871 @@
 from __future__ import annotations
 
+import copy
 import json
 import os
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+from analytics import SalesReport, SalesTotals
 from bus import Bus
+from file_lock import FileLock
+from holds import HoldExpiryQueue, SeatHold
+from id_allocator import TicketIdAllocator
+from metrics import Metrics, timed
+from planner import OPTIMIZE_CHOICES, Itinerary, JourneyPlanner
+from query_cache import QueryCache
+from route_index import RouteIndex
+from seat_map import (
+    SEAT_PREFERENCES,
+    count_seats,
+    decode_seats,
+    encode_seats,
+    full_mask,
+    pick_seats,
+    seat_bits,
+    seat_numbers,
+)
+from snapshot import StoreSnapshot, snapshot_source
 from ticket import Ticket
+from ticket_index import TicketIndex, contact_key
+from ticket_log import TicketLog
+from ticket_table import TicketTable
+from trips import (
+    Trip,
+    TripInventory,
+    bus_trip_key,
+    parse_travel_date,
+    release_trip,
+    take_trip_seats,
+    ticket_trip_key,
+    trip_key,
+)
+from waitlist import WaitlistEntry, WaitlistLog
 
 
 class DataStore:
+    # Stores that answer search/availability queries themselves set this so
+    # BookingSystem asks them instead of scanning its own bus list.
+    supports_queries = False
+
     def __init__(self, file_path: str = "data_store.json") -> None:
         self.file_path = file_path
-        self._ensure_file()
+        self.metrics = Metrics()
+        self._lock = FileLock(file_path + ".lock")
+        # Tickets live beside the JSON file as chunked JSON lines, so the
+        # file itself stays small and tickets can be streamed.
+        self._log = TicketLog(file_path + ".tickets")
+        self._snapshot_cache = StoreSnapshot(file_path + ".snapshot")
+        self._waitlist = WaitlistLog(file_path + ".waitlist")
+        # Contact/passenger lookups, built on the first find_tickets call.
+        self._index: Optional[TicketIndex] = None
+        self._index_lock = threading.Lock()
+        self._index_version: Tuple = ()
+        self._index_chunks: Dict[int, Tuple] = {}
+        with self._lock:
+            self._ensure_file()
+            self._move_tickets_to_log()
+            self._ensure_sales()
 
     def _ensure_file(self) -> None:
         if not os.path.exists(self.file_path):
-            self._write({"buses": [], "tickets": [], "next_ticket_id": 1})
+            self._write({"buses": [], "trips": {}, "next_ticket_id": 1})
+
+    def _move_tickets_to_log(self) -> None:
+        # Stores written before the ticket log kept tickets in the file.
+        if not self._has_key("tickets"):
+            return
+        data = self._read()
+        rows = {int(t["ticket_id"]): t for t in self._log}
+        rows.update((int(t["ticket_id"]), t) for t in data.pop("tickets"))
+        self._log.replace_all(rows.values())
+        self._write(data)
+
+    def _ensure_sales(self) -> None:
+        # Stores from before sales totals get them from one pass over the log.
+        if not self._has_key("sales"):
+            data = self._read()
+            data["sales"] = self._sales_from_log().totals
+            self._write(data)
+
+    def _sales_from_log(self) -> SalesTotals:
+        return SalesTotals.from_table(TicketTable.from_dicts(self._log))
 
-    def _read(self) -> Dict:
-        with open(self.file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+    def _read(self, keys: Optional[Tuple[str, ...]] = None) -> Dict:
+        """The file's contents; with ``keys``, possibly only those keys."""
+        with self.metrics.timer("store.read") as timer:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                # The snapshot is checked against the file actually opened.
+                source = snapshot_source(os.fstat(f.fileno()))
+                cached = self._snapshot_cache.load(source, keys)
+                if cached is not None:
+                    timer.add_bytes(cached[1])
+                    return cached[0]
+                text = f.read()
+            timer.add_bytes(len(text))
+            with self.metrics.timer("store.parse"):
+                data = json.loads(text)
+        self._snapshot_cache.save(data, source)
+        return data
+
+    def _has_key(self, key: str) -> bool:
+        # From the snapshot's index when it is current, otherwise through
+        # _read, which stores kept elsewhere than file_path override.
+        try:
+            keys = self._snapshot_cache.keys(snapshot_source(os.stat(self.file_path)))
+        except FileNotFoundError:
+            keys = None
+        if keys is None:
+            return key in self._read((key,))
+        return key in keys
 
     def _write(self, data: Dict) -> None:
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        # Serializing and writing are timed apart: on a large file either can
+        # dominate.
+        with self.metrics.timer("store.write") as timer:
+            with self.metrics.timer("store.serialize"):
+                text = json.dumps(data, indent=2)
+            timer.add_bytes(len(text))
+            # Write-then-rename so unlocked readers never see a half-written
+            # file.
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.file_path)
+        with self.metrics.timer("store.snapshot"):
+            self._snapshot_cache.save(data, snapshot_source(os.stat(self.file_path)))
+
+    def version(self) -> Tuple:
+        # Cheap change token: reload only when this differs from last time.
+        st = os.stat(self.file_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _bus_key(bus: Dict) -> Tuple[str, str, str, str]:
+        return (bus["name"], bus["origin"], bus["destination"], bus["departure_time"])
+
+    @classmethod
+    def _bus_map(cls, buses: List[Dict]) -> Dict[Tuple[str, str, str, str], Dict]:
+        index: Dict[Tuple[str, str, str, str], Dict] = {}
+        for b in buses:
+            index.setdefault(cls._bus_key(b), b)
+        return index
 
     def load_buses(self) -> List[Bus]:
-        data = self._read()
-        return [Bus.from_dict(b) for b in data.get("buses", [])]
+        data = self._read(("buses",))
+        return [Bus.from_dict(b, trusted=True) for b in data.get("buses", [])]
 
     def save_buses(self, buses: List[Bus]) -> None:
-        data = self._read()
-        data["buses"] = [b.to_dict() for b in buses]
-        self._write(data)
+        with self._lock:
+            data = self._read()
+            data["buses"] = [b.to_dict() for b in buses]
+            self._write(data)
 
     def load_tickets(self) -> List[Ticket]:
-        data = self._read()
-        return [Ticket.from_dict(t) for t in data.get("tickets", [])]
+        return list(self.iter_tickets())
 
-    def save_tickets(self, tickets: List[Ticket]) -> None:
-        data = self._read()
-        data["tickets"] = [t.to_dict() for t in tickets]
-        self._write(data)
+    def iter_tickets(
+        self, filter: Optional[Callable[[Ticket], bool]] = None, since: int = 0
+    ) -> Iterator[Ticket]:
+        """Tickets in ID order; with ``since``, only those with higher IDs."""
+        for row in self._log.rows_after(since):
+            ticket = Ticket.from_dict(row, trusted=True)
+            if filter is None or filter(ticket):
+                yield ticket
+
+    def find_ticket(self, ticket_id: int) -> Optional[Ticket]:
+        row = self._log.get(ticket_id)
+        return Ticket.from_dict(row, trusted=True) if row is not None else None
+
+    def load_ticket_table(self) -> TicketTable:
+        return TicketTable.from_dicts(self._log)
+
+    def find_tickets(
+        self, contact: str = "", passenger: str = "", limit: Optional[int] = None
+    ) -> List[Ticket]:
+        """Tickets for a contact number and/or a passenger name fragment."""
+        with self._index_lock:
+            index = self._ticket_index()
+            ids = index.find(contact, passenger)
+            return [index.table[i] for i in ids[:limit]]
+
+    def _ticket_index(self) -> TicketIndex:
+        # This store's own writes update the index in place; when the log
+        # moved on otherwise (another process), only chunks whose files
+        # changed are re-read.
+        version = self._log.version()
+        if self._index is None:
+            self._index = TicketIndex()
+        elif version == self._index_version:
+            return self._index
+        stats = self._log.chunk_stats()
+        size = self._log.chunk_size
+        for chunk in sorted(stats.keys() | self._index_chunks.keys()):
+            stat = stats.get(chunk)
+            if stat == self._index_chunks.get(chunk):
+                continue
+            self._index.remove_range(chunk * size, (chunk + 1) * size)
+            for row in self._log.chunk_rows(chunk):
+                self._index.add(row)
+            if stat is None:
+                del self._index_chunks[chunk]
+            else:
+                self._index_chunks[chunk] = stat
+        self._index_version = version
+        return self._index
+
+    def _update_index(
+        self, version: Tuple, added: Iterable[Dict], removed: Iterable[int]
+    ) -> None:
+        # Called under the file lock after a write; `version` is the log's
+        # version from before it. If the index was already behind, the next
+        # query rescans instead.
+        with self._index_lock:
+            if self._index is None or self._index_version != version:
+                return
+            chunks = set()
+            for ticket_id in removed:
+                self._index.remove(ticket_id)
+                chunks.add(self._log.chunk_of(ticket_id))
+            for row in added:
+                self._index.add(row)
+                chunks.add(self._log.chunk_of(int(row["ticket_id"])))
+            for chunk in chunks:
+                stat = self._log.chunk_stat(chunk)
+                if stat is None:
+                    self._index_chunks.pop(chunk, None)
+                else:
+                    self._index_chunks[chunk] = stat
+            self._index_version = self._log.version()
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> None:
+        with self._lock:
+            self._log.replace_all(t.to_dict() for t in tickets)
+            data = self._read()
+            data["sales"] = self._sales_from_log().totals
+            self._write(data)
+
+    def upsert_buses(self, buses: List[Bus]) -> List[Optional[str]]:
+        """Add buses, or update the fare and capacity of the stored bus with
+        the same name, route and departure time. One write for the batch."""
+        with self._lock:
+            data = self._read()
+            errors = _upsert_buses(
+                data.setdefault("buses", []), data.setdefault("trips", {}), buses
+            )
+            if None in errors:
+                self._write(data)
+        return errors
+
+    def import_tickets(self, tickets: List[Ticket]) -> List[Optional[str]]:
+        """Add tickets under their own IDs, e.g. from an export of another
+        store. One write for the batch."""
+        with self._lock:
+            data = self._read()
+            buses = self._bus_map(data.get("buses", []))
+            errors = _check_imports(
+                [(buses.get(_ticket_bus_key(t)), t) for t in tickets],
+                data.setdefault("trips", {}),
+                self._log.existing(t.ticket_id for t in tickets),
+            )
+            accepted = [t.to_dict() for t, e in zip(tickets, errors) if not e]
+            if accepted:
+                sales = SalesTotals(data.setdefault("sales", {}))
+                for row in accepted:
+                    sales.add(row)
+                data["next_ticket_id"] = max(
+                    int(data.get("next_ticket_id", 1)),
+                    max(row["ticket_id"] for row in accepted) + 1,
+                )
+                index_version = self._log.version()
+                self._write(data)
+                self._log.append(accepted)
+                self._update_index(index_version, accepted, ())
+        return errors
+
+    def load_waitlist(self) -> List[WaitlistEntry]:
+        with self._lock:
+            return self._waitlist.sync().entries()
+
+    def waitlist_head(
+        self, trip: str, travel_date: str, limit: int
+    ) -> List[WaitlistEntry]:
+        """The next ``limit`` entries to promote on one departure."""
+        with self._lock:
+            return self._waitlist.sync().head(trip, travel_date, limit)
+
+    def add_to_waitlist(self, entries: List[WaitlistEntry]) -> List[WaitlistEntry]:
+        """Queue entries, giving those with ``entry_id`` 0 a new ID."""
+        with self._lock:
+            return self._waitlist.add(entries)
+
+    def remove_from_waitlist(self, entry_ids: Iterable[int]) -> List[bool]:
+        """Dequeue entries; False for those no longer waiting."""
+        with self._lock:
+            return self._waitlist.remove(entry_ids)
+
+    def expire_waitlist(self, before: str) -> int:
+        """Drop entries for days before ``before``; their buses have left."""
+        with self._lock:
+            stale = [
+                e.entry_id
+                for e in self._waitlist.sync().entries()
+                if e.travel_date and e.travel_date < before
+            ]
+            return sum(self._waitlist.remove(stale))
+
+    def load_sales(self) -> SalesTotals:
+        return SalesTotals(self._read(("sales",)).get("sales"))
+
+    def load_trip_inventory(self, since: str = "") -> Dict[str, Dict[str, str]]:
+        trips = self._read(("trips",)).get("trips", {})
+        return {day: maps for day, maps in trips.items() if day >= since}
 
     def get_next_ticket_id(self) -> int:
-        data = self._read()
-        ticket_id = int(data.get("next_ticket_id", 1))
-        data["next_ticket_id"] = ticket_id + 1
-        self._write(data)
+        return self.allocate_ticket_ids(1)
+
+    def allocate_ticket_ids(self, count: int) -> int:
+        with self._lock:
+            data = self._read()
+            ticket_id = int(data.get("next_ticket_id", 1))
+            data["next_ticket_id"] = ticket_id + count
+            self._write(data)
         return ticket_id
 
+    def record_booking(self, bus: Bus, ticket: Ticket) -> None:
+        (error,) = self.record_bookings([(bus, ticket)], atomic=True)
+        if error:
+            raise ValueError(error)
+
+    def record_bookings(
+        self, bookings: List[Tuple[Bus, Ticket]], atomic: bool = False
+    ) -> List[Optional[str]]:
+        # Seats are re-checked against the file under the lock, so another
+        # process booking the same bus cannot be overwritten.
+        with self._lock:
+            data = self._read()
+            buses = self._bus_map(data.get("buses", []))
+            errors = _check_seats(
+                [(buses.get(self._bus_key(b.to_dict())), t) for b, t in bookings],
+                data.setdefault("trips", {}),
+            )
+            if atomic and any(errors):
+                return errors
+            accepted = [t.to_dict() for (_, t), e in zip(bookings, errors) if not e]
+            if accepted:
+                sales = SalesTotals(data.setdefault("sales", {}))
+                for row in accepted:
+                    sales.add(row)
+                index_version = self._log.version()
+                # Seats first: a crash in between strands seats rather than
+                # leaving tickets whose seats are still for sale.
+                self._write(data)
+                self._log.append(accepted)
+                self._update_index(index_version, accepted, ())
+        return errors
+
+    def record_cancellation(self, bus: Optional[Bus], ticket: Ticket) -> bool:
+        return self.record_cancellations([(bus, ticket)])[0]
+
+    def record_cancellations(
+        self, cancellations: List[Tuple[Optional[Bus], Ticket]]
+    ) -> List[bool]:
+        with self._lock:
+            data = self._read()
+            buses = self._bus_map(data.get("buses", []))
+            index_version = self._log.version()
+            # Tickets go before their seats are refunded, for the same reason
+            # bookings write seats first.
+            removed = self._log.remove(t.ticket_id for _, t in cancellations)
+            self._update_index(index_version, (), list(removed))
+            cancelled = []
+            for bus, ticket in cancellations:
+                row = removed.pop(ticket.ticket_id, None)
+                cancelled.append(row is not None)
+                stored = buses.get(self._bus_key(bus.to_dict())) if bus else None
+                if row is not None:
+                    SalesTotals(data.setdefault("sales", {})).remove(row)
+                if row is not None and stored is not None:
+                    _refund_seats(stored, data.setdefault("trips", {}), row)
+            if any(cancelled):
+                self._write(data)
+        return cancelled
+
+
+def seat_numbers_error(
+    seats: List[int], seat_count: int, total_seats: Optional[int] = None
+) -> Optional[str]:
+    """Why ``seats`` cannot be a ticket's seat numbers, or None. The upper
+    bound is only checked when the bus's ``total_seats`` is known."""
+    if len(seats) != seat_count or len(set(seats)) != seat_count:
+        return "Choose one distinct seat number per seat"
+    if total_seats is None:
+        if not all(s >= 1 for s in seats):
+            return "Seat numbers must be positive"
+    elif not all(1 <= s <= total_seats for s in seats):
+        return f"Seat numbers must be between 1 and {total_seats}"
+    return None
+
+
+def _check_seats(
+    bookings: List[Tuple[Optional[Dict], Ticket]], trips: Dict[str, Dict[str, str]]
+) -> List[Optional[str]]:
+    # Takes seats on the stored bus dicts (or, for dated tickets, the trip's
+    # seat map) in order, leaving failed bookings untouched.
+    errors: List[Optional[str]] = []
+    for stored, ticket in bookings:
+        if stored is None:
+            errors.append("Bus not found")
+            continue
+        key = ticket_trip_key(ticket.to_dict())
+        if ticket.travel_date:
+            taken = decode_seats(trips.get(ticket.travel_date, {}).get(key, ""))
+            available = stored["total_seats"] - count_seats(taken)
+            if not ticket.seats:
+                # A dated trip's seat map is its inventory, so every ticket
+                # on it needs seat numbers.
+                picked = pick_seats(taken, stored["total_seats"], ticket.seat_count)
+                ticket.seats = seat_numbers(picked)
+        else:
+            taken = decode_seats(stored.get("seat_map", ""))
+            available = stored["available_seats"]
+        bits = seat_bits(ticket.seats)
+        if available < ticket.seat_count:
+            errors.append("Insufficient available seats")
+        elif taken & bits or bits > full_mask(stored["total_seats"]):
+            errors.append("Seat already taken")
+        elif ticket.travel_date:
+            take_trip_seats(trips, ticket.travel_date, key, bits)
+            errors.append(None)
+        else:
+            stored["available_seats"] -= ticket.seat_count
+            stored["seat_map"] = encode_seats(taken | bits)
+            errors.append(None)
+    return errors
+
+
+def _ticket_bus_key(ticket: Ticket) -> Tuple[str, str, str, str]:
+    return (ticket.bus_name, ticket.origin, ticket.destination, ticket.departure_time)
+
+
+def is_past_ticket(ticket: Ticket, today: str) -> bool:
+    return bool(ticket.travel_date) and ticket.travel_date < today
+
+
+def _check_imports(
+    tickets: List[Tuple[Optional[Dict], Ticket]],
+    trips: Dict[str, Dict[str, str]],
+    existing: Set[int],
+) -> List[Optional[str]]:
+    # Tickets for days already past are history: their trips are over, so
+    # they take no seats. The rest take seats as a booking would.
+    today = date.today().isoformat()
+    errors: List[Optional[str]] = []
+    for stored, ticket in tickets:
+        error: Optional[str] = None
+        if ticket.ticket_id in existing:
+            error = "Ticket ID already exists"
+        elif ticket.seats:
+            total = stored["total_seats"] if stored is not None else None
+            error = seat_numbers_error(ticket.seats, ticket.seat_count, total)
+        if error is None and not is_past_ticket(ticket, today):
+            (error,) = _check_seats([(stored, ticket)], trips)
+        if error is None:
+            existing.add(ticket.ticket_id)
+        errors.append(error)
+    return errors
+
+
+def update_bus(stored: Dict, bus: Dict, trip_seat_maps: Iterable[str]) -> Optional[str]:
+    """Give a stored bus the fare and capacity of ``bus``. Seats already
+    sold, on the bus or on any of its dated trips, must still fit."""
+    total = bus["total_seats"]
+    sold = stored["total_seats"] - stored["available_seats"]
+    if total < stored["total_seats"]:
+        taken = decode_seats(stored.get("seat_map", ""))
+        for seat_map in trip_seat_maps:
+            taken |= decode_seats(seat_map)
+        if sold > total or taken > full_mask(total):
+            return "Seats already sold beyond the new capacity"
+    stored["total_seats"] = total
+    stored["available_seats"] = total - sold
+    stored["price_per_ticket"] = bus["price_per_ticket"]
+    return None
 
-class BookingSystem:
-    def __init__(self, store: Optional[DataStore] = None) -> None:
-        self.store = store or DataStore()
-        self.buses: List[Bus] = self.store.load_buses()
-        self.tickets: List[Ticket] = self.store.load_tickets()
-        self._preload_if_empty()
 
-    def _preload_if_empty(self) -> None:
-        if self.buses:
+def _upsert_buses(
+    stored: List[Dict], trips: Dict[str, Dict[str, str]], buses: List[Bus]
+) -> List[Optional[str]]:
+    index = DataStore._bus_map(stored)
+    errors: List[Optional[str]] = []
+    for bus in buses:
+        row = bus.to_dict()
+        key = DataStore._bus_key(row)
+        match = index.get(key)
+        if match is None:
+            stored.append(row)
+            index[key] = row
+            errors.append(None)
+        else:
+            seat_maps = (maps.get(trip_key(*key), "") for maps in trips.values())
+            errors.append(update_bus(match, row, seat_maps))
+    return errors
+
+
+def _refund_seats(stored: Dict, trips: Dict[str, Dict[str, str]], ticket: Dict) -> None:
+    bits = seat_bits(ticket.get("seats", ()))
+    if ticket.get("travel_date"):
+        release_trip(trips, ticket["travel_date"], ticket_trip_key(ticket), bits)
+        return
+    stored["seat_map"] = encode_seats(decode_seats(stored.get("seat_map", "")) & ~bits)
+    seats = stored["available_seats"] + int(ticket["seat_count"])
+    if seats <= stored["total_seats"]:
+        stored["available_seats"] = seats
+
+
+class JournaledDataStore(DataStore):
+    """JSON snapshot plus an append-only journal of book/cancel events.
+
+    The journal is folded into the snapshot every ``snapshot_every`` records.
+    """
+
+    def __init__(
+        self,
+        file_path: str = "data_store.json",
+        journal_path: Optional[str] = None,
+        snapshot_every: int = 1000,
+    ) -> None:
+        if snapshot_every <= 0:
+            raise ValueError("Snapshot interval must be positive")
+        self.journal_path = journal_path or file_path + ".journal"
+        self.snapshot_every = snapshot_every
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+        self._journal_offset = 0
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._buses: List[Dict] = []
+        self._bus_positions: Dict[Tuple[str, str, str, str], int] = {}
+        # Only set while a pre-ticket-log snapshot and journal are replayed.
+        self._legacy_tickets: Optional[Dict[int, Dict]] = None
+        self._trips: Dict[str, Dict[str, str]] = {}
+        # None while replaying a snapshot from before sales totals.
+        self._sales: Optional[SalesTotals] = None
+        self._next_ticket_id = 1
+        super().__init__(file_path)
+
+    def _move_tickets_to_log(self) -> None:
+        # Older snapshots carried tickets and their journals booked them, so
+        # both are replayed into a dict once and the snapshot is rewritten.
+        if not self._has_key("tickets"):
+            return
+        self._legacy_tickets = {}
+        self._sync()
+        rows = {int(t["ticket_id"]): t for t in self._log}
+        rows.update(self._legacy_tickets)
+        self._log.replace_all(rows.values())
+        self._legacy_tickets = None
+        self._snapshot()
+
+    def _ensure_sales(self) -> None:
+        self._sync()
+        if self._sales is None:
+            self._sales = self._sales_from_log()
+            self._snapshot()
+
+    def _set_buses(self, buses: List[Dict]) -> None:
+        self._buses = buses
+        self._bus_positions = {}
+        for idx, b in enumerate(buses):
+            self._bus_positions.setdefault(self._bus_key(b), idx)
+
+    def _bus_index(self, bus: Optional[Bus]) -> Optional[int]:
+        if bus is None:
+            return None
+        return self._bus_positions.get(self._bus_key(bus.to_dict()))
+
+    def _bus_index_of(self, ticket: Ticket) -> Optional[int]:
+        return self._bus_positions.get(_ticket_bus_key(ticket))
+
+    def version(self) -> Tuple:
+        try:
+            st = os.stat(self.journal_path)
+            journal: Tuple = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            journal = ()
+        return (super().version(), journal)
+
+    def _sync(self) -> None:
+        st = os.stat(self.file_path)
+        snapshot_stat = (st.st_mtime_ns, st.st_size)
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            journal_size = 0
+        if snapshot_stat != self._snapshot_stat or journal_size < self._journal_offset:
+            data = self._read()
+            self._set_buses(list(data.get("buses", [])))
+            if self._legacy_tickets is not None:
+                self._legacy_tickets = {
+                    int(t["ticket_id"]): t for t in data.get("tickets", [])
+                }
+            self._trips = data.get("trips", {})
+            sales = data.get("sales")
+            self._sales = SalesTotals(sales) if sales is not None else None
+            self._next_ticket_id = int(data.get("next_ticket_id", 1))
+            self._snapshot_seq = int(data.get("journal_seq", 0))
+            self._seq = self._snapshot_seq
+            self._journal_offset = 0
+            self._snapshot_stat = snapshot_stat
+        if journal_size > self._journal_offset:
+            self._replay_journal()
+
+    def _replay_journal(self) -> None:
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Torn write from a crash; stop before the partial record.
+                    break
+                self._journal_offset += len(raw)
+                record = json.loads(raw)
+                if record["seq"] <= self._seq:
+                    continue
+                self._apply(record)
+                self._seq = record["seq"]
+
+    def _apply(self, record: Dict) -> None:
+        if record["op"] == "id":
+            self._next_ticket_id = max(self._next_ticket_id, record["next"])
             return
-        demo: List[Tuple[str, str, str, str, int, int]] = [
-            ("Ena Transport", "Sylhet", "Dhaka", "08:00", 40, 800),
-            ("Hanif Enterprise", "Sylhet", "Chittagong", "09:00", 40, 900),
-            ("Shyamoli Paribahan", "Dhaka", "Chittagong", "10:30", 40, 1000),
-            ("Desh Travels", "Dhaka", "Sylhet", "11:00", 40, 850),
-            ("London Express", "Sylhet", "Cumilla", "14:00", 40, 700),
-            ("Saudia Coach", "Sylhet", "Feni", "15:30", 40, 650),
-            ("Green Line Paribahan", "Dhaka", "Chittagong", "07:30", 40, 1200),
-            ("Shohagh Paribahan", "Dhaka", "Cox's Bazar", "21:00", 40, 1400),
-            ("SilkLine", "Sylhet", "Dhaka", "17:45", 40, 800),
-            ("Unique Paribahan", "Sylhet", "Chittagong", "06:30", 40, 900),
-            ("Year-71 Express", "Sylhet", "Khulna", "16:00", 40, 1300),
-            ("Shyamoli NR Travels", "Sylhet", "Jessore", "20:00", 40, 1350),
-            ("Ena Transport", "Sylhet", "Rajshahi", "07:45", 40, 1400),
-            ("London Express", "Sylhet", "Bogra", "12:30", 40, 1100),
-            ("Hanif Enterprise", "Sylhet", "Feni", "13:45", 40, 700),
-            ("Desh Travels", "Dhaka", "Rajshahi", "09:15", 40, 1000),
-            ("Tungipara Express", "Dhaka", "Gopalganj", "06:45", 40, 600),
-            ("S Alam Paribahan", "Chittagong", "Cox's Bazar", "05:30", 40, 900),
-            ("Ena Transport", "Sylhet", "Cox's Bazar", "22:15", 40, 1700),
-            ("Saintmartin Paribahan", "Dhaka", "Teknaf", "23:00", 40, 1800),
-            ("Green Line Paribahan", "Sylhet", "Dhaka", "15:00", 40, 1200),
-            ("Shohagh Paribahan", "Sylhet", "Dhaka", "23:45", 40, 900),
-            ("Haque Enterprise", "Sylhet", "Moulvibazar", "10:00", 40, 400),
-            ("NR Travels", "Sylhet", "Barisal", "18:30", 40, 1200),
+        bus = self._buses[record["bus"]] if record.get("bus") is not None else None
+        if record["op"] == "book":
+            ticket = record["ticket"]
+            ticket_id = int(ticket["ticket_id"])
+            if self._legacy_tickets is not None:
+                self._legacy_tickets[ticket_id] = ticket
+            self._next_ticket_id = max(self._next_ticket_id, ticket_id + 1)
+            if self._sales is not None:
+                self._sales.add(ticket)
+            if bus is None:
+                return
+            bits = seat_bits(ticket.get("seats", ()))
+            if ticket.get("travel_date"):
+                key = ticket_trip_key(ticket)
+                take_trip_seats(self._trips, ticket["travel_date"], key, bits)
+            else:
+                bus["available_seats"] -= int(ticket["seat_count"])
+                taken = decode_seats(bus.get("seat_map", ""))
+                bus["seat_map"] = encode_seats(taken | bits)
+        elif record["op"] == "cancel":
+            ticket = record.get("ticket")
+            if self._legacy_tickets is not None:
+                legacy = self._legacy_tickets.pop(int(record["ticket_id"]), None)
+                ticket = ticket or legacy
+            if self._sales is not None and ticket is not None:
+                self._sales.remove(ticket)
+            if bus is not None and ticket is not None:
+                _refund_seats(bus, self._trips, ticket)
+
+    def _snapshot(self) -> None:
+        self._write(
+            {
+                "buses": self._buses,
+                "trips": self._trips,
+                "sales": self._sales.totals if self._sales is not None else None,
+                "next_ticket_id": self._next_ticket_id,
+                "journal_seq": self._seq,
+            }
+        )
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        st = os.stat(self.file_path)
+        self._snapshot_stat = (st.st_mtime_ns, st.st_size)
+        self._snapshot_seq = self._seq
+        self._journal_offset = 0
+
+    def _append(self, records: List[Dict]) -> None:
+        # Callers hold the lock and have just synced.
+        lines = [
+            json.dumps({"seq": self._seq + n, **record}, separators=(",", ":"))
+            for n, record in enumerate(records, start=1)
         ]
+        raw = "".join(line + "\n" for line in lines).encode("utf-8")
+        with self.metrics.timer("store.append") as timer:
+            with open(self.journal_path, "ab") as f:
+                if f.tell() > self._journal_offset:
+                    # Drop a torn record left by a crash before appending.
+                    f.truncate(self._journal_offset)
+                f.write(raw)
+            timer.add_bytes(len(raw))
+        self._sync()
+        if self._seq - self._snapshot_seq >= self.snapshot_every:
+            self._snapshot()
+
+    def load_buses(self) -> List[Bus]:
+        with self._lock:
+            self._sync()
+            return [Bus.from_dict(b, trusted=True) for b in self._buses]
+
+    def save_buses(self, buses: List[Bus]) -> None:
+        with self._lock:
+            self._sync()
+            self._set_buses([b.to_dict() for b in buses])
+            self._snapshot()
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> None:
+        with self._lock:
+            self._sync()
+            self._log.replace_all(t.to_dict() for t in tickets)
+            self._sales = self._sales_from_log()
+            self._snapshot()
 
-        self.buses = [
-            Bus(
-                name=n,
-                origin=o,
-                destination=d,
-                departure_time=t,
-                total_seats=s,
-                price_per_ticket=p,
+    def upsert_buses(self, buses: List[Bus]) -> List[Optional[str]]:
+        with self._lock:
+            self._sync()
+            # Added buses go on the end, so journal records keep their index.
+            errors = _upsert_buses(self._buses, self._trips, buses)
+            if None in errors:
+                self._set_buses(self._buses)
+                self._snapshot()
+        return errors
+
+    def import_tickets(self, tickets: List[Ticket]) -> List[Optional[str]]:
+        with self._lock:
+            self._sync()
+            today = date.today().isoformat()
+            # Past tickets are journaled without a bus, so replay takes no
+            # seats for them.
+            positions = [
+                None if is_past_ticket(t, today) else self._bus_index_of(t)
+                for t in tickets
+            ]
+            scratch = {i: dict(self._buses[i]) for i in positions if i is not None}
+            days = {t.travel_date for t in tickets if t.travel_date}
+            errors = _check_imports(
+                [
+                    (scratch[i] if i is not None else None, t)
+                    for i, t in zip(positions, tickets)
+                ],
+                {day: dict(self._trips.get(day, {})) for day in days},
+                self._log.existing(t.ticket_id for t in tickets),
             )
-            for (n, o, d, t, s, p) in demo
-        ]
-        self.store.save_buses(self.buses)
+            records = [
+                {"op": "book", "bus": i, "ticket": t.to_dict()}
+                for i, t, e in zip(positions, tickets, errors)
+                if not e
+            ]
+            if records:
+                index_version = self._log.version()
+                self._append(records)
+                self._log.append(r["ticket"] for r in records)
+                self._update_index(index_version, (r["ticket"] for r in records), ())
+        return errors
+
+    def load_sales(self) -> SalesTotals:
+        with self._lock:
+            self._sync()
+            return SalesTotals(self._sales.to_dict() if self._sales else None)
+
+    def load_trip_inventory(self, since: str = "") -> Dict[str, Dict[str, str]]:
+        with self._lock:
+            self._sync()
+            return {
+                day: dict(maps) for day, maps in self._trips.items() if day >= since
+            }
+
+    def allocate_ticket_ids(self, count: int) -> int:
+        with self._lock:
+            self._sync()
+            ticket_id = self._next_ticket_id
+            self._append([{"op": "id", "next": ticket_id + count}])
+        return ticket_id
+
+    def record_bookings(
+        self, bookings: List[Tuple[Bus, Ticket]], atomic: bool = False
+    ) -> List[Optional[str]]:
+        with self._lock:
+            self._sync()
+            positions = [self._bus_index(b) for b, _ in bookings]
+            # Check against copies; the journal replay applies the real change.
+            scratch = {i: dict(self._buses[i]) for i in positions if i is not None}
+            days = {t.travel_date for _, t in bookings if t.travel_date}
+            errors = _check_seats(
+                [
+                    (scratch[i] if i is not None else None, t)
+                    for i, (_, t) in zip(positions, bookings)
+                ],
+                {day: dict(self._trips.get(day, {})) for day in days},
+            )
+            if atomic and any(errors):
+                return errors
+            records = [
+                {"op": "book", "bus": i, "ticket": t.to_dict()}
+                for i, (_, t), e in zip(positions, bookings, errors)
+                if not e
+            ]
+            if records:
+                index_version = self._log.version()
+                self._append(records)
+                self._log.append(r["ticket"] for r in records)
+                self._update_index(index_version, (r["ticket"] for r in records), ())
+        return errors
+
+    def record_cancellations(
+        self, cancellations: List[Tuple[Optional[Bus], Ticket]]
+    ) -> List[bool]:
+        with self._lock:
+            self._sync()
+            index_version = self._log.version()
+            removed = self._log.remove(t.ticket_id for _, t in cancellations)
+            self._update_index(index_version, (), list(removed))
+            cancelled = []
+            records = []
+            for bus, ticket in cancellations:
+                row = removed.pop(ticket.ticket_id, None)
+                cancelled.append(row is not None)
+                if row is not None:
+                    # The stored ticket travels with the record so replays
+                    # can refund its seats without a ticket lookup.
+                    records.append(
+                        {
+                            "op": "cancel",
+                            "bus": self._bus_index(bus),
+                            "ticket_id": ticket.ticket_id,
+                            "ticket": row,
+                        }
+                    )
+            if records:
+                self._append(records)
+        return cancelled
+
+
+@dataclass
+class BookingRequest:
+    bus_name: str
+    passenger_name: str
+    contact: str
+    seat_count: int
+    travel_date: str = ""
+    seat_preference: str = ""
+    seats: Optional[List[int]] = None
+    # Narrow the lookup to one route when several buses share a name.
+    origin: str = ""
+    destination: str = ""
+    # Book the seats of this hold instead of picking new ones.
+    hold_id: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    ticket: Optional[Ticket] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _abort_if_failed(results: List[BatchResult]) -> bool:
+    if not any(r.error for r in results):
+        return False
+    for r in results:
+        if not r.error:
+            r.error = "Batch aborted"
+    return True
+
+
+_DEMO_SCHEDULE: List[Tuple[str, str, str, str, int, int]] = [
+    ("Ena Transport", "Sylhet", "Dhaka", "08:00", 40, 800),
+    ("Hanif Enterprise", "Sylhet", "Chittagong", "09:00", 40, 900),
+    ("Shyamoli Paribahan", "Dhaka", "Chittagong", "10:30", 40, 1000),
+    ("Desh Travels", "Dhaka", "Sylhet", "11:00", 40, 850),
+    ("London Express", "Sylhet", "Cumilla", "14:00", 40, 700),
+    ("Saudia Coach", "Sylhet", "Feni", "15:30", 40, 650),
+    ("Green Line Paribahan", "Dhaka", "Chittagong", "07:30", 40, 1200),
+    ("Shohagh Paribahan", "Dhaka", "Cox's Bazar", "21:00", 40, 1400),
+    ("SilkLine", "Sylhet", "Dhaka", "17:45", 40, 800),
+    ("Unique Paribahan", "Sylhet", "Chittagong", "06:30", 40, 900),
+    ("Year-71 Express", "Sylhet", "Khulna", "16:00", 40, 1300),
+    ("Shyamoli NR Travels", "Sylhet", "Jessore", "20:00", 40, 1350),
+    ("Ena Transport", "Sylhet", "Rajshahi", "07:45", 40, 1400),
+    ("London Express", "Sylhet", "Bogra", "12:30", 40, 1100),
+    ("Hanif Enterprise", "Sylhet", "Feni", "13:45", 40, 700),
+    ("Desh Travels", "Dhaka", "Rajshahi", "09:15", 40, 1000),
+    ("Tungipara Express", "Dhaka", "Gopalganj", "06:45", 40, 600),
+    ("S Alam Paribahan", "Chittagong", "Cox's Bazar", "05:30", 40, 900),
+    ("Ena Transport", "Sylhet", "Cox's Bazar", "22:15", 40, 1700),
+    ("Saintmartin Paribahan", "Dhaka", "Teknaf", "23:00", 40, 1800),
+    ("Green Line Paribahan", "Sylhet", "Dhaka", "15:00", 40, 1200),
+    ("Shohagh Paribahan", "Sylhet", "Dhaka", "23:45", 40, 900),
+    ("Haque Enterprise", "Sylhet", "Moulvibazar", "10:00", 40, 400),
+    ("NR Travels", "Sylhet", "Barisal", "18:30", 40, 1200),
+]
+
+
+def demo_buses() -> List[Bus]:
+    """The schedule a new store starts with."""
+    return [
+        Bus(
+            name=n,
+            origin=o,
+            destination=d,
+            departure_time=t,
+            total_seats=s,
+            price_per_ticket=p,
+        )
+        for (n, o, d, t, s, p) in _DEMO_SCHEDULE
+    ]
+
+
+STORE_BACKENDS = ("json", "journal", "sqlite")
+
+
+def make_store(backend: str, path: Optional[str] = None) -> DataStore:
+    if backend == "sqlite":
+        from sqlite_store import SQLiteDataStore
+
+        return SQLiteDataStore(path or "data_store.db")
+    if backend == "journal":
+        return JournaledDataStore(path or "data_store.json")
+    return DataStore(path or "data_store.json")
+
+
+# Query cache tags: buses with seats left, and all prefix searches.
+_AVAILABLE = "available"
+_ROUTE_PREFIXES = "route-prefixes"
+# Booking errors after which a promoted waitlist entry is queued again.
+_WAITLIST_RETRY_ERRORS = (
+    "Insufficient available seats",
+    "No seats match the preference",
+    "Seat already taken",
+)
+
+
+def _bus_tag(bus: Bus) -> Tuple[str, str, str, str, str]:
+    return ("bus", bus.name, bus.origin, bus.destination, bus.departure_time)
+
+
+class BookingSystem:
+    def __init__(
+        self,
+        store: Optional[DataStore] = None,
+        id_block_size: int = 1000,
+        horizon_days: int = 90,
+        hold_ttl: float = 300.0,
+        cache_size: int = 256,
+        load: bool = True,
+    ) -> None:
+        self.store = store or DataStore()
+        # Shared with the store, so one snapshot covers both layers.
+        self.metrics: Metrics = self.store.metrics
+        self.query_cache = QueryCache(cache_size)
+        self.horizon_days = horizon_days
+        self.hold_ttl = hold_ttl
+        self._ticket_ids = TicketIdAllocator(self.store, id_block_size)
+        self._buses: List[Bus] = []
+        self._buses_by_name: Dict[str, Bus] = {}
+        self._buses_by_route: Dict[Tuple[str, str], List[Bus]] = {}
+        self.routes = RouteIndex()
+        self._trips = TripInventory()
+        self.planner = JourneyPlanner()
+        self._bus_locks: Dict[Tuple[str, str, str, str], threading.Lock] = {}
+        self._bus_locks_guard = threading.Lock()
+        self._holds: Dict[int, SeatHold] = {}
+        self._hold_queue = HoldExpiryQueue()
+        self._hold_ids = 0
+        self._holds_lock = threading.Lock()
+        # load=False starts empty, for callers (the GUI) that load the store
+        # on another thread with fetch_initial_state and apply_state.
+        if load:
+            self.apply_state(self.fetch_initial_state())
+
+    @property
+    def buses(self) -> List[Bus]:
+        return self._buses
+
+    @buses.setter
+    def buses(self, buses: List[Bus]) -> None:
+        # Indexes are built aside and each swapped in with one assignment, so
+        # a booking on another thread (the service's executor, the GUI's I/O
+        # thread) never looks a bus up in a half-built one.
+        buses = list(buses)
+        by_name: Dict[str, Bus] = {}
+        by_route: Dict[Tuple[str, str], List[Bus]] = {}
+        for b in buses:
+            self._index_bus(by_name, by_route, b)
+        routes = RouteIndex(buses)
+        self._buses_by_name = by_name
+        self._buses_by_route = by_route
+        self.routes = routes
+        self._buses = buses
+        self.planner.reset(buses)
+        # After the swap, so no answer from the old buses stays cached.
+        self.query_cache.clear()
+
+    @staticmethod
+    def _index_bus(
+        by_name: Dict[str, Bus], by_route: Dict[Tuple[str, str], List[Bus]], bus: Bus
+    ) -> None:
+        # First bus wins on repeated names, matching the old linear scan.
+        by_name.setdefault(bus.name.lower(), bus)
+        route = (bus.origin.lower(), bus.destination.lower())
+        by_route.setdefault(route, []).append(bus)
+
+    @property
+    def tickets(self) -> List[Ticket]:
+        return list(self.iter_tickets())
+
+    @tickets.setter
+    def tickets(self, tickets: Iterable[Ticket]) -> None:
+        self.store.save_tickets(list(tickets))
+
+    def iter_tickets(
+        self, filter: Optional[Callable[[Ticket], bool]] = None
+    ) -> Iterator[Ticket]:
+        # Tickets stay in the store and are streamed from it on demand.
+        return self.store.iter_tickets(filter)
+
+    def find_tickets(
+        self, contact: str = "", passenger: str = "", limit: Optional[int] = None
+    ) -> List[Ticket]:
+        """Tickets by contact number and/or passenger name, in ticket ID order.
+
+        Contacts match exactly, ignoring spaces and dashes. Names match
+        case-insensitively anywhere, except that one- or two-character
+        queries only match the start of the name.
+        """
+        return self.store.find_tickets(contact, passenger, limit)
+
+    def sales_report(self) -> SalesReport:
+        """Revenue per route, load factor per bus and bookings by departure
+        hour, from the totals the store keeps as tickets are written."""
+        return SalesReport(self.store.load_sales(), self.buses)
+
+    def reload(self) -> None:
+        self.apply_state(self.fetch_state())
+
+    def fetch_state(self) -> Tuple[List[Bus], Dict]:
+        # Split from apply_state so callers can read the store before any of
+        # the current state is replaced. Only departures from today on
+        # that have sold seats are loaded; tickets are never loaded up front.
+        buses = self.store.load_buses()
+        trips = self.store.load_trip_inventory(date.today().isoformat())
+        return buses, trips
+
+    def fetch_initial_state(self) -> Tuple[List[Bus], Dict]:
+        """fetch_state, putting the demo schedule into an empty store."""
+        buses, trips = self.fetch_state()
+        if not buses:
+            buses = demo_buses()
+            self.store.save_buses(buses)
+        # Nobody can board a bus that has left.
+        self.store.expire_waitlist(date.today().isoformat())
+        return buses, trips
+
+    def apply_state(self, state: Tuple[List[Bus], Dict]) -> None:
+        buses, trips = state
+        self.buses = buses
+        self._trips = TripInventory(trips)
+        self._retake_holds()
+
+    def _retake_holds(self) -> None:
+        # Holds live only in this process, so the freshly loaded buses and
+        # trips know nothing of them. Seats sold elsewhere in the meantime
+        # win and the hold is dropped.
+        with self._holds_lock:
+            for hold_id, hold in list(self._holds.items()):
+                old = hold.bus
+                bus = self._route_bus(
+                    old.name, old.origin, old.destination, old.departure_time
+                )
+                bits = seat_bits(hold.seats)
+                if bus is None or not self._take(bus, hold.travel_date, bits):
+                    del self._holds[hold_id]
+                    continue
+                hold.bus = bus
+
+    def _take(self, bus: Bus, day: str, bits: int) -> bool:
+        if not day:
+            was_available = bus.available_seats > 0
+            taken = bus.take_seats(bits)
+            self._seats_changed(bus, was_available)
+            return taken
+        count = count_seats(bits)
+        if self._trips.taken(bus, day) & bits or (
+            self._trips.available(bus, day) < count
+        ):
+            return False
+        self._trips.reserve(bus, day, bits)
+        return True
+
+    def add_bus(self, bus: Bus) -> None:
+        self._buses.append(bus)
+        self._index_bus(self._buses_by_name, self._buses_by_route, bus)
+        self.routes.add(bus)
+        self.planner.add_bus(bus)
+        route = (bus.origin.lower(), bus.destination.lower())
+        for tag in (("route",) + route, _ROUTE_PREFIXES, _AVAILABLE):
+            self.query_cache.invalidate(tag)
+        self.store.save_buses(self._unheld_buses())
+
+    def _unheld_buses(self) -> List[Bus]:
+        # Held seats on undated buses are handed back in the copy that gets
+        # written, so a hold never reaches the store as a sale.
+        held: Dict[int, List[SeatHold]] = {}
+        with self._holds_lock:
+            for hold in self._holds.values():
+                if not hold.travel_date:
+                    held.setdefault(id(hold.bus), []).append(hold)
+        buses = []
+        for b in self._buses:
+            holds = held.get(id(b))
+            if holds:
+                b = copy.copy(b)
+                for hold in holds:
+                    b.release_seats(seat_bits(hold.seats), hold.seat_count)
+            buses.append(b)
+        return buses
+
+    @contextmanager
+    def _locked_buses(self, buses: Iterable[Bus]) -> Iterator[None]:
+        # Bookings on different buses proceed in parallel; the store still
+        # serializes its own writes. Locks are taken in key order so batches
+        # touching the same buses cannot deadlock.
+        keys = sorted(
+            {(b.name, b.origin, b.destination, b.departure_time) for b in buses}
+        )
+        with self._bus_locks_guard:
+            locks = [self._bus_locks.setdefault(k, threading.Lock()) for k in keys]
+        with ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
 
     def list_buses(self) -> List[Bus]:
         return list(self.buses)
 
     def list_available_buses(self) -> List[Bus]:
+        return self._cached(("available",), [_AVAILABLE], self._available_buses)
+
+    def _available_buses(self) -> List[Bus]:
+        if self.store.supports_queries:
+            return self.store.list_available_buses()
         return [b for b in self.buses if b.available_seats > 0]
 
+    @timed("search")
     def search_buses(self, origin: str, destination: str) -> List[Bus]:
-        o = origin.strip().lower()
-        d = destination.strip().lower()
-        return [
-            b
-            for b in self.buses
-            if b.origin.lower() == o and b.destination.lower() == d
-        ]
+        route = (origin.strip().lower(), destination.strip().lower())
+        return self._cached(
+            ("search",) + route,
+            [("route",) + route],
+            lambda: self._search_buses(route),
+        )
+
+    def _search_buses(self, route: Tuple[str, str]) -> List[Bus]:
+        if self.store.supports_queries:
+            return self.store.search_buses(*route)
+        return list(self._buses_by_route.get(route, ()))
+
+    @timed("search.routes")
+    def search_routes(self, origin: str, destination: str) -> List[Bus]:
+        """Buses whose origin and destination start with the given text, for
+        searching as the user types."""
+        prefixes = (origin.strip().lower(), destination.strip().lower())
+        return self._cached(
+            ("prefix",) + prefixes,
+            [_ROUTE_PREFIXES],
+            lambda: self._search_routes(*prefixes),
+        )
+
+    def _search_routes(self, origin: str, destination: str) -> List[Bus]:
+        if self.store.supports_queries:
+            return self.store.search_routes(origin, destination)
+        found: List[Bus] = []
+        for route in self.routes.routes(origin, destination):
+            found.extend(self._buses_by_route.get(route, ()))
+        return found
+
+    def _cached(
+        self, key: Tuple, tags: List[Hashable], query: Callable[[], List[Bus]]
+    ) -> List[Bus]:
+        found = self.query_cache.get(key)
+        if found is None:
+            generation = self.query_cache.generation
+            found = query()
+            if self.store.supports_queries:
+                # Query stores hand back copies, whose seat counts go stale
+                # when the bus is booked.
+                tags = tags + [_bus_tag(b) for b in found]
+            self.query_cache.put(key, found, tags, generation)
+        return list(found)
+
+    def _seats_changed(self, bus: Bus, was_available: bool) -> None:
+        # Cached lists hold the live Bus objects, so in memory only a bus
+        # selling out or reopening changes an answer.
+        if (bus.available_seats > 0) != was_available:
+            self.query_cache.invalidate(_AVAILABLE)
+        if self.store.supports_queries:
+            self.query_cache.invalidate(_bus_tag(bus))
+
+    def _stored_seats_changed(self, buses: Iterable[Bus]) -> None:
+        # A query store only answers with the change once it is written, so
+        # drop whatever was cached from it in between.
+        if not self.store.supports_queries:
+            return
+        for bus in buses:
+            self.query_cache.invalidate(_bus_tag(bus))
+        self.query_cache.invalidate(_AVAILABLE)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.query_cache.stats()
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        snapshot = self.metrics.snapshot()
+        snapshot["cache"] = self.cache_stats()
+        return snapshot
+
+    def suggest_cities(
+        self, prefix: str, origin: str = "", limit: int = 10
+    ) -> List[str]:
+        return self.routes.suggest(prefix, origin, limit)
 
     def get_bus_by_name(self, name: str) -> Optional[Bus]:
-        key = name.strip().lower()
-        for b in self.buses:
-            if b.name.lower() == key:
+        return self._buses_by_name.get(name.strip().lower())
+
+    def _route_bus(
+        self, name: str, origin: str, destination: str, departure_time: str = ""
+    ) -> Optional[Bus]:
+        route = (origin.strip().lower(), destination.strip().lower())
+        name = name.strip().lower()
+        for b in self._buses_by_route.get(route, ()):
+            if b.name.lower() != name:
+                continue
+            if not departure_time or b.departure_time == departure_time:
                 return b
         return None
 
+    def _request_bus(self, request: BookingRequest) -> Optional[Bus]:
+        if request.hold_id is not None:
+            hold = self._holds.get(request.hold_id)
+            return hold.bus if hold else None
+        if request.origin or request.destination:
+            return self._route_bus(
+                request.bus_name, request.origin, request.destination
+            )
+        return self.get_bus_by_name(request.bus_name)
+
+    def _ticket_bus(self, ticket: Ticket) -> Optional[Bus]:
+        return self._route_bus(
+            ticket.bus_name, ticket.origin, ticket.destination, ticket.departure_time
+        ) or self.get_bus_by_name(ticket.bus_name)
+
+    def plan_journey(
+        self,
+        origin: str,
+        destination: str,
+        depart_after: Optional[datetime] = None,
+        optimize: str = "fastest",
+        seat_count: int = 1,
+    ) -> Optional[Itinerary]:
+        # Legs are dated departures, so only trips inside the booking horizon
+        # with enough seats left are considered.
+        last = date.today() + timedelta(days=self.horizon_days)
+
+        def is_available(bus: Bus, day: date) -> bool:
+            if day > last:
+                return False
+            return self._trips.available(bus, day.isoformat()) >= seat_count
+
+        return self.planner.plan(
+            origin,
+            destination,
+            depart_after or datetime.now(),
+            optimize,
+            is_available,
+        )
+
+    def journey_options(
+        self,
+        origin: str,
+        destination: str,
+        depart_after: Optional[datetime] = None,
+        seat_count: int = 1,
+    ) -> List[Itinerary]:
+        options: List[Itinerary] = []
+        for optimize in OPTIMIZE_CHOICES:
+            found = self.plan_journey(
+                origin, destination, depart_after, optimize, seat_count
+            )
+            if found is not None and found not in options:
+                options.append(found)
+        return options
+
+    def book_journey(
+        self,
+        itinerary: Itinerary,
+        passenger_name: str,
+        contact: str,
+        seat_count: int = 1,
+        seat_preference: str = "",
+    ) -> List[Ticket]:
+        requests = [
+            BookingRequest(
+                leg.bus.name,
+                passenger_name,
+                contact,
+                seat_count,
+                leg.travel_date.isoformat(),
+                seat_preference,
+                origin=leg.bus.origin,
+                destination=leg.bus.destination,
+            )
+            for leg in itinerary.legs
+        ]
+        results = self.book_many(requests, atomic=True)
+        for r in results:
+            if r.error and r.error != "Batch aborted":
+                raise ValueError(r.error)
+        return [r.ticket for r in results if r.ticket is not None]
+
+    def hold_seats(
+        self,
+        bus_name: str,
+        seat_count: int,
+        travel_date: str = "",
+        seat_preference: str = "",
+        seats: Optional[List[int]] = None,
+        ttl: Optional[float] = None,
+        origin: str = "",
+        destination: str = "",
+    ) -> SeatHold:
+        """Set seats aside for ``ttl`` seconds while the passenger checks out.
+
+        Held seats are taken in memory only; confirm_hold writes the ticket
+        and an unconfirmed hold is released by expire_holds.
+        """
+        self.expire_holds()
+        request = BookingRequest(
+            bus_name,
+            "",
+            "",
+            seat_count,
+            travel_date,
+            seat_preference,
+            seats,
+            origin,
+            destination,
+        )
+        error = self._validate_seats(request)
+        if error:
+            raise ValueError(error)
+        bus = self._request_bus(request)
+        assert bus is not None
+        with self._locked_buses([bus]):
+            bits, error = self._reserve(bus, request)
+            if error:
+                raise ValueError(error)
+            with self._holds_lock:
+                self._hold_ids += 1
+                hold = SeatHold(
+                    self._hold_ids,
+                    bus,
+                    seat_numbers(bits),
+                    time.time() + (self.hold_ttl if ttl is None else ttl),
+                    self._travel_day(request),
+                )
+                self._holds[hold.hold_id] = hold
+                self._hold_queue.push(hold.expires_at, hold.hold_id)
+        return hold
+
+    def get_hold(self, hold_id: int) -> Optional[SeatHold]:
+        hold = self._holds.get(hold_id)
+        if hold is None or hold.expires_at <= time.time():
+            return None
+        return hold
+
+    def hold_request(
+        self, hold_id: int, passenger_name: str, contact: str
+    ) -> Optional[BookingRequest]:
+        """The booking that confirms a live hold, for book_many batches."""
+        hold = self.get_hold(hold_id)
+        if hold is None:
+            return None
+        return BookingRequest(
+            hold.bus.name,
+            passenger_name,
+            contact,
+            hold.seat_count,
+            hold.travel_date,
+            seats=hold.seats,
+            origin=hold.bus.origin,
+            destination=hold.bus.destination,
+            hold_id=hold_id,
+        )
+
+    def confirm_hold(self, hold_id: int, passenger_name: str, contact: str) -> Ticket:
+        request = self.hold_request(hold_id, passenger_name, contact)
+        if request is None:
+            raise ValueError("Hold not found or expired")
+        (result,) = self.book_many([request], atomic=True)
+        if result.error:
+            raise ValueError(result.error)
+        assert result.ticket is not None
+        return result.ticket
+
+    def release_hold(self, hold_id: int) -> bool:
+        with self._holds_lock:
+            hold = self._holds.pop(hold_id, None)
+        if hold is None:
+            return False
+        with self._locked_buses([hold.bus]):
+            self._free_seats(hold.bus, hold.travel_date, hold.seats)
+        self._promote([(hold.bus, hold.travel_date)])
+        return True
+
+    def expire_holds(self, now: Optional[float] = None) -> int:
+        # Confirmed and released holds are skipped when their heap entry
+        # comes up, so each call only pays for the holds that are due.
+        now = time.time() if now is None else now
+        if self._hold_queue.next_expiry() > now:
+            return 0
+        with self._holds_lock:
+            expired = [
+                self._holds.pop(hold_id)
+                for hold_id in self._hold_queue.pop_expired(now)
+                if hold_id in self._holds
+            ]
+        for hold in expired:
+            with self._locked_buses([hold.bus]):
+                self._free_seats(hold.bus, hold.travel_date, hold.seats)
+        self._promote((hold.bus, hold.travel_date) for hold in expired)
+        return len(expired)
+
+    def list_departures(
+        self,
+        origin: str,
+        destination: str,
+        start: Union[date, str],
+        end: Union[date, str, None] = None,
+    ) -> List[Trip]:
+        # Every bus runs daily at its departure_time. Walking the route's
+        # buses day by day yields trips already in departure order, and only
+        # days inside the booking horizon are visited.
+        first = max(parse_travel_date(start), date.today())
+        last = min(
+            parse_travel_date(end) if end is not None else first,
+            date.today() + timedelta(days=self.horizon_days),
+        )
+        buses = sorted(
+            self.search_buses(origin, destination), key=lambda b: b.departure_time
+        )
+        trips: List[Trip] = []
+        day = first
+        while day <= last:
+            bucket = day.isoformat()
+            trips.extend(Trip(b, day, self._trips.available(b, bucket)) for b in buses)
+            day += timedelta(days=1)
+        return trips
+
     def book_ticket(
         self,
         bus_name: str,
         passenger_name: str,
         contact: str,
         seat_count: int,
+        travel_date: str = "",
+        seat_preference: str = "",
+        seats: Optional[List[int]] = None,
+        origin: str = "",
+        destination: str = "",
     ) -> Ticket:
-        if not passenger_name.strip() or not contact.strip():
-            raise ValueError("Passenger name and contact must be non-empty")
-        if seat_count <= 0:
-            raise ValueError("Seat count must be positive")
+        request = BookingRequest(
+            bus_name,
+            passenger_name,
+            contact,
+            seat_count,
+            travel_date,
+            seat_preference,
+            seats,
+            origin,
+            destination,
+        )
+        (result,) = self.book_many([request], atomic=True)
+        if result.error:
+            raise ValueError(result.error)
+        assert result.ticket is not None
+        return result.ticket
+
+    def _validate_booking(self, request: BookingRequest) -> Optional[str]:
+        if not request.passenger_name.strip() or not request.contact.strip():
+            return "Passenger name and contact must be non-empty"
+        return self._validate_seats(request)
 
-        bus = self.get_bus_by_name(bus_name)
+    def _validate_seats(self, request: BookingRequest) -> Optional[str]:
+        if request.seat_count <= 0:
+            return "Seat count must be positive"
+        if request.travel_date:
+            try:
+                day = parse_travel_date(request.travel_date)
+            except ValueError as e:
+                return str(e)
+            today = date.today()
+            if not today <= day <= today + timedelta(days=self.horizon_days):
+                return "Travel date outside booking horizon"
+        if request.seat_preference not in SEAT_PREFERENCES:
+            return "Seat preference must be window, aisle or together"
+        bus = self._request_bus(request)
         if not bus:
-            raise ValueError("Bus not found")
-        if not bus.book_seat(seat_count):
-            raise ValueError("Insufficient available seats")
+            if request.hold_id is not None:
+                return "Hold not found or expired"
+            return "Bus not found"
+        if request.seats is not None:
+            return seat_numbers_error(
+                request.seats, request.seat_count, bus.total_seats
+            )
+        return None
+
+    def _reserve(self, bus: Bus, request: BookingRequest) -> Tuple[int, Optional[str]]:
+        day = self._travel_day(request)
+        if day:
+            taken = self._trips.taken(bus, day)
+            available = self._trips.available(bus, day)
+        else:
+            taken, available = bus.seat_map, bus.available_seats
+        if available < request.seat_count:
+            return 0, "Insufficient available seats"
+        if request.seats is not None:
+            bits = seat_bits(request.seats)
+            if taken & bits:
+                return 0, "Seat already taken"
+        else:
+            bits = pick_seats(
+                taken, bus.total_seats, request.seat_count, request.seat_preference
+            )
+            if not bits:
+                return 0, "No seats match the preference"
+        if day:
+            self._trips.reserve(bus, day, bits)
+        else:
+            was_available = bus.available_seats > 0
+            bus.take_seats(bits)
+            self._seats_changed(bus, was_available)
+        return bits, None
+
+    def _claim_hold(
+        self, bus: Bus, request: BookingRequest
+    ) -> Tuple[Optional[SeatHold], Optional[str]]:
+        # Taken out of _holds so expiry cannot free its seats mid-write;
+        # _unreserve puts it back if the ticket is not stored.
+        with self._holds_lock:
+            hold = self._holds.get(request.hold_id)
+            if (
+                hold is None
+                or hold.bus is not bus
+                or seat_bits(hold.seats) != seat_bits(request.seats or ())
+                or hold.travel_date != self._travel_day(request)
+            ):
+                return None, "Hold not found or expired"
+            del self._holds[request.hold_id]
+        return hold, None
+
+    def _unreserve(self, bus: Bus, ticket: Ticket, hold: Optional[SeatHold]) -> None:
+        if hold is None:
+            self._release(bus, ticket)
+            return
+        # The seats stay held until the hold is confirmed, released or
+        # expires; its heap entry may have been skipped while it was out.
+        with self._holds_lock:
+            self._holds[hold.hold_id] = hold
+            self._hold_queue.push(hold.expires_at, hold.hold_id)
+
+    def _release(self, bus: Bus, ticket: Ticket) -> None:
+        self._free_seats(bus, ticket.travel_date, ticket.seats)
 
-        total_price = seat_count * bus.price_per_ticket
-        ticket = Ticket(
-            ticket_id=self.store.get_next_ticket_id(),
+    def _free_seats(self, bus: Bus, day: str, seats: List[int]) -> None:
+        bits = seat_bits(seats)
+        if day:
+            self._trips.release(bus, day, bits)
+        else:
+            was_available = bus.available_seats > 0
+            bus.release_seats(bits, len(seats))
+            self._seats_changed(bus, was_available)
+
+    @timed("book")
+    def book_many(
+        self, requests: Iterable[BookingRequest], atomic: bool = False
+    ) -> List[BatchResult]:
+        self.expire_holds()
+        requests = list(requests)
+        results = [BatchResult(error=self._validate_booking(r)) for r in requests]
+        if atomic and _abort_if_failed(results):
+            return results
+        pending = [
+            (i, self._request_bus(r), r)
+            for i, (r, res) in enumerate(zip(requests, results))
+            if not res.error
+        ]
+        with self._locked_buses(bus for _, bus, _ in pending):
+            # Tickets are built up front (id 0) so a failed batch can be
+            # released through the same path as a cancellation.
+            reserved: List[Tuple[int, Bus, Ticket]] = []
+            claimed: Dict[int, SeatHold] = {}
+            for i, bus, r in pending:
+                if r.hold_id is not None:
+                    hold, error = self._claim_hold(bus, r)
+                    if hold is not None:
+                        claimed[i] = hold
+                        bits = seat_bits(hold.seats)
+                else:
+                    bits, error = self._reserve(bus, r)
+                if error:
+                    results[i].error = error
+                else:
+                    reserved.append((i, bus, self._make_ticket(0, bus, r, bits)))
+            if atomic and _abort_if_failed(results):
+                for i, bus, t in reserved:
+                    self._unreserve(bus, t, claimed.get(i))
+                return results
+            if not reserved:
+                return results
+            try:
+                ticket_ids = self._ticket_ids.allocate(len(reserved))
+                for ticket_id, (_, _, t) in zip(ticket_ids, reserved):
+                    t.ticket_id = ticket_id
+                with self.metrics.timer("book.store"):
+                    errors = self.store.record_bookings(
+                        [(bus, t) for _, bus, t in reserved], atomic
+                    )
+            except Exception:
+                for i, bus, t in reserved:
+                    self._unreserve(bus, t, claimed.get(i))
+                raise
+            self._stored_seats_changed(
+                bus for _, bus, t in reserved if not t.travel_date
+            )
+            for (i, _, _), error in zip(reserved, errors):
+                results[i].error = error
+            if atomic:
+                _abort_if_failed(results)
+            for i, bus, t in reserved:
+                if results[i].error:
+                    self._unreserve(bus, t, claimed.get(i))
+                    continue
+                results[i].ticket = t
+        if self.metrics.enabled:
+            self.metrics.count("book.tickets", sum(1 for r in results if r.ok))
+        return results
+
+    @staticmethod
+    def _travel_day(request: BookingRequest) -> str:
+        if not request.travel_date:
+            return ""
+        return parse_travel_date(request.travel_date).isoformat()
+
+    @classmethod
+    def _make_ticket(
+        cls, ticket_id: int, bus: Bus, request: BookingRequest, bits: int
+    ) -> Ticket:
+        return Ticket(
+            ticket_id=ticket_id,
             bus_id=bus.name,
-            passenger_name=passenger_name,
-            contact_number=contact,
+            passenger_name=request.passenger_name,
+            contact_number=request.contact,
             bus_name=bus.name,
             origin=bus.origin,
             destination=bus.destination,
             departure_time=bus.departure_time,
-            seat_count=seat_count,
-            price_paid=total_price,
+            seat_count=request.seat_count,
+            price_paid=request.seat_count * bus.price_per_ticket,
+            travel_date=cls._travel_day(request),
+            seats=seat_numbers(bits),
         )
 
-        self.tickets.append(ticket)
-        self.store.save_buses(self.buses)
-        self.store.save_tickets(self.tickets)
-        return ticket
+    def _find_ticket(self, ticket_id: int) -> Optional[Ticket]:
+        return self.store.find_ticket(ticket_id)
 
     def cancel_ticket(self, ticket_id: int) -> bool:
-        for idx, t in enumerate(self.tickets):
-            if t.ticket_id == int(ticket_id):
-                bus = self.get_bus_by_name(t.bus_name)
-                if bus:
-                    bus.refund_seat(t.seat_count)
-                del self.tickets[idx]
-                self.store.save_buses(self.buses)
-                self.store.save_tickets(self.tickets)
-                return True
-        return False
+        (result,) = self.cancel_many([ticket_id])
+        return result.ok
+
+    @timed("cancel")
+    def cancel_many(
+        self, ticket_ids: Iterable[int], atomic: bool = False
+    ) -> List[BatchResult]:
+        results: List[BatchResult] = []
+        seen = set()
+        for ticket_id in ticket_ids:
+            t = None if int(ticket_id) in seen else self._find_ticket(int(ticket_id))
+            seen.add(int(ticket_id))
+            results.append(BatchResult(t, None if t else "Ticket not found"))
+        if atomic and _abort_if_failed(results):
+            return results
+        pending = [
+            (res, self._ticket_bus(res.ticket))
+            for res in results
+            if res.ticket is not None
+        ]
+        with self._locked_buses(bus for _, bus in pending if bus):
+            # The store decides whether each ticket still exists, so a ticket
+            # cancelled twice (here or in another process) is refunded once.
+            with self.metrics.timer("cancel.store"):
+                cancelled = self.store.record_cancellations(
+                    [(bus, res.ticket) for res, bus in pending]
+                )
+            self._stored_seats_changed(
+                bus
+                for (res, bus), ok in zip(pending, cancelled)
+                if ok and bus and not res.ticket.travel_date
+            )
+            for (res, bus), ok in zip(pending, cancelled):
+                t = res.ticket
+                if not ok:
+                    res.error = "Ticket not found"
+                elif bus:
+                    self._release(bus, t)
+        self._promote(
+            (bus, res.ticket.travel_date)
+            for (res, bus), ok in zip(pending, cancelled)
+            if ok and bus
+        )
+        if self.metrics.enabled:
+            self.metrics.count("cancel.tickets", sum(1 for r in results if r.ok))
+        return results
+
+    def join_waitlist(
+        self,
+        bus_name: str,
+        passenger_name: str,
+        contact: str,
+        seat_count: int,
+        travel_date: str = "",
+        seat_preference: str = "",
+        priority: int = 0,
+        origin: str = "",
+        destination: str = "",
+    ) -> WaitlistEntry:
+        """Queue a booking for a sold-out departure.
+
+        It is booked once cancellations free enough seats for it and for
+        everyone ahead of it: higher priorities first, then in joining order.
+        """
+        request = BookingRequest(
+            bus_name,
+            passenger_name,
+            contact,
+            seat_count,
+            travel_date,
+            seat_preference,
+            origin=origin,
+            destination=destination,
+        )
+        error = self._validate_booking(request)
+        if error:
+            raise ValueError(error)
+        bus = self._request_bus(request)
+        assert bus is not None
+        if seat_count > bus.total_seats:
+            raise ValueError(f"The bus has only {bus.total_seats} seats")
+        day = self._travel_day(request)
+        if self._available(bus, day) >= seat_count:
+            raise ValueError("Seats are available; book them instead")
+        entry = WaitlistEntry(
+            0,
+            bus.name,
+            bus.origin,
+            bus.destination,
+            bus.departure_time,
+            day,
+            passenger_name,
+            contact,
+            seat_count,
+            seat_preference,
+            priority,
+            time.time(),
+        )
+        (entry,) = self.store.add_to_waitlist([entry])
+        # Seats freed since the check above would otherwise wait for the
+        # next cancellation.
+        self._promote([(bus, day)])
+        return entry
+
+    def leave_waitlist(self, entry_id: int) -> bool:
+        (removed,) = self.store.remove_from_waitlist([entry_id])
+        return removed
+
+    def waitlist(self, contact: str = "") -> List[WaitlistEntry]:
+        """Waiting entries in joining order, optionally for one contact."""
+        entries = self.store.load_waitlist()
+        if contact:
+            key = contact_key(contact)
+            entries = [e for e in entries if contact_key(e.contact_number) == key]
+        return entries
+
+    def _available(self, bus: Bus, day: str) -> int:
+        return self._trips.available(bus, day) if day else bus.available_seats
+
+    def _promote(self, departures: Iterable[Tuple[Bus, str]]) -> List[Ticket]:
+        # Each departure's queue is read only as far as its free seats reach
+        # and stops at the first entry that does not fit, so nobody is
+        # overtaken by a smaller party. Whatever is promoted is booked in
+        # one batch.
+        chosen: List[WaitlistEntry] = []
+        seen = set()
+        for bus, day in departures:
+            if (id(bus), day) in seen:
+                continue
+            seen.add((id(bus), day))
+            free = self._available(bus, day)
+            if free <= 0:
+                continue
+            for entry in self.store.waitlist_head(bus_trip_key(bus), day, free):
+                if entry.seat_count > free:
+                    break
+                chosen.append(entry)
+                free -= entry.seat_count
+        if not chosen:
+            return []
+        # Removing is the claim: another thread or process promoting the
+        # same departure gets False for the entries taken here.
+        claimed = self.store.remove_from_waitlist([e.entry_id for e in chosen])
+        chosen = [e for e, ok in zip(chosen, claimed) if ok]
+        results = self.book_many(
+            BookingRequest(
+                e.bus_name,
+                e.passenger_name,
+                e.contact_number,
+                e.seat_count,
+                e.travel_date,
+                e.seat_preference,
+                origin=e.origin,
+                destination=e.destination,
+            )
+            for e in chosen
+        )
+        # Lost a race for the seats: back in line under the same ID, so
+        # the entry keeps its place. Other errors (the bus was removed, the
+        # day has passed) can never succeed.
+        retry = [
+            e for e, r in zip(chosen, results) if r.error in _WAITLIST_RETRY_ERRORS
+        ]
+        if retry:
+            self.store.add_to_waitlist(retry)
+        tickets = [r.ticket for r in results if r.ticket is not None]
+        if self.metrics.enabled:
+            self.metrics.count("waitlist.promoted", len(tickets))
+        return tickets
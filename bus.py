@@ -3,9 +3,22 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Any, Optional
 
+from seat_map import count_seats, decode_seats, encode_seats, full_mask
+
 
 @dataclass
 class Bus:
+    __slots__ = (
+        "name",
+        "origin",
+        "destination",
+        "departure_time",
+        "total_seats",
+        "price_per_ticket",
+        "available_seats",
+        "seat_map",
+    )
+
     name: str
     origin: str
     destination: str
@@ -13,6 +26,7 @@ class Bus:
     total_seats: int
     price_per_ticket: int
     available_seats: int
+    seat_map: int
 
     def __init__(
         self,
@@ -23,6 +37,7 @@ class Bus:
         total_seats: int,
         price_per_ticket: int,
         available_seats: Optional[int] = None,
+        seat_map: int = 0,
     ) -> None:
         if not name.strip():
             raise ValueError("Bus name must be a non-empty string")
@@ -44,6 +59,7 @@ class Bus:
         )
         if self.available_seats < 0 or self.available_seats > self.total_seats:
             raise ValueError("Available seats must be between 0 and total seats")
+        self.seat_map = int(seat_map) & full_mask(self.total_seats)
 
     def get_available_seats(self) -> int:
         return self.available_seats
@@ -64,6 +80,18 @@ class Bus:
             return True
         return False
 
+    def take_seats(self, bits: int) -> bool:
+        count = count_seats(bits)
+        if not bits or self.seat_map & bits or self.available_seats < count:
+            return False
+        self.seat_map |= bits
+        self.available_seats -= count
+        return True
+
+    def release_seats(self, bits: int, count: int) -> bool:
+        self.seat_map &= ~bits
+        return self.refund_seat(count)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "name": self.name,
@@ -73,10 +101,23 @@ class Bus:
             "total_seats": self.total_seats,
             "price_per_ticket": self.price_per_ticket,
             "available_seats": self.available_seats,
+            "seat_map": encode_seats(self.seat_map),
         }
 
     @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "Bus":
+    def from_dict(data: Dict[str, Any], trusted: bool = False) -> "Bus":
+        if trusted:
+            # Written by a store after validation; only decode the seat map.
+            b = object.__new__(Bus)
+            b.name = data["name"]
+            b.origin = data["origin"]
+            b.destination = data["destination"]
+            b.departure_time = data["departure_time"]
+            b.total_seats = data["total_seats"]
+            b.price_per_ticket = data["price_per_ticket"]
+            b.available_seats = data.get("available_seats", data["total_seats"])
+            b.seat_map = decode_seats(data.get("seat_map", ""))
+            return b
         return Bus(
             name=data["name"],
             origin=data["origin"],
@@ -87,4 +128,5 @@ class Bus:
             available_seats=int(
                 data.get("available_seats", data.get("total_seats", 0))
             ),
+            seat_map=decode_seats(data.get("seat_map", "")),
         )
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import sys
-from typing import List, Optional, Callable
+import time
+from typing import Any, List, Optional, Callable, Tuple
 
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QFont, QPalette, QColor
+from PyQt6.QtCore import (
+    QAbstractTableModel,
+    QModelIndex,
+    QObject,
+    QStringListModel,
+    Qt,
+    QThread,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt6.QtGui import QCloseEvent, QFont, QPalette, QColor
 from PyQt6.QtWidgets import (
     QApplication,
     QComboBox,
+    QCompleter,
     QDialog,
     QHBoxLayout,
     QLabel,
@@ -15,18 +27,239 @@ from PyQt6.QtWidgets import (
     QMainWindow,
     QMessageBox,
     QGraphicsDropShadowEffect,
+    QHeaderView,
     QPushButton,
     QSpinBox,
     QTabWidget,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
     QWidget,
 )
 
 from booking_system import BookingSystem
 from bus import Bus
+from holds import SeatHold
 from ticket import Ticket
+from waitlist import WaitlistEntry
+
+# A bus as the booking form picks it: name, origin and destination.
+BusKey = Tuple[str, str, str]
+
+
+class StoreWorker(QObject):
+    """Does all store reads and writes on the I/O thread.
+
+    Reloaded state is applied here as well, so a reload never overlaps a
+    booking.
+    """
+
+    loaded = pyqtSignal()
+    booked = pyqtSignal(object)
+    booking_failed = pyqtSignal(str)
+    waitlisted = pyqtSignal(object)
+    held = pyqtSignal(object)
+    hold_failed = pyqtSignal(str)
+    # Held seats went back on sale, possibly to waitlisted passengers.
+    seats_released = pyqtSignal()
+
+    def __init__(self, system: BookingSystem) -> None:
+        super().__init__()
+        self.system = system
+        self.version: Tuple = ()
+
+    @pyqtSlot()
+    def load(self) -> None:
+        self.version = self.system.store.version()
+        self.system.apply_state(self.system.fetch_initial_state())
+        self.loaded.emit()
+
+    @pyqtSlot()
+    def check(self) -> None:
+        version = self.system.store.version()
+        if version == self.version:
+            return
+        self.version = version
+        self.system.apply_state(self.system.fetch_state())
+        self.loaded.emit()
+
+    @pyqtSlot(object, str, str, int, str)
+    def book(
+        self, bus: BusKey, passenger: str, contact: str, count: int, preference: str
+    ) -> None:
+        name, origin, destination = bus
+        try:
+            ticket = self.system.book_ticket(
+                name,
+                passenger,
+                contact,
+                count,
+                seat_preference=preference,
+                origin=origin,
+                destination=destination,
+            )
+        except (ValueError, OSError) as e:
+            self.booking_failed.emit(str(e))
+            return
+        self.booked.emit(ticket)
+
+    @pyqtSlot(int, str, str)
+    def confirm(self, hold_id: int, passenger: str, contact: str) -> None:
+        try:
+            ticket = self.system.confirm_hold(hold_id, passenger, contact)
+        except (ValueError, OSError) as e:
+            self.booking_failed.emit(str(e))
+            return
+        self.booked.emit(ticket)
+
+    @pyqtSlot(object, str, str, int, str)
+    def join_waitlist(
+        self, bus: BusKey, passenger: str, contact: str, count: int, preference: str
+    ) -> None:
+        name, origin, destination = bus
+        try:
+            entry = self.system.join_waitlist(
+                name,
+                passenger,
+                contact,
+                count,
+                seat_preference=preference,
+                origin=origin,
+                destination=destination,
+            )
+        except (ValueError, OSError) as e:
+            self.booking_failed.emit(str(e))
+            return
+        self.waitlisted.emit(entry)
+
+    @pyqtSlot(object, int, str)
+    def hold(self, bus: BusKey, count: int, preference: str) -> None:
+        name, origin, destination = bus
+        try:
+            hold = self.system.hold_seats(
+                name,
+                count,
+                seat_preference=preference,
+                origin=origin,
+                destination=destination,
+            )
+        except (ValueError, OSError) as e:
+            self.hold_failed.emit(str(e))
+            return
+        self.held.emit(hold)
+
+    # Releasing seats promotes waitlisted passengers, which writes tickets,
+    # so it happens here rather than on the UI thread.
+    @pyqtSlot(int)
+    def release(self, hold_id: int) -> None:
+        try:
+            self.system.release_hold(hold_id)
+        except OSError as e:
+            self.hold_failed.emit(str(e))
+        self.seats_released.emit()
+
+    @pyqtSlot()
+    def expire_holds(self) -> None:
+        try:
+            self.system.expire_holds()
+        except OSError as e:
+            self.hold_failed.emit(str(e))
+        self.seats_released.emit()
+
+
+class StoreWatcher(QObject):
+    """Reloads the booking system only when the store's version changes.
+
+    Version checks, reloads and bookings run on a dedicated I/O thread;
+    results come back to the UI thread through signals. The first load
+    happens there too, so the window shows before the store is read.
+    """
+
+    changed = pyqtSignal()
+    booked = pyqtSignal(object)
+    booking_failed = pyqtSignal(str)
+    waitlisted = pyqtSignal(object)
+    held = pyqtSignal(object)
+    hold_failed = pyqtSignal(str)
+    _load_requested = pyqtSignal()
+    _check_requested = pyqtSignal()
+    _book_requested = pyqtSignal(object, str, str, int, str)
+    _confirm_requested = pyqtSignal(int, str, str)
+    _waitlist_requested = pyqtSignal(object, str, str, int, str)
+    _hold_requested = pyqtSignal(object, int, str)
+    _release_requested = pyqtSignal(int)
+    _expire_requested = pyqtSignal()
+
+    def __init__(
+        self,
+        system: BookingSystem,
+        interval_ms: int = 1000,
+        parent: Optional[QObject] = None,
+    ) -> None:
+        super().__init__(parent)
+        self.system = system
+        self.io_thread = QThread(self)
+        self.worker = StoreWorker(system)
+        self.worker.moveToThread(self.io_thread)
+        self.io_thread.finished.connect(self.worker.deleteLater)
+        self._load_requested.connect(self.worker.load)
+        self._check_requested.connect(self.worker.check)
+        self._book_requested.connect(self.worker.book)
+        self._confirm_requested.connect(self.worker.confirm)
+        self._waitlist_requested.connect(self.worker.join_waitlist)
+        self._hold_requested.connect(self.worker.hold)
+        self._release_requested.connect(self.worker.release)
+        self._expire_requested.connect(self.worker.expire_holds)
+        self.worker.loaded.connect(self.changed)
+        self.worker.seats_released.connect(self.changed)
+        self.worker.held.connect(self.held)
+        self.worker.hold_failed.connect(self.hold_failed)
+        self.worker.booked.connect(self.booked)
+        self.worker.booking_failed.connect(self.booking_failed)
+        self.worker.waitlisted.connect(self.waitlisted)
+        self.io_thread.start()
+        # Once the event loop runs, so building the window does not compete
+        # with the load for the interpreter.
+        QTimer.singleShot(0, self._load_requested.emit)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._check_requested)
+        self.timer.start(interval_ms)
+
+    def book(
+        self,
+        bus: BusKey,
+        passenger: str,
+        contact: str,
+        count: int,
+        preference: str = "",
+    ) -> None:
+        self._book_requested.emit(bus, passenger, contact, count, preference)
+
+    def confirm(self, hold_id: int, passenger: str, contact: str) -> None:
+        self._confirm_requested.emit(hold_id, passenger, contact)
+
+    def join_waitlist(
+        self,
+        bus: BusKey,
+        passenger: str,
+        contact: str,
+        count: int,
+        preference: str = "",
+    ) -> None:
+        self._waitlist_requested.emit(bus, passenger, contact, count, preference)
+
+    def hold(self, bus: BusKey, count: int, preference: str = "") -> None:
+        self._hold_requested.emit(bus, count, preference)
+
+    def release_hold(self, hold_id: int) -> None:
+        self._release_requested.emit(hold_id)
+
+    def expire_holds(self) -> None:
+        self._expire_requested.emit()
+
+    def stop(self) -> None:
+        self.timer.stop()
+        self.io_thread.quit()
+        self.io_thread.wait()
 
 
 class ReceiptDialog(QDialog):
@@ -47,6 +280,7 @@ class ReceiptDialog(QDialog):
             ("Route", f"{ticket.origin} -> {ticket.destination}"),
             ("Departure", ticket.departure_time),
             ("Seats", str(ticket.seat_count)),
+            ("Seat Numbers", ", ".join(str(s) for s in ticket.seats) or "-"),
             ("Amount Paid", f"{ticket.price_paid} BDT"),
         ]
         for key, val in info:
@@ -77,78 +311,152 @@ class ReceiptDialog(QDialog):
         self.setLayout(outer)
 
 
+class BusTableModel(QAbstractTableModel):
+    """Bus rows for table views and combo boxes, rendered on demand.
+
+    ``refresh`` emits ``dataChanged`` for rows whose seats changed and only
+    resets the model when the set of buses itself changes.
+    """
+
+    HEADERS = [
+        "Bus Name",
+        "Route",
+        "Departure",
+        "Price (BDT)",
+        "Seats (Avail/Total)",
+    ]
+    SEATS_COLUMN = 4
+    # Extra column holding the combo box label; hidden in table views.
+    LABEL_COLUMN = 5
+
+    def __init__(
+        self, fetch: Callable[[], List[Bus]], parent: Optional[QObject] = None
+    ) -> None:
+        super().__init__(parent)
+        self.fetch = fetch
+        self._buses: List[Bus] = []
+        self._keys: List[Tuple[str, str, str, str]] = []
+        self._seats: List[int] = []
+        self.refresh()
+
+    def refresh(self) -> None:
+        buses = self.fetch()
+        keys = [(b.name, b.origin, b.destination, b.departure_time) for b in buses]
+        seats = [b.available_seats for b in buses]
+        if keys != self._keys:
+            self.beginResetModel()
+            self._buses, self._keys, self._seats = buses, keys, seats
+            self.endResetModel()
+            return
+        self._buses = buses
+        for row, (old, new) in enumerate(zip(self._seats, seats)):
+            if old != new:
+                self.dataChanged.emit(
+                    self.index(row, self.SEATS_COLUMN),
+                    self.index(row, self.LABEL_COLUMN),
+                )
+        self._seats = seats
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._buses)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS) + 1
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        b = self._buses[index.row()]
+        if role == Qt.ItemDataRole.UserRole:
+            # Names repeat across routes, so the route picks the row.
+            return (b.name, b.origin, b.destination)
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        col = index.column()
+        if col == 0:
+            return b.name
+        if col == 1:
+            return f"{b.origin} -> {b.destination}"
+        if col == 2:
+            return b.departure_time
+        if col == 3:
+            return str(b.price_per_ticket)
+        if col == self.SEATS_COLUMN:
+            return f"{self._seats[index.row()]}/{b.total_seats}"
+        label = f"{b.name} ({b.origin}->{b.destination} {b.departure_time})"
+        # Sold-out buses stay listed in the booking form for the waitlist.
+        return label if self._seats[index.row()] > 0 else label + " - sold out"
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if (
+            role == Qt.ItemDataRole.DisplayRole
+            and orientation == Qt.Orientation.Horizontal
+            and section < len(self.HEADERS)
+        ):
+            return self.HEADERS[section]
+        return None
+
+
+def _make_bus_table(model: BusTableModel) -> QTableView:
+    table = QTableView()
+    table.setModel(model)
+    table.setColumnHidden(BusTableModel.LABEL_COLUMN, True)
+    table.horizontalHeader().setStretchLastSection(True)
+    # Fixed row heights let the view lay out only the rows on screen.
+    table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    table.setAlternatingRowColors(True)
+    table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+    table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+    return table
+
+
 class AvailableBusesTab(QWidget):
-    def __init__(self, system: BookingSystem) -> None:
+    def __init__(
+        self, system: BookingSystem, model: Optional[BusTableModel] = None
+    ) -> None:
         super().__init__()
         self.system = system
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(
-            [
-                "Bus Name",
-                "Route",
-                "Departure",
-                "Price (BDT)",
-                "Seats (Avail/Total)",
-            ]
+        self.model = (
+            model
+            if model is not None
+            else BusTableModel(system.list_available_buses, self)
         )
-        self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table = _make_bus_table(self.model)
         layout = QVBoxLayout()
         layout.addWidget(self.table)
         self.setLayout(layout)
-        self.refresh()
-
-        # Auto-reload timer (every 5 seconds)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.auto_reload)
-        self.timer.start(5000)  # 5 seconds
-
-    def auto_reload(self) -> None:
-        self.system.buses = self.system.store.load_buses()
-        self.system.tickets = self.system.store.load_tickets()
-        self.refresh()
 
     def refresh(self) -> None:
-        buses: List[Bus] = self.system.list_available_buses()
-        self.table.setRowCount(len(buses))
-        for row, b in enumerate(buses):
-            self.table.setItem(row, 0, QTableWidgetItem(b.name))
-            self.table.setItem(
-                row, 1, QTableWidgetItem(f"{b.origin} -> {b.destination}")
-            )
-            self.table.setItem(row, 2, QTableWidgetItem(b.departure_time))
-            self.table.setItem(row, 3, QTableWidgetItem(str(b.price_per_ticket)))
-            self.table.setItem(
-                row, 4, QTableWidgetItem(f"{b.available_seats}/{b.total_seats}")
-            )
+        self.model.refresh()
 
 
 class SearchTab(QWidget):
+    # Typing restarts this delay; the search runs once the user pauses.
+    SEARCH_DELAY_MS = 200
+
     def __init__(self, system: BookingSystem) -> None:
         super().__init__()
         self.system = system
         self.origin_input = QLineEdit()
         self.destination_input = QLineEdit()
+        self.origin_suggestions = self._add_completer(self.origin_input)
+        self.destination_suggestions = self._add_completer(self.destination_input)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search)
+        self.origin_input.textEdited.connect(self.on_origin_edited)
+        self.destination_input.textEdited.connect(self.on_destination_edited)
         self.search_btn = QPushButton("Search")
         self.search_btn.clicked.connect(self.search)
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(
-            [
-                "Bus Name",
-                "Route",
-                "Departure",
-                "Price (BDT)",
-                "Seats (Avail/Total)",
-            ]
-        )
-        self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.last_query: Optional[Tuple[str, str]] = None
+        self.model = BusTableModel(self._results, self)
+        self.table = _make_bus_table(self.model)
         form = QHBoxLayout()
         form.addWidget(QLabel("Origin:"))
         form.addWidget(self.origin_input)
@@ -160,46 +468,107 @@ class SearchTab(QWidget):
         layout.addWidget(self.table)
         self.setLayout(layout)
 
-        # Auto-reload timer (every 5 seconds)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.auto_reload)
-        self.timer.start(5000)  # 5 seconds
+    def _add_completer(self, line_edit: QLineEdit) -> QStringListModel:
+        suggestions = QStringListModel(self)
+        completer = QCompleter(suggestions, self)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        line_edit.setCompleter(completer)
+        return suggestions
 
-    def auto_reload(self) -> None:
-        self.system.buses = self.system.store.load_buses()
-        self.system.tickets = self.system.store.load_tickets()
+    def _results(self) -> List[Bus]:
+        if not self.last_query or not any(self.last_query):
+            return []
+        return self.system.search_routes(*self.last_query)
+
+    def refresh(self) -> None:
+        self.model.refresh()
+
+    def on_origin_edited(self, text: str) -> None:
+        self._suggest(self.origin_input, self.origin_suggestions, text)
+
+    def on_destination_edited(self, text: str) -> None:
+        origin = self.origin_input.text()
+        self._suggest(
+            self.destination_input, self.destination_suggestions, text, origin
+        )
+
+    def _suggest(
+        self,
+        line_edit: QLineEdit,
+        suggestions: QStringListModel,
+        text: str,
+        origin: str = "",
+    ) -> None:
+        suggestions.setStringList(self.system.suggest_cities(text, origin))
+        completer = line_edit.completer()
+        if text.strip() and completer is not None:
+            completer.complete()
+        self.search_timer.start()
 
     def search(self) -> None:
+        self.search_timer.stop()
         origin = self.origin_input.text().strip()
         destination = self.destination_input.text().strip()
-        results: List[Bus] = self.system.search_buses(origin, destination)
-        self.table.setRowCount(len(results))
-        for row, b in enumerate(results):
-            self.table.setItem(row, 0, QTableWidgetItem(b.name))
-            self.table.setItem(
-                row, 1, QTableWidgetItem(f"{b.origin} -> {b.destination}")
-            )
-            self.table.setItem(row, 2, QTableWidgetItem(b.departure_time))
-            self.table.setItem(row, 3, QTableWidgetItem(str(b.price_per_ticket)))
-            self.table.setItem(
-                row, 4, QTableWidgetItem(f"{b.available_seats}/{b.total_seats}")
-            )
+        self.run_search(origin, destination)
+
+    def run_search(self, origin: str, destination: str) -> None:
+        self.last_query = (origin, destination)
+        self.model.refresh()
 
 
 class BookTab(QWidget):
     def __init__(
-        self, system: BookingSystem, on_refresh: Optional[Callable[[], None]] = None
+        self,
+        system: BookingSystem,
+        on_refresh: Optional[Callable[[], None]] = None,
+        model: Optional[BusTableModel] = None,
+        io: Optional[StoreWatcher] = None,
     ) -> None:
         super().__init__()
         self.system = system
         self.on_refresh = on_refresh
+        self.io = io
+        if io is not None:
+            io.booked.connect(self.on_booked)
+            io.booking_failed.connect(self.on_booking_failed)
+            io.waitlisted.connect(self.on_waitlisted)
+            io.held.connect(self.on_held)
+            io.hold_failed.connect(self.on_hold_failed)
+        # Every bus, sold out or not: a full one can still be waitlisted.
+        self.model = (
+            model if model is not None else BusTableModel(system.list_buses, self)
+        )
         self.bus_select = QComboBox()
+        self.bus_select.setModel(self.model)
+        self.bus_select.setModelColumn(BusTableModel.LABEL_COLUMN)
         self.name_input = QLineEdit()
         self.contact_input = QLineEdit()
         self.seat_spin = QSpinBox()
         self.seat_spin.setRange(1, 100)
+        self.preference_select = QComboBox()
+        for label, preference in (
+            ("Any seat", ""),
+            ("Window", "window"),
+            ("Aisle", "aisle"),
+            ("Seated together", "together"),
+        ):
+            self.preference_select.addItem(label, preference)
+        self.hold: Optional[SeatHold] = None
+        # The last booking sent, offered a waitlist place if it sells out.
+        self.last_request: Optional[Tuple[BusKey, str, str, int, str]] = None
+        self.hold_label = QLabel("")
+        self.hold_timer = QTimer(self)
+        self.hold_timer.setSingleShot(True)
+        self.hold_timer.timeout.connect(self.on_hold_expired)
+        self.hold_btn = QPushButton("Hold Seats")
+        self.hold_btn.clicked.connect(self.hold_seats)
         self.book_btn = QPushButton("Book Ticket")
         self.book_btn.clicked.connect(self.book)
+        # Held seats belong to the selection they were taken for. Only user
+        # choices count: a hold on a bus's last seats drops it from the list.
+        self.bus_select.activated.connect(self.release_hold)
+        self.seat_spin.valueChanged.connect(self.release_hold)
+        self.preference_select.activated.connect(self.release_hold)
         form = QVBoxLayout()
         row1 = QHBoxLayout()
         row1.addWidget(QLabel("Bus:"))
@@ -213,67 +582,221 @@ class BookTab(QWidget):
         row4 = QHBoxLayout()
         row4.addWidget(QLabel("Seats:"))
         row4.addWidget(self.seat_spin)
+        row4.addWidget(QLabel("Preference:"))
+        row4.addWidget(self.preference_select)
         form.addLayout(row1)
         form.addLayout(row2)
         form.addLayout(row3)
         form.addLayout(row4)
-        form.addWidget(self.book_btn)
+        form.addWidget(self.hold_label)
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.hold_btn)
+        buttons.addWidget(self.book_btn)
+        form.addLayout(buttons)
         self.setLayout(form)
-        self.reload_buses()
-
-        # Auto-reload timer (every 5 seconds)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.auto_reload)
-        self.timer.start(5000)  # 5 seconds
 
-    def auto_reload(self) -> None:
-        self.system.buses = self.system.store.load_buses()
-        self.system.tickets = self.system.store.load_tickets()
-        self.reload_buses()
+    def reload_buses(self) -> None:
+        self.model.refresh()
         if self.on_refresh:
             self.on_refresh()
 
-    def reload_buses(self) -> None:
-        self.bus_select.clear()
-        for b in self.system.list_available_buses():
-            self.bus_select.addItem(
-                f"{b.name} ({b.origin}->{b.destination} {b.departure_time})",
-                userData=b.name,
+    def hold_seats(self) -> None:
+        bus = self.bus_select.currentData()
+        if not bus:
+            QMessageBox.warning(self, "Validation", "Please select a bus.")
+            return
+        self.release_hold()
+        count = int(self.seat_spin.value())
+        preference = self.preference_select.currentData()
+        if self.io is not None:
+            self.hold_btn.setEnabled(False)
+            self.io.hold(bus, count, preference)
+            return
+        name, origin, destination = bus
+        try:
+            hold = self.system.hold_seats(
+                name,
+                count,
+                seat_preference=preference,
+                origin=origin,
+                destination=destination,
             )
+        except ValueError as e:
+            self.on_hold_failed(str(e))
+            return
+        self.on_held(hold)
+
+    def on_held(self, hold: SeatHold) -> None:
+        self.hold_btn.setEnabled(True)
+        self.hold = hold
+        ttl = max(0.0, hold.expires_at - time.time())
+        self.hold_timer.start(int(ttl * 1000) + 100)
+        until = time.strftime("%H:%M:%S", time.localtime(hold.expires_at))
+        seats = ", ".join(str(s) for s in hold.seats)
+        self.hold_label.setText(f"Seats {seats} held until {until}")
+        self.reload_buses()
+
+    def on_hold_failed(self, message: str) -> None:
+        self.hold_btn.setEnabled(True)
+        QMessageBox.warning(self, "Hold Failed", message)
+
+    def release_hold(self) -> None:
+        if self.hold is None:
+            return
+        hold_id = self.hold.hold_id
+        self._clear_hold()
+        if self.io is not None:
+            # The lists refresh when the watcher reports the seats freed.
+            self.io.release_hold(hold_id)
+            return
+        self.system.release_hold(hold_id)
+        self.reload_buses()
+
+    def on_hold_expired(self) -> None:
+        # get_hold needs no I/O: a hold past its expiry time is gone.
+        if self.hold is not None and self.system.get_hold(self.hold.hold_id) is None:
+            self._clear_hold()
+            self.hold_label.setText("Hold expired")
+        if self.io is not None:
+            self.io.expire_holds()
+            return
+        self.system.expire_holds()
+        self.reload_buses()
+
+    def _clear_hold(self) -> None:
+        self.hold = None
+        self.hold_timer.stop()
+        self.hold_label.setText("")
 
     def book(self) -> None:
-        bus_name = self.bus_select.currentData()
+        bus = self.bus_select.currentData()
         passenger = self.name_input.text().strip()
         contact = self.contact_input.text().strip()
         count = int(self.seat_spin.value())
-        if not bus_name:
+        preference = self.preference_select.currentData()
+        hold_id = self.hold.hold_id if self.hold is not None else None
+        if not bus and hold_id is None:
             QMessageBox.warning(self, "Validation", "Please select a bus.")
             return
-        try:
-            ticket = self.system.book_ticket(bus_name, passenger, contact, count)
-        except ValueError as e:
-            QMessageBox.warning(self, "Booking Failed", str(e))
+        self.last_request = (
+            None
+            if hold_id is not None
+            else (bus, passenger, contact, count, preference)
+        )
+        if self.io is None:
+            try:
+                if hold_id is not None:
+                    ticket = self.system.confirm_hold(hold_id, passenger, contact)
+                else:
+                    name, origin, destination = bus
+                    ticket = self.system.book_ticket(
+                        name,
+                        passenger,
+                        contact,
+                        count,
+                        seat_preference=preference,
+                        origin=origin,
+                        destination=destination,
+                    )
+            except ValueError as e:
+                self.on_booking_failed(str(e))
+                return
+            self.on_booked(ticket)
             return
+        self.book_btn.setEnabled(False)
+        self.hold_btn.setEnabled(False)
+        self.book_btn.setText("Booking...")
+        if hold_id is not None:
+            self.io.confirm(hold_id, passenger, contact)
+        else:
+            self.io.book(bus, passenger, contact, count, preference)
+
+    def on_booked(self, ticket: Ticket) -> None:
+        self.book_btn.setText("Confirmed")
+        QTimer.singleShot(1500, self.reset_book_button)
+        # The hold became this ticket; clear it before the form reset below
+        # would release it.
+        self._clear_hold()
         self.name_input.clear()
         self.contact_input.clear()
         self.seat_spin.setValue(1)
         self.reload_buses()
-        if self.on_refresh:
-            self.on_refresh()
         dlg = ReceiptDialog(ticket, self)
         dlg.exec()
 
+    def on_booking_failed(self, message: str) -> None:
+        self.reset_book_button()
+        # A failed confirmation still keeps the hold if it is live, e.g. when
+        # the passenger name was missing.
+        if self.hold is not None and self.system.get_hold(self.hold.hold_id) is None:
+            self._clear_hold()
+            self.reload_buses()
+        request, self.last_request = self.last_request, None
+        if request is not None and message == "Insufficient available seats":
+            answer = QMessageBox.question(
+                self,
+                "Booking Failed",
+                f"{message}. Join the waitlist? The ticket is booked "
+                "automatically if seats are cancelled.",
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                self.join_waitlist(*request)
+            return
+        QMessageBox.warning(self, "Booking Failed", message)
+
+    def join_waitlist(
+        self, bus: BusKey, passenger: str, contact: str, count: int, preference: str
+    ) -> None:
+        if self.io is not None:
+            self.io.join_waitlist(bus, passenger, contact, count, preference)
+            return
+        name, origin, destination = bus
+        try:
+            entry = self.system.join_waitlist(
+                name,
+                passenger,
+                contact,
+                count,
+                seat_preference=preference,
+                origin=origin,
+                destination=destination,
+            )
+        except ValueError as e:
+            self.on_booking_failed(str(e))
+            return
+        self.on_waitlisted(entry)
+
+    def on_waitlisted(self, entry: WaitlistEntry) -> None:
+        QMessageBox.information(
+            self,
+            "Waitlisted",
+            f"{entry.passenger_name} is on the waitlist for {entry.bus_name} "
+            f"(entry {entry.entry_id}).",
+        )
+
+    def reset_book_button(self) -> None:
+        self.book_btn.setText("Book Ticket")
+        self.book_btn.setEnabled(True)
+        self.hold_btn.setEnabled(True)
+
 
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("Bus Ticket Booking System")
         self.resize(950, 640)
-        self.system = BookingSystem()
+        # The store is loaded on the watcher's I/O thread; until then the
+        # tabs show an empty system.
+        self.system = BookingSystem(load=False)
         self.tabs = QTabWidget()
-        self.available_tab = AvailableBusesTab(self.system)
+        self.available_model = BusTableModel(self.system.list_available_buses, self)
+        self.available_tab = AvailableBusesTab(self.system, self.available_model)
         self.search_tab = SearchTab(self.system)
-        self.book_tab = BookTab(self.system, on_refresh=self.available_tab.refresh)
+        self.watcher = StoreWatcher(self.system, parent=self)
+        self.book_tab = BookTab(
+            self.system, on_refresh=self.refresh_lists, io=self.watcher
+        )
+        self.watcher.changed.connect(self.book_tab.reload_buses)
         self.tabs.addTab(self.available_tab, "Available Buses")
         self.tabs.addTab(self.search_tab, "Search")
         self.tabs.addTab(self.book_tab, "Book Ticket")
@@ -282,6 +805,16 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.tabs)
         container.setLayout(layout)
         self.setCentralWidget(container)
+        self.statusBar().showMessage("Loading buses...")
+        self.watcher.changed.connect(self.statusBar().clearMessage)
+
+    def refresh_lists(self) -> None:
+        self.available_model.refresh()
+        self.search_tab.refresh()
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.watcher.stop()
+        super().closeEvent(event)
 
 
 def run_app() -> None:
@@ -326,8 +859,8 @@ def _apply_material_dark_theme(app: QApplication) -> None:
     QPushButton:disabled { background-color: #3A3E44; color: #9AA0A6; }
     QLineEdit, QComboBox, QSpinBox { background: #26292D; border: 1px solid #2C2F33; border-radius: 8px; padding: 6px 8px; }
     QLineEdit:focus, QComboBox:focus, QSpinBox:focus { border: 1px solid #6200EE; }
-    QTableWidget { background: #26292D; alternate-background-color: #2C2F33; gridline-color: #2C2F33; selection-background-color: #6200EE; selection-color: #FFFFFF; }
+    QTableView { background: #26292D; alternate-background-color: #2C2F33; gridline-color: #2C2F33; selection-background-color: #6200EE; selection-color: #FFFFFF; }
     QHeaderView::section { background-color: #2C2F33; color: #E0E0E0; padding: 6px; border: none; border-right: 1px solid #1E2022; }
-    QTableWidget::item { padding: 6px; }
+    QTableView::item { padding: 6px; }
     """
     app.setStyleSheet(stylesheet)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from bus import Bus
+
+
+@dataclass
+class SeatHold:
+    hold_id: int
+    bus: Bus
+    seats: List[int]
+    expires_at: float
+    travel_date: str = ""
+
+    @property
+    def seat_count(self) -> int:
+        return len(self.seats)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hold_id": self.hold_id,
+            "bus_name": self.bus.name,
+            "origin": self.bus.origin,
+            "destination": self.bus.destination,
+            "departure_time": self.bus.departure_time,
+            "travel_date": self.travel_date,
+            "seats": self.seats,
+            "expires_at": self.expires_at,
+        }
+
+
+@dataclass
+class HoldExpiryQueue:
+    """Min-heap of (expires_at, hold_id).
+
+    Confirmed or released holds stay in the heap and are skipped by the
+    caller when they surface, so removing one costs nothing and each
+    expiry costs one O(log n) pop.
+    """
+
+    _heap: List[Tuple[float, int]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, expires_at: float, hold_id: int) -> None:
+        heapq.heappush(self._heap, (expires_at, hold_id))
+
+    def next_expiry(self) -> float:
+        return self._heap[0][0] if self._heap else float("inf")
+
+    def pop_expired(self, now: float) -> List[int]:
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expired.append(heapq.heappop(self._heap)[1])
+        return expired
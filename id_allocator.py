@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import threading
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from booking_system import DataStore
+
+
+class TicketIdAllocator:
+    """Hands out ticket ids from blocks reserved in the store.
+
+    Only the store's high-water mark is persisted, so ids left over in a
+    block when the process exits are skipped, never reused.
+    """
+
+    def __init__(self, store: "DataStore", block_size: int = 1000) -> None:
+        if block_size <= 0:
+            raise ValueError("Block size must be positive")
+        self.store = store
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, count: int = 1) -> List[int]:
+        with self._lock:
+            ids = list(range(self._next, min(self._end, self._next + count)))
+            self._next += len(ids)
+            missing = count - len(ids)
+            if missing:
+                size = max(self.block_size, missing)
+                start = self.store.allocate_ticket_ids(size)
+                ids.extend(range(start, start + missing))
+                self._next = start + missing
+                self._end = start + size
+            return ids
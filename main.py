@@ -1,11 +1,10 @@
 from __future__ import annotations
 
-import sys
-
-from gui import run_app
-
 
 def main() -> None:
+    # Imported here so importing this module does not load PyQt6.
+    from gui import run_app
+
     run_app()
 
 
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import functools
+import json
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO, TypeVar, cast
+
+from profiler import SamplingProfiler
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _bucket(us: int) -> int:
+    # Log-linear: four buckets per power of two, so a quantile read from the
+    # histogram is within 25% of the true value.
+    if us < 4:
+        return us
+    shift = us.bit_length() - 3
+    return shift * 4 + (us >> shift)
+
+
+def _bucket_limit(i: int) -> int:
+    # Largest microsecond value that falls in bucket i.
+    if i < 4:
+        return i
+    shift = i // 4 - 1
+    return ((i % 4 + 5) << shift) - 1
+
+
+class Histogram:
+    """Latencies in log-scale microsecond buckets, plus bytes moved."""
+
+    def __init__(self) -> None:
+        self.counts: List[int] = []
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        i = _bucket(int(seconds * 1e6))
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+
+    def quantile(self, q: float) -> float:
+        """Upper bound, in seconds, of the bucket holding the q-th value."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min((_bucket_limit(i) + 1) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1e3,
+            "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1e3,
+            "p90_ms": self.quantile(0.9) * 1e3,
+            "p99_ms": self.quantile(0.99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+        if self.bytes:
+            stats["bytes"] = self.bytes
+            stats["bytes_per_op"] = self.bytes / self.count
+        return stats
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "nbytes", "began")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.nbytes = 0
+
+    def add_bytes(self, nbytes: int) -> None:
+        self.nbytes += nbytes
+
+    def __enter__(self) -> "_Timer":
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        self.metrics.observe(
+            self.name,
+            time.perf_counter() - self.began,
+            self.nbytes,
+            exc_type is not None,
+        )
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def add_bytes(self, nbytes: int) -> None:
+        pass
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Counters and latency histograms for the booking hot paths.
+
+    Disabled by default: ``timer()`` then hands back a shared do-nothing
+    context manager, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Histogram] = {}
+        self._since = time.time()
+        self._dump_stop: Optional[threading.Event] = None
+        self.profiler: Optional[SamplingProfiler] = None
+
+    def timer(self, name: str) -> Any:
+        """``with metrics.timer("store.write") as t: ...; t.add_bytes(n)``"""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def observe(
+        self, name: str, seconds: float, nbytes: int = 0, error: bool = False
+    ) -> None:
+        with self._lock:
+            histogram = self._timings.get(name)
+            if histogram is None:
+                histogram = self._timings[name] = Histogram()
+            histogram.observe(seconds, nbytes, error)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._since = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "since": self._since,
+                "time": time.time(),
+                "counters": dict(self._counters),
+                "timings": {k: h.to_dict() for k, h in sorted(self._timings.items())},
+                "profiling": self.profiler is not None,
+            }
+
+    def start_dump(self, interval: float, stream: Optional[TextIO] = None) -> None:
+        """Write a snapshot as one JSON line every ``interval`` seconds."""
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+        out = stream or sys.stderr
+
+        def dump() -> None:
+            while not stop.wait(interval):
+                out.write(json.dumps(self.snapshot()) + "\n")
+                out.flush()
+
+        threading.Thread(target=dump, name="metrics-dump", daemon=True).start()
+
+    def stop_dump(self) -> None:
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+    def start_profiler(self, interval: float = 0.005) -> None:
+        if self.profiler is None:
+            self.profiler = SamplingProfiler(interval)
+            self.profiler.start()
+
+    def stop_profiler(self) -> Optional[Dict[str, Any]]:
+        """Stop sampling and return what was collected."""
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return None
+        profiler.stop()
+        return profiler.report()
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Time a method of an object with a ``metrics`` attribute."""
+
+    def decorate(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            if not self.metrics.enabled:
+                return method(self, *args, **kwargs)
+            with _Timer(self.metrics, name):
+                return method(self, *args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorate
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bus import Bus
+
+OPTIMIZE_CHOICES = ("fastest", "cheapest", "fewest_transfers")
+_DAY = 24 * 60
+
+
+def _minute_of_day(departure_time: str) -> int:
+    try:
+        hour, minute = (int(p) for p in departure_time.split(":"))
+    except ValueError:
+        return 0
+    return (hour * 60 + minute) % _DAY
+
+
+def _rank(optimize: str, arrival: int, price: int, legs: int) -> Tuple[int, int, int]:
+    if optimize == "cheapest":
+        return (price, arrival, legs)
+    if optimize == "fewest_transfers":
+        return (legs, arrival, price)
+    return (arrival, price, legs)
+
+
+@dataclass
+class Leg:
+    bus: Bus
+    departure: datetime
+    arrival: datetime
+
+    @property
+    def travel_date(self) -> date:
+        return self.departure.date()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bus_name": self.bus.name,
+            "origin": self.bus.origin,
+            "destination": self.bus.destination,
+            "travel_date": self.travel_date.isoformat(),
+            "departure": self.departure.isoformat(timespec="minutes"),
+            "arrival": self.arrival.isoformat(timespec="minutes"),
+            "price_per_ticket": self.bus.price_per_ticket,
+        }
+
+
+@dataclass
+class Itinerary:
+    legs: List[Leg]
+
+    @property
+    def departure(self) -> datetime:
+        return self.legs[0].departure
+
+    @property
+    def arrival(self) -> datetime:
+        return self.legs[-1].arrival
+
+    @property
+    def duration(self) -> timedelta:
+        return self.arrival - self.departure
+
+    @property
+    def price(self) -> int:
+        return sum(leg.bus.price_per_ticket for leg in self.legs)
+
+    @property
+    def transfers(self) -> int:
+        return len(self.legs) - 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "departure": self.departure.isoformat(timespec="minutes"),
+            "arrival": self.arrival.isoformat(timespec="minutes"),
+            "duration_minutes": int(self.duration.total_seconds()) // 60,
+            "price": self.price,
+            "transfers": self.transfers,
+            "legs": [leg.to_dict() for leg in self.legs],
+        }
+
+
+@dataclass
+class _Route:
+    minutes: List[int] = field(default_factory=list)
+    buses: List[Bus] = field(default_factory=list)
+
+
+class JourneyPlanner:
+    """Itinerary search over the daily timetable.
+
+    Buses are indexed by origin, then destination, with each route's buses
+    sorted by departure minute. A search only looks at routes leaving the
+    stops it reaches and finds the next departure on each by bisection;
+    adding a bus is a single sorted insert.
+    """
+
+    def __init__(
+        self,
+        buses: Iterable[Bus] = (),
+        route_minutes: Optional[Dict[Tuple[str, str], int]] = None,
+        default_minutes: int = 240,
+        min_connection_minutes: int = 30,
+        max_legs: int = 3,
+    ) -> None:
+        self.route_minutes = {
+            (o.strip().lower(), d.strip().lower()): int(m)
+            for (o, d), m in (route_minutes or {}).items()
+        }
+        self.default_minutes = default_minutes
+        self.min_connection_minutes = min_connection_minutes
+        self.max_legs = max_legs
+        self._routes: Dict[str, Dict[str, _Route]] = {}
+        self.reset(buses)
+
+    def reset(self, buses: Iterable[Bus]) -> None:
+        # Built aside and swapped in, so a search running on another thread
+        # never sees a half-built index.
+        routes: Dict[str, Dict[str, _Route]] = {}
+        for b in buses:
+            self._insert(routes, b)
+        self._routes = routes
+
+    def add_bus(self, bus: Bus) -> None:
+        self._insert(self._routes, bus)
+
+    @staticmethod
+    def _insert(routes: Dict[str, Dict[str, _Route]], bus: Bus) -> None:
+        origin, destination = bus.origin.lower(), bus.destination.lower()
+        if origin == destination:
+            return
+        route = routes.setdefault(origin, {}).setdefault(destination, _Route())
+        minute = _minute_of_day(bus.departure_time)
+        idx = bisect_right(route.minutes, minute)
+        route.minutes.insert(idx, minute)
+        route.buses.insert(idx, bus)
+
+    def travel_minutes(self, origin: str, destination: str) -> int:
+        key = (origin.lower(), destination.lower())
+        return self.route_minutes.get(key, self.default_minutes)
+
+    def plan(
+        self,
+        origin: str,
+        destination: str,
+        depart_after: datetime,
+        optimize: str = "fastest",
+        is_available: Optional[Callable[[Bus, date], bool]] = None,
+    ) -> Optional[Itinerary]:
+        if optimize not in OPTIMIZE_CHOICES:
+            raise ValueError("Optimize must be fastest, cheapest or fewest_transfers")
+        source, target = origin.strip().lower(), destination.strip().lower()
+        if source == target or source not in self._routes:
+            return None
+        base = datetime.combine(depart_after.date(), time())
+        start = int((depart_after - base).total_seconds() // 60)
+        # Label-setting search over (stop, legs used). A label is dropped when
+        # one already settled at that stop used no more legs and was no worse
+        # on the quantity being optimized (arrival, or price for "cheapest").
+        # Ranks only grow along a path, so anything ranked no better than a
+        # route already found to the target is not pushed at all.
+        tie = count()
+        heap: List[Tuple] = [
+            (_rank(optimize, start, 0, 0), next(tie), source, start, 0, 0, None)
+        ]
+        settled: Dict[str, List[Tuple[int, int]]] = {}
+        bound: Optional[Tuple[int, int, int]] = None
+        while heap:
+            _, _, stop, arrival, price, legs, path = heapq.heappop(heap)
+            value = price if optimize == "cheapest" else arrival
+            labels = settled.setdefault(stop, [])
+            if any(v <= value and n <= legs for v, n in labels):
+                continue
+            labels.append((value, legs))
+            if stop == target:
+                if optimize == "fastest":
+                    path = self._depart_late(path, is_available, base)
+                return self._itinerary(path, base)
+            ready = arrival + (self.min_connection_minutes if legs else 0)
+            for next_stop, route in self._routes.get(stop, {}).items():
+                if legs + 1 == self.max_legs and next_stop != target:
+                    continue
+                found = self._board(route, ready, optimize, is_available, base)
+                if found is None:
+                    continue
+                departure, bus = found
+                reached = departure + self.travel_minutes(stop, next_stop)
+                cost = price + bus.price_per_ticket
+                rank = _rank(optimize, reached, cost, legs + 1)
+                if bound is not None and rank >= bound:
+                    continue
+                if next_stop == target:
+                    bound = rank
+                leg = (bus, departure, reached)
+                heapq.heappush(
+                    heap,
+                    (rank, next(tie), next_stop, reached, cost, legs + 1, (leg, path)),
+                )
+        return None
+
+    @staticmethod
+    def _board(
+        route: _Route,
+        ready: int,
+        optimize: str,
+        is_available: Optional[Callable[[Bus, date], bool]],
+        base: datetime,
+    ) -> Optional[Tuple[int, Bus]]:
+        # Buses run daily, so the candidates are the route's departures in
+        # the 24 hours from ``ready``, in departure order.
+        day, minute = divmod(ready, _DAY)
+        first = bisect_left(route.minutes, minute)
+        best: Optional[Tuple[int, Bus]] = None
+        size = len(route.minutes)
+        for offset in range(size):
+            idx = first + offset
+            departure = (day + idx // size) * _DAY + route.minutes[idx % size]
+            bus = route.buses[idx % size]
+            if is_available is not None:
+                travel_date = (base + timedelta(minutes=departure)).date()
+                if not is_available(bus, travel_date):
+                    continue
+            if optimize != "cheapest":
+                return departure, bus
+            if best is None or bus.price_per_ticket < best[1].price_per_ticket:
+                best = (departure, bus)
+        return best
+
+    def _depart_late(
+        self,
+        path: Tuple,
+        is_available: Optional[Callable[[Bus, date], bool]],
+        base: datetime,
+    ) -> Tuple:
+        # The search finds the earliest arrival but boards the first bus it
+        # can at every stop. Walking back from the last leg, each earlier leg
+        # moves to the latest bus that still makes its connection, which
+        # shortens the journey without changing the arrival.
+        legs = []
+        while path is not None:
+            leg, path = path
+            legs.append(leg)
+        for i in range(1, len(legs)):
+            bus, departure, arrival = legs[i]
+            next_departure = legs[i - 1][1]
+            travel = arrival - departure
+            deadline = next_departure - self.min_connection_minutes - travel
+            route = self._routes[bus.origin.lower()][bus.destination.lower()]
+            day, minute = divmod(deadline, _DAY)
+            last = bisect_right(route.minutes, minute) - 1
+            size = len(route.minutes)
+            for offset in range(size):
+                idx = last - offset
+                later = (day + idx // size) * _DAY + route.minutes[idx % size]
+                if later <= departure:
+                    break
+                candidate = route.buses[idx % size]
+                if is_available is None or is_available(
+                    candidate, (base + timedelta(minutes=later)).date()
+                ):
+                    legs[i] = (candidate, later, later + travel)
+                    break
+        rebuilt = None
+        for leg in reversed(legs):
+            rebuilt = (leg, rebuilt)
+        return rebuilt
+
+    @staticmethod
+    def _itinerary(path: Optional[Tuple], base: datetime) -> Itinerary:
+        legs: List[Leg] = []
+        while path is not None:
+            (bus, departure, arrival), path = path
+            legs.append(
+                Leg(
+                    bus,
+                    base + timedelta(minutes=departure),
+                    base + timedelta(minutes=arrival),
+                )
+            )
+        legs.reverse()
+        return Itinerary(legs)
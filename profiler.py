@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+_MAX_DEPTH = 64
+# Threads parked here (idle executor workers, the event loop's select) are
+# counted as idle rather than drowning out the threads doing work.
+_IDLE_FRAMES = frozenset(
+    ("threading.py:wait", "selectors.py:select", "queue.py:get", "thread.py:_worker")
+)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Statistical profiler: a thread that records every other thread's stack
+    every ``interval`` seconds.
+
+    Nothing is traced between samples, so the cost is one stack walk per
+    thread per interval, and none at all while it is not running.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive")
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self._stacks: "Counter[str]" = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if _frame_name(frame) in _IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                names = []
+                f: Optional[FrameType] = frame
+                while f is not None and len(names) < _MAX_DEPTH:
+                    names.append(_frame_name(f))
+                    f = f.f_back
+                with self._lock:
+                    self._stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the folded format flame graph tools read."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{s} {n}\n" for s, n in stacks)
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """The hottest functions: ``self`` counts samples with the function on
+        top of the stack, ``total`` samples with it anywhere in the stack."""
+        own: "Counter[str]" = Counter()
+        total: "Counter[str]" = Counter()
+        with self._lock:
+            stacks = list(self._stacks.items())
+        for stack, n in stacks:
+            names = stack.split(";")
+            own[names[-1]] += n
+            for name in set(names):
+                total[name] += n
+        return {
+            "samples": self.samples,
+            "idle": self.idle,
+            "interval": self.interval,
+            "self": _top(own, limit),
+            "total": _top(total, limit),
+        }
+
+
+def _top(counts: "Counter[str]", limit: int) -> List[Dict[str, Any]]:
+    return [{"function": f, "samples": n} for f, n in counts.most_common(limit)]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+class QueryCache:
+    """Bounded LRU of query results, dropped by tag when their inputs change.
+
+    Each result is stored with the tags it depends on (a bus, a route, "the
+    set of buses with seats"); ``invalidate(tag)`` drops just those results.
+    A result computed while an invalidation ran is not stored, so a slow
+    query cannot put back what a concurrent booking just made stale.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        if max_entries <= 0:
+            raise ValueError("Cache size must be positive")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Tuple[Hashable, ...]]]" = (
+            OrderedDict()
+        )
+        self._tagged: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(
+        self, key: Hashable, value: Any, tags: Iterable[Hashable], generation: int
+    ) -> None:
+        """Store ``value`` unless something was invalidated since ``generation``
+        (read it before running the query)."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._drop(key)
+            tags = tuple(set(tags))
+            self._entries[key] = (value, tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tagged[tag]
+
+    def invalidate(self, tag: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in self._tagged.pop(tag, ()):
+                entry = self._entries.pop(key)
+                for other in entry[1]:
+                    if other != tag:
+                        self._tagged[other].discard(key)
+                        if not self._tagged[other]:
+                            del self._tagged[other]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tagged.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+from bus import Bus
+
+
+def city_key(city: str) -> str:
+    return city.strip().lower()
+
+
+def _prefixed(keys: List[str], prefix: str) -> List[str]:
+    # Keys are sorted, so everything starting with the prefix is one slice.
+    start = bisect_left(keys, prefix)
+    end = bisect_left(keys, prefix + "\U0010ffff", start)
+    return keys[start:end]
+
+
+class RouteIndex:
+    """Sorted city and route keys for prefix completion and as-you-type search.
+
+    Cities and each origin's destinations are kept as sorted lists, so a
+    prefix is two binary searches.
+    """
+
+    def __init__(self, buses: Iterable[Bus] = ()) -> None:
+        self._cities: List[str] = []
+        self._names: Dict[str, str] = {}
+        self._destinations: Dict[str, List[str]] = {}
+        for bus in buses:
+            self.add(bus)
+
+    def add(self, bus: Bus) -> None:
+        origin, destination = city_key(bus.origin), city_key(bus.destination)
+        for key, name in ((origin, bus.origin), (destination, bus.destination)):
+            if key not in self._names:
+                # Suggestions use the spelling of the first bus seen.
+                self._names[key] = name.strip()
+                insort(self._cities, key)
+        destinations = self._destinations.setdefault(origin, [])
+        i = bisect_left(destinations, destination)
+        if i == len(destinations) or destinations[i] != destination:
+            destinations.insert(i, destination)
+
+    def suggest(self, prefix: str, origin: str = "", limit: int = 10) -> List[str]:
+        """City names starting with ``prefix``; with a known ``origin``, only
+        the places it has buses to."""
+        keys = self._destinations.get(city_key(origin)) or self._cities
+        return [self._names[k] for k in _prefixed(keys, city_key(prefix))[:limit]]
+
+    def routes(self, origin: str, destination: str) -> List[Tuple[str, str]]:
+        """(origin, destination) keys whose ends start with the given prefixes."""
+        destination = city_key(destination)
+        return [
+            (o, d)
+            for o in _prefixed(self._cities, city_key(origin))
+            for d in _prefixed(self._destinations.get(o, []), destination)
+        ]
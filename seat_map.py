@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Iterable, List
+
+# Seat n is bit n - 1 of an int; a set bit means the seat is taken. Seats are
+# numbered row by row in a 2+2 layout, so columns 0 and 3 are windows.
+SEATS_PER_ROW = 4
+WINDOW_COLUMNS = (0, 3)
+AISLE_COLUMNS = (1, 2)
+SEAT_PREFERENCES = ("", "window", "aisle", "together")
+
+
+def full_mask(total_seats: int) -> int:
+    return (1 << total_seats) - 1
+
+
+@lru_cache(maxsize=None)
+def _column_mask(total_seats: int, columns: tuple) -> int:
+    row = sum(1 << c for c in columns)
+    mask = 0
+    for start in range(0, total_seats, SEATS_PER_ROW):
+        mask |= row << start
+    return mask & full_mask(total_seats)
+
+
+def seat_bits(seats: Iterable[int]) -> int:
+    bits = 0
+    for seat in seats:
+        bits |= 1 << (int(seat) - 1)
+    return bits
+
+
+def seat_numbers(bits: int) -> List[int]:
+    seats = []
+    while bits:
+        low = bits & -bits
+        seats.append(low.bit_length())
+        bits ^= low
+    return seats
+
+
+def count_seats(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def encode_seats(bits: int) -> str:
+    return format(bits, "x") if bits else ""
+
+
+def decode_seats(text: str) -> int:
+    return int(text, 16) if text else 0
+
+
+def _lowest(free: int, count: int) -> int:
+    picked = 0
+    for _ in range(count):
+        if not free:
+            return 0
+        low = free & -free
+        picked |= low
+        free ^= low
+    return picked
+
+
+def _run_starts(free: int, length: int) -> int:
+    # Bit i survives when seats i+1 .. i+length are all free. Doubling the
+    # span each step needs only log2(length) shifts.
+    runs, span = free, 1
+    while span < length:
+        step = min(span, length - span)
+        runs &= runs >> step
+        span += step
+    return runs
+
+
+def _together_starts(count: int) -> List[tuple]:
+    # Columns a group may start in, best first: a pair sits on one side of
+    # the aisle if it can, and groups that fit in a row do not wrap into the
+    # next one.
+    if count == 2:
+        return [(0, 2), (1,)]
+    if count <= SEATS_PER_ROW:
+        return [tuple(range(SEATS_PER_ROW - count + 1))]
+    return [tuple(range(SEATS_PER_ROW))]
+
+
+def pick_seats(taken: int, total_seats: int, count: int, preference: str = "") -> int:
+    """Bits of ``count`` free seats matching ``preference``, or 0 if none fit."""
+    if count <= 0:
+        return 0
+    free = full_mask(total_seats) & ~taken
+    if preference == "together":
+        runs = _run_starts(free, count)
+        for columns in _together_starts(count):
+            starts = runs & _column_mask(total_seats, columns)
+            if starts:
+                return ((1 << count) - 1) * (starts & -starts)
+        return 0
+    if preference == "window":
+        free &= _column_mask(total_seats, WINDOW_COLUMNS)
+    elif preference == "aisle":
+        free &= _column_mask(total_seats, AISLE_COLUMNS)
+    elif preference:
+        raise ValueError("Seat preference must be window, aisle or together")
+    return _lowest(free, count)
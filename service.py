@@ -0,0 +1,577 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from booking_system import (
+    BatchResult,
+    BookingRequest,
+    BookingSystem,
+    make_store,
+    STORE_BACKENDS,
+)
+
+_REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    500: "Internal Server Error",
+}
+_ERROR_STATUS = {
+    "Bus not found": 404,
+    "Ticket not found": 404,
+    "Hold not found or expired": 404,
+    "Insufficient available seats": 409,
+    "Seat already taken": 409,
+    "No seats match the preference": 409,
+    "Seats are available; book them instead": 409,
+}
+_MAX_BODY = 64 * 1024
+
+
+class GroupCommitter:
+    """Collects concurrent requests and runs them as one batch call.
+
+    Whatever arrives while the previous batch is being written joins the
+    next one, so a burst of bookings costs a handful of store writes.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[BatchResult]],
+        max_batch: int = 500,
+    ) -> None:
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Tuple[Any, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item: Any) -> BatchResult:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.run_batch, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class BookingService:
+    def __init__(self, system: BookingSystem, reload_interval: float = 1.0) -> None:
+        self.system = system
+        self.reload_interval = reload_interval
+        self.bookings = GroupCommitter(
+            lambda requests: self._own_write(system.book_many, requests)
+        )
+        self.cancellations = GroupCommitter(
+            lambda ticket_ids: self._own_write(system.cancel_many, ticket_ids)
+        )
+        self._version = system.store.version()
+        self._watch_task: Optional[asyncio.Task] = None
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        self.bookings.start()
+        self.cancellations.start()
+        self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self) -> None:
+        if self._watch_task:
+            self._watch_task.cancel()
+        await self.bookings.stop()
+        await self.cancellations.stop()
+
+    async def _watch(self) -> None:
+        # Picks up bookings made by other processes (e.g. the desktop GUI).
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            # Expiry can promote the waitlist, which writes to the store.
+            await loop.run_in_executor(None, self._own_write, self.system.expire_holds)
+            version = await loop.run_in_executor(None, self.system.store.version)
+            if version != self._version:
+                self._version = version
+                state = await loop.run_in_executor(None, self.system.fetch_state)
+                # Rebuilding the indexes and planner takes a while on a large
+                # fleet; the swap itself is atomic, so handlers can keep going.
+                await loop.run_in_executor(None, self.system.apply_state, state)
+
+    def _own_write(self, write: Callable[..., Any], *args: Any) -> Any:
+        # Our own writes move the store's version too. Reloading for them
+        # would rebuild the indexes and empty the query cache on every poll
+        # under steady traffic, so the version a write leaves is taken as
+        # seen, unless the store had already changed before it started.
+        # A write from elsewhere landing mid-batch can go unnoticed until the
+        # next one; the store still refuses seats sold there.
+        store = self.system.store
+        before = store.version()
+        try:
+            return write(*args)
+        finally:
+            if before == self._version:
+                self._version = store.version()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception as e:  # keep the connection usable
+                    status, payload = 500, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            writer.write(_response(400, {"error": str(e)}, False))
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if path == "/buses":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            if query.get("available", "") in ("1", "true"):
+                buses = await self._read(self.system.list_available_buses)
+            else:
+                buses = await self._read(self.system.list_buses)
+            return 200, [b.to_dict() for b in buses]
+        if path == "/search":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            buses = await self._read(
+                self.system.search_buses,
+                query.get("origin", ""),
+                query.get("destination", ""),
+            )
+            return 200, [b.to_dict() for b in buses]
+        if path == "/cities":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            return 200, self.system.suggest_cities(
+                query.get("prefix", ""), query.get("origin", "")
+            )
+        if path == "/reports/sales":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            report = await asyncio.get_running_loop().run_in_executor(
+                None, self.system.sales_report
+            )
+            return 200, report.to_dict()
+        if path == "/metrics":
+            if method == "GET":
+                return 200, self.system.metrics_snapshot()
+            if method != "POST":
+                return 405, {"error": "Use GET or POST"}
+            return self._set_metrics(body)
+        if path == "/profile":
+            if method == "GET":
+                profiler = self.system.metrics.profiler
+                if profiler is None:
+                    return 404, {"error": "Profiler not running"}
+                return 200, profiler.report()
+            if method != "POST":
+                return 405, {"error": "Use GET or POST"}
+            return self._set_profiler(body)
+        if path == "/departures":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            try:
+                # Walks the schedule day by day, so it runs off the loop.
+                trips = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    self.system.list_departures,
+                    query.get("origin", ""),
+                    query.get("destination", ""),
+                    query.get("from", ""),
+                    query.get("to") or None,
+                )
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            return 200, [t.to_dict() for t in trips]
+        if path == "/journeys":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            return await self._journeys(query)
+        if path == "/holds":
+            if method != "POST":
+                return 405, {"error": "Use POST"}
+            return await self._hold(body)
+        if path.startswith("/holds/"):
+            if method != "DELETE":
+                return 405, {"error": "Use DELETE"}
+            try:
+                hold_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                return 400, {"error": "Hold id must be an integer"}
+            released = await asyncio.get_running_loop().run_in_executor(
+                None, self._own_write, self.system.release_hold, hold_id
+            )
+            if not released:
+                return 404, {"error": "Hold not found or expired"}
+            return 200, {"released": hold_id}
+        if path == "/waitlist":
+            if method == "GET":
+                entries = await self._read(
+                    self.system.waitlist, query.get("contact", "")
+                )
+                return 200, [e.to_dict() for e in entries]
+            if method != "POST":
+                return 405, {"error": "Use GET or POST"}
+            return await self._join_waitlist(body)
+        if path.startswith("/waitlist/"):
+            if method != "DELETE":
+                return 405, {"error": "Use DELETE"}
+            try:
+                entry_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                return 400, {"error": "Waitlist id must be an integer"}
+            left = await asyncio.get_running_loop().run_in_executor(
+                None, self._own_write, self.system.leave_waitlist, entry_id
+            )
+            if not left:
+                return 404, {"error": "Not on the waitlist"}
+            return 200, {"removed": entry_id}
+        if path == "/tickets":
+            if method == "GET":
+                return await self._find(query)
+            if method != "POST":
+                return 405, {"error": "Use GET or POST"}
+            return await self._book(body)
+        if path.startswith("/tickets/"):
+            if method != "DELETE":
+                return 405, {"error": "Use DELETE"}
+            try:
+                ticket_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                return 400, {"error": "Ticket id must be an integer"}
+            result = await self.cancellations.submit(ticket_id)
+            if not result.ok:
+                return _ERROR_STATUS.get(result.error or "", 400), {
+                    "error": result.error
+                }
+            return 200, {"cancelled": ticket_id}
+        return 404, {"error": "Not found"}
+
+    async def _read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Stores with their own query engine do I/O; keep it off the loop.
+        if self.system.store.supports_queries:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return fn(*args)
+
+    async def _find(self, query: Dict[str, str]) -> Tuple[int, Any]:
+        contact = query.get("contact", "")
+        passenger = query.get("passenger", "")
+        if not contact.strip() and not passenger.strip():
+            return 400, {"error": "Give a contact or passenger to search for"}
+        try:
+            limit = int(query.get("limit") or 100)
+        except ValueError:
+            return 400, {"error": "Limit must be an integer"}
+        # Always off the loop: JSON stores build their index on first use.
+        tickets = await asyncio.get_running_loop().run_in_executor(
+            None, self.system.find_tickets, contact, passenger, limit
+        )
+        return 200, [t.to_dict() for t in tickets]
+
+    def _set_metrics(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            data = json.loads(body or b"{}")
+            enabled = data.get("enabled")
+        except (ValueError, AttributeError):
+            return 400, {"error": "Expected JSON with enabled and/or reset"}
+        if enabled is not None:
+            self.system.metrics.enabled = bool(enabled)
+        if data.get("reset"):
+            self.system.metrics.reset()
+        return 200, self.system.metrics_snapshot()
+
+    def _set_profiler(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            data = json.loads(body or b"{}")
+            enabled = bool(data["enabled"])
+            interval = float(data.get("interval") or 0.005)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {"error": "Expected JSON with enabled"}
+        metrics = self.system.metrics
+        if not enabled:
+            report = metrics.stop_profiler()
+            if report is None:
+                return 404, {"error": "Profiler not running"}
+            return 200, report
+        try:
+            metrics.start_profiler(interval)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        return 200, {"profiling": True, "interval": metrics.profiler.interval}
+
+    async def _journeys(self, query: Dict[str, str]) -> Tuple[int, Any]:
+        try:
+            depart_after = datetime.fromisoformat(query.get("depart_after") or "")
+        except ValueError:
+            depart_after = None
+            if query.get("depart_after"):
+                return 400, {"error": "depart_after must be YYYY-MM-DDTHH:MM"}
+        origin, destination = query.get("origin", ""), query.get("destination", "")
+        optimize = query.get("optimize")
+        loop = asyncio.get_running_loop()
+        try:
+            seat_count = int(query.get("seat_count") or 1)
+            # Planning is CPU-bound; keep it off the loop.
+            if optimize:
+                found = await loop.run_in_executor(
+                    None,
+                    self.system.plan_journey,
+                    origin,
+                    destination,
+                    depart_after,
+                    optimize,
+                    seat_count,
+                )
+                journeys = [found] if found is not None else []
+            else:
+                journeys = await loop.run_in_executor(
+                    None,
+                    self.system.journey_options,
+                    origin,
+                    destination,
+                    depart_after,
+                    seat_count,
+                )
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        return 200, [j.to_dict() for j in journeys]
+
+    async def _hold(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            data = _json_object(body)
+            bus_name, seat_count = str(data["bus_name"]), int(data["seat_count"])
+            ttl = float(data["ttl"]) if data.get("ttl") is not None else None
+            seats = _seat_list(data)
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": "Expected JSON with bus_name and seat_count"}
+        try:
+            # Holding first expires stale holds, which can promote the waitlist.
+            hold = await asyncio.get_running_loop().run_in_executor(
+                None,
+                self._own_write,
+                self.system.hold_seats,
+                bus_name,
+                seat_count,
+                str(data.get("travel_date") or ""),
+                str(data.get("seat_preference") or ""),
+                seats,
+                ttl,
+                *_route(data),
+            )
+        except ValueError as e:
+            return _ERROR_STATUS.get(str(e), 400), {"error": str(e)}
+        return 201, hold.to_dict()
+
+    async def _join_waitlist(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            data = _json_object(body)
+            args = (
+                str(data["bus_name"]),
+                str(data["passenger_name"]),
+                str(data["contact"]),
+                int(data["seat_count"]),
+                str(data.get("travel_date") or ""),
+                str(data.get("seat_preference") or ""),
+                int(data.get("priority") or 0),
+                *_route(data),
+            )
+        except (ValueError, KeyError, TypeError):
+            return 400, {
+                "error": "Expected JSON with bus_name, passenger_name, "
+                "contact and seat_count"
+            }
+        try:
+            # May book straight away, so it runs off the loop like bookings.
+            entry = await asyncio.get_running_loop().run_in_executor(
+                None, self._own_write, self.system.join_waitlist, *args
+            )
+        except ValueError as e:
+            return _ERROR_STATUS.get(str(e), 400), {"error": str(e)}
+        return 201, entry.to_dict()
+
+    async def _book(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            data = _json_object(body)
+            if data.get("hold_id") is not None:
+                # Confirms a hold; its seats, bus and date come from the hold.
+                request = self.system.hold_request(
+                    int(data["hold_id"]),
+                    str(data["passenger_name"]),
+                    str(data["contact"]),
+                )
+                if request is None:
+                    return 404, {"error": "Hold not found or expired"}
+                result = await self.bookings.submit(request)
+                return self._booked(result)
+            request = BookingRequest(
+                bus_name=str(data["bus_name"]),
+                passenger_name=str(data["passenger_name"]),
+                contact=str(data["contact"]),
+                seat_count=int(data["seat_count"]),
+                travel_date=str(data.get("travel_date") or ""),
+                seat_preference=str(data.get("seat_preference") or ""),
+                seats=_seat_list(data),
+                origin=str(data.get("origin") or ""),
+                destination=str(data.get("destination") or ""),
+            )
+        except (ValueError, KeyError, TypeError):
+            return 400, {
+                "error": "Expected JSON with bus_name, passenger_name, "
+                "contact and seat_count"
+            }
+        return self._booked(await self.bookings.submit(request))
+
+    @staticmethod
+    def _booked(result: BatchResult) -> Tuple[int, Any]:
+        if not result.ok or result.ticket is None:
+            return _ERROR_STATUS.get(result.error or "", 400), {"error": result.error}
+        return 201, result.ticket.to_dict()
+
+
+def _json_object(body: bytes) -> Dict[str, Any]:
+    data = json.loads(body or b"{}")
+    if not isinstance(data, dict):
+        raise TypeError("Expected a JSON object")
+    return data
+
+
+def _route(data: Dict[str, Any]) -> Tuple[str, str]:
+    # Optional; picks the bus by route when several share a name.
+    return str(data.get("origin") or ""), str(data.get("destination") or "")
+
+
+def _seat_list(data: Dict[str, Any]) -> Optional[List[int]]:
+    if data.get("seats") is None:
+        return None
+    return [int(n) for n in data["seats"]]
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("Malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    if length > _MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _response(status: int, payload: Any, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def serve(host: str, port: int, system: BookingSystem) -> None:
+    service = BookingService(system)
+    server = await service.start(host, port)
+    print(f"Booking service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless booking HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--backend", choices=STORE_BACKENDS, default="json")
+    parser.add_argument("--store", help="Path to the data store file")
+    parser.add_argument(
+        "--metrics", action="store_true", help="Collect hot-path metrics"
+    )
+    parser.add_argument(
+        "--metrics-dump",
+        type=float,
+        metavar="SECONDS",
+        help="Collect metrics and print a snapshot to stderr this often",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Start the sampling profiler"
+    )
+    args = parser.parse_args()
+    system = BookingSystem(make_store(args.backend, args.store))
+    system.metrics.enabled = args.metrics or bool(args.metrics_dump)
+    if args.metrics_dump:
+        system.metrics.start_dump(args.metrics_dump)
+    if args.profile:
+        system.metrics.start_profiler()
+    try:
+        asyncio.run(serve(args.host, args.port, system))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
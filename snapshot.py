@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import marshal
+import os
+import struct
+import sys
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Set, Tuple
+
+_MAGIC = b"BUSSNAP1"
+_LENGTH = struct.Struct("<I")
+# marshal's format may change between Python versions; a snapshot written by
+# another version is simply rebuilt.
+_PYTHON = "%d.%d" % sys.version_info[:2]
+
+
+def snapshot_source(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class StoreSnapshot:
+    """Binary copy of a JSON store file, to load without parsing JSON.
+
+    Each top-level key is marshalled separately after an index of offsets,
+    so a read that needs only the buses skips the sales totals. The
+    snapshot is tagged with the JSON file's inode, size and mtime and
+    ignored once they change. The JSON file stays the source of truth:
+    a missing, stale or unreadable snapshot just means parsing it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(
+        self, source: Tuple[int, int, int], keys: Optional[Iterable[str]] = None
+    ) -> Optional[Tuple[Dict[str, Any], int]]:
+        """The snapshot's data and the bytes read for it, if it matches
+        ``source``: only ``keys`` (those present) when given, otherwise
+        everything."""
+        try:
+            with open(self.path, "rb") as f:
+                sections = self._sections(f, source)
+                if sections is None:
+                    return None
+                base = nbytes = f.tell()
+                data = {}
+                for key in sections if keys is None else keys:
+                    if key in sections:
+                        offset, size = sections[key]
+                        f.seek(base + offset)
+                        data[key] = marshal.loads(f.read(size))
+                        nbytes += size
+                return data, nbytes
+        except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+            return None
+
+    def keys(self, source: Tuple[int, int, int]) -> Optional[Set[str]]:
+        """The top-level keys, read from the index alone."""
+        try:
+            with open(self.path, "rb") as f:
+                sections = self._sections(f, source)
+        except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+            return None
+        return None if sections is None else set(sections)
+
+    @staticmethod
+    def _sections(
+        f: BinaryIO, source: Tuple[int, int, int]
+    ) -> Optional[Dict[str, Tuple[int, int]]]:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            return None
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        header = marshal.loads(f.read(length))
+        if header["python"] != _PYTHON or tuple(header["source"]) != source:
+            return None
+        return header["sections"]
+
+    def save(self, data: Dict[str, Any], source: Tuple[int, int, int]) -> None:
+        blobs = [(key, marshal.dumps(value)) for key, value in data.items()]
+        sections = {}
+        offset = 0
+        for key, blob in blobs:
+            sections[key] = (offset, len(blob))
+            offset += len(blob)
+        header = marshal.dumps(
+            {"python": _PYTHON, "source": source, "sections": sections}
+        )
+        # Per-process temp name: readers rebuild snapshots without the lock.
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_MAGIC + _LENGTH.pack(len(header)) + header)
+                for _, blob in blobs:
+                    f.write(blob)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Only a cache; the next read parses the JSON instead.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
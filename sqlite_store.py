@@ -0,0 +1,755 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from analytics import DIMENSIONS, SalesTotals
+from booking_system import DataStore, is_past_ticket, seat_numbers_error, update_bus
+from bus import Bus
+from metrics import Metrics
+from ticket import Ticket
+from ticket_index import contact_key, name_key
+from ticket_table import TicketTable
+from seat_map import (
+    decode_seats,
+    encode_seats,
+    pick_seats,
+    seat_bits,
+    seat_numbers,
+)
+from trips import bus_trip_key, ticket_trip_key
+from waitlist import WaitlistEntry
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    total_seats INTEGER NOT NULL,
+    price_per_ticket INTEGER NOT NULL,
+    available_seats INTEGER NOT NULL,
+    seat_map TEXT NOT NULL DEFAULT '',
+    name_key TEXT NOT NULL,
+    origin_key TEXT NOT NULL,
+    destination_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buses_name ON buses (name_key);
+CREATE INDEX IF NOT EXISTS idx_buses_route ON buses (origin_key, destination_key);
+CREATE INDEX IF NOT EXISTS idx_buses_available ON buses (available_seats);
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id INTEGER PRIMARY KEY,
+    bus_id TEXT NOT NULL,
+    passenger_name TEXT NOT NULL,
+    contact_number TEXT NOT NULL,
+    bus_name TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    seat_count INTEGER NOT NULL,
+    price_paid INTEGER NOT NULL,
+    travel_date TEXT NOT NULL DEFAULT '',
+    seats TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS trips (
+    travel_date TEXT NOT NULL,
+    trip_key TEXT NOT NULL,
+    sold INTEGER NOT NULL,
+    seat_map TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (travel_date, trip_key)
+) WITHOUT ROWID;
+-- AUTOINCREMENT so an entry ID is never handed out twice.
+CREATE TABLE IF NOT EXISTS waitlist (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bus_name TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    travel_date TEXT NOT NULL,
+    passenger_name TEXT NOT NULL,
+    contact_number TEXT NOT NULL,
+    seat_count INTEGER NOT NULL,
+    seat_preference TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 0,
+    joined_at REAL NOT NULL DEFAULT 0,
+    trip_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_waitlist_departure
+    ON waitlist (trip_key, travel_date, priority DESC, entry_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('next_ticket_id', 1);
+"""
+_PAGE_SIZE = 1000
+
+# Columns added after the first release, for databases created before them.
+_ADDED_COLUMNS = (
+    ("tickets", "travel_date", "TEXT NOT NULL DEFAULT ''"),
+    ("tickets", "seats", "TEXT NOT NULL DEFAULT ''"),
+    ("buses", "seat_map", "TEXT NOT NULL DEFAULT ''"),
+    ("trips", "seat_map", "TEXT NOT NULL DEFAULT ''"),
+    ("tickets", "contact_key", "TEXT NOT NULL DEFAULT ''"),
+    ("tickets", "passenger_key", "TEXT NOT NULL DEFAULT ''"),
+)
+_TICKET_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tickets_contact ON tickets (contact_key);
+CREATE INDEX IF NOT EXISTS idx_tickets_passenger ON tickets (passenger_key);
+"""
+# Trigram full-text index over normalized passenger names, kept in step with
+# the tickets table by triggers. Needs SQLite 3.34+; without it, name
+# fragments fall back to scanning passenger_key.
+_NAME_SEARCH = """
+CREATE VIRTUAL TABLE IF NOT EXISTS ticket_names USING fts5(
+    passenger_key, content='tickets', content_rowid='ticket_id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS ticket_names_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO ticket_names (rowid, passenger_key)
+    VALUES (new.ticket_id, new.passenger_key);
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_names_delete AFTER DELETE ON tickets BEGIN
+    INSERT INTO ticket_names (ticket_names, rowid, passenger_key)
+    VALUES ('delete', old.ticket_id, old.passenger_key);
+END;
+"""
+
+# Running sales totals (see analytics.py), kept by triggers so every writer,
+# in any process, updates them in the same transaction as the ticket. The
+# key expressions mirror analytics.sales_keys.
+_SALES_KEYS = (
+    "{t}.origin || '|' || {t}.destination",
+    "CAST(CAST(substr({t}.departure_time, 1, instr({t}.departure_time, ':') - 1) "
+    "AS INTEGER) % 24 AS TEXT)",
+    "{t}.bus_name || '|' || {t}.origin || '|' || {t}.destination || '|' || "
+    "{t}.departure_time || '|' || {t}.travel_date",
+)
+
+
+def _sales_keys(t: str) -> str:
+    return ", ".join(
+        f"('{d}', {k.format(t=t)})" for d, k in zip(DIMENSIONS, _SALES_KEYS)
+    )
+
+
+_SALES = f"""
+CREATE TABLE IF NOT EXISTS sales (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    tickets INTEGER NOT NULL,
+    seats INTEGER NOT NULL,
+    revenue INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS sales_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO sales (dimension, key, tickets, seats, revenue)
+    SELECT column1, column2, 1, new.seat_count, new.price_paid
+    FROM (VALUES {_sales_keys("new")}) WHERE true
+    ON CONFLICT (dimension, key) DO UPDATE SET tickets = tickets + 1,
+        seats = seats + excluded.seats, revenue = revenue + excluded.revenue;
+END;
+CREATE TRIGGER IF NOT EXISTS sales_delete AFTER DELETE ON tickets BEGIN
+    UPDATE sales SET tickets = tickets - 1, seats = seats - old.seat_count,
+        revenue = revenue - old.price_paid
+    WHERE (dimension, key) IN (VALUES {_sales_keys("old")});
+    DELETE FROM sales
+    WHERE tickets <= 0 AND (dimension, key) IN (VALUES {_sales_keys("old")});
+END;
+"""
+_BACKFILL_SALES = " UNION ALL ".join(
+    f"SELECT '{d}', {k.format(t='tickets')}, COUNT(*), SUM(seat_count), "
+    f"SUM(price_paid) FROM tickets GROUP BY 2"
+    for d, k in zip(DIMENSIONS, _SALES_KEYS)
+)
+
+_BUS_COLUMNS = (
+    "name, origin, destination, departure_time, "
+    "total_seats, price_per_ticket, available_seats, seat_map"
+)
+_TICKET_COLUMNS = (
+    "ticket_id, bus_id, passenger_name, contact_number, bus_name, "
+    "origin, destination, departure_time, seat_count, price_paid, travel_date, "
+    "seats"
+)
+_WAITLIST_COLUMNS = (
+    "entry_id, bus_name, origin, destination, departure_time, travel_date, "
+    "passenger_name, contact_number, seat_count, seat_preference, priority, "
+    "joined_at"
+)
+_INSERT_BUS = (
+    f"INSERT INTO buses ({_BUS_COLUMNS}, name_key, origin_key, destination_key) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_TICKET = (
+    f"INSERT INTO tickets ({_TICKET_COLUMNS}, contact_key, passenger_key) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# Buses have no id of their own, so rows are matched on the same fields a
+# passenger sees; ORDER BY id keeps first-match semantics for repeated names.
+_BUS_ROW = (
+    "id = (SELECT id FROM buses WHERE name = ? AND origin = ? "
+    "AND destination = ? AND departure_time = ? ORDER BY id LIMIT 1)"
+)
+
+# Seat maps are hex bitsets (see seat_map.py); these SQL functions let a
+# single guarded statement check and take seats.
+_TAKE_BUS_SEATS = (
+    "UPDATE buses SET available_seats = available_seats - ?, "
+    f"seat_map = seats_or(seat_map, ?) WHERE {_BUS_ROW} "
+    "AND available_seats >= ? AND seats_free(seat_map, ?)"
+)
+# Adds to a dated trip's seats unless that would exceed the bus's capacity or
+# hit a taken seat; a missing bus compares against NULL and is rejected too.
+_RESERVE_TRIP = (
+    "INSERT INTO trips (travel_date, trip_key, sold, seat_map) SELECT ?, ?, ?, ? "
+    f"WHERE ? <= (SELECT total_seats FROM buses WHERE {_BUS_ROW}) "
+    "ON CONFLICT (travel_date, trip_key) DO UPDATE SET sold = sold + excluded.sold, "
+    "seat_map = seats_or(seat_map, excluded.seat_map) "
+    f"WHERE sold + excluded.sold <= (SELECT total_seats FROM buses WHERE {_BUS_ROW}) "
+    "AND seats_free(seat_map, excluded.seat_map)"
+)
+
+
+def _seats_or(a: str, b: str) -> str:
+    return encode_seats(decode_seats(a) | decode_seats(b))
+
+
+def _seats_clear(a: str, b: str) -> str:
+    return encode_seats(decode_seats(a) & ~decode_seats(b))
+
+
+def _seats_free(a: str, b: str) -> bool:
+    return not decode_seats(a) & decode_seats(b)
+
+
+def _join_seats(seats: List[int]) -> str:
+    return ",".join(str(s) for s in seats)
+
+
+def _ticket(row: Tuple) -> Ticket:
+    *fields, seats = row
+    return Ticket.trusted(*fields, seats=[int(s) for s in seats.split(",") if s])
+
+
+class SQLiteDataStore(DataStore):
+    supports_queries = True
+
+    def __init__(self, file_path: str = "data_store.db") -> None:
+        # SQLite does its own cross-process locking; the thread lock only
+        # keeps transactions on the shared connection from interleaving.
+        self.file_path = file_path
+        self.metrics = Metrics()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(file_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("seats_or", 2, _seats_or)
+        self._conn.create_function("seats_clear", 2, _seats_clear)
+        self._conn.create_function("seats_free", 2, _seats_free)
+        self._conn.create_function("ticket_contact_key", 1, contact_key)
+        self._conn.create_function("ticket_name_key", 1, name_key)
+        self._name_search = False
+        self._ensure_file()
+
+    def _ensure_file(self) -> None:
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            added = set()
+            for table, column, decl in _ADDED_COLUMNS:
+                columns = {
+                    row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")
+                }
+                if column not in columns:
+                    self._conn.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {decl}"
+                    )
+                    added.add(column)
+            if "contact_key" in added:
+                self._conn.execute(
+                    "UPDATE tickets SET "
+                    "contact_key = ticket_contact_key(contact_number), "
+                    "passenger_key = ticket_name_key(passenger_name)"
+                )
+            self._conn.executescript(_TICKET_INDEXES)
+            self._ensure_name_search()
+            self._ensure_sales()
+
+    def _ensure_sales(self) -> None:
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sales'"
+        ).fetchone()
+        self._conn.executescript(_SALES)
+        if not exists:
+            self._conn.execute(
+                "INSERT INTO sales (dimension, key, tickets, seats, revenue) "
+                + _BACKFILL_SALES
+            )
+
+    def _ensure_name_search(self) -> None:
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'ticket_names'"
+        ).fetchone()
+        try:
+            self._conn.executescript(_NAME_SEARCH)
+        except sqlite3.OperationalError:
+            return
+        if not exists:
+            self._conn.execute(
+                "INSERT INTO ticket_names (ticket_names) VALUES ('rebuild')"
+            )
+        self._name_search = True
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def version(self) -> Tuple:
+        # data_version moves on commits from other connections, total_changes
+        # on our own.
+        with self._lock:
+            (data_version,) = self._conn.execute("PRAGMA data_version").fetchone()
+            return (data_version, self._conn.total_changes)
+
+    @staticmethod
+    def _bus_row(b: Bus) -> Tuple:
+        return (
+            b.name,
+            b.origin,
+            b.destination,
+            b.departure_time,
+            b.total_seats,
+            b.price_per_ticket,
+            b.available_seats,
+            encode_seats(b.seat_map),
+            b.name.lower(),
+            b.origin.lower(),
+            b.destination.lower(),
+        )
+
+    @staticmethod
+    def _ticket_row(t: Ticket) -> Tuple:
+        return (
+            t.ticket_id,
+            t.bus_id,
+            t.passenger_name,
+            t.contact_number,
+            t.bus_name,
+            t.origin,
+            t.destination,
+            t.departure_time,
+            t.seat_count,
+            t.price_paid,
+            t.travel_date,
+            _join_seats(t.seats),
+            contact_key(t.contact_number),
+            name_key(t.passenger_name),
+        )
+
+    @staticmethod
+    def _bus_params(b: Bus) -> Tuple[str, str, str, str]:
+        return (b.name, b.origin, b.destination, b.departure_time)
+
+    @staticmethod
+    def _ticket_bus_params(t: Ticket) -> Tuple[str, str, str, str]:
+        return (t.bus_name, t.origin, t.destination, t.departure_time)
+
+    def _query_buses(self, where: str = "", params: Tuple = ()) -> List[Bus]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_BUS_COLUMNS} FROM buses {where} ORDER BY id", params
+            ).fetchall()
+        return [Bus(*row[:-1], seat_map=decode_seats(row[-1])) for row in rows]
+
+    def load_buses(self) -> List[Bus]:
+        return self._query_buses()
+
+    def save_buses(self, buses: List[Bus]) -> None:
+        with self._lock, self._conn:
+            self._replace_buses(buses)
+
+    def _replace_buses(self, buses: Iterable[Bus]) -> None:
+        self._conn.execute("DELETE FROM buses")
+        self._conn.executemany(_INSERT_BUS, (self._bus_row(b) for b in buses))
+
+    def load_tickets(self) -> List[Ticket]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_TICKET_COLUMNS} FROM tickets ORDER BY ticket_id"
+            ).fetchall()
+        return [_ticket(row) for row in rows]
+
+    def iter_tickets(
+        self, filter: Optional[Callable[[Ticket], bool]] = None, since: int = 0
+    ) -> Iterator[Ticket]:
+        # Keyset pages, so the lock is not held while the caller iterates.
+        last = since
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE ticket_id > ? "
+                    "ORDER BY ticket_id LIMIT ?",
+                    (last, _PAGE_SIZE),
+                ).fetchall()
+            for row in rows:
+                ticket = _ticket(row)
+                if filter is None or filter(ticket):
+                    yield ticket
+            if len(rows) < _PAGE_SIZE:
+                return
+            last = rows[-1][0]
+
+    def load_ticket_table(self) -> TicketTable:
+        return TicketTable(self.iter_tickets())
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> None:
+        with self._lock, self._conn:
+            self._replace_tickets(tickets)
+
+    def _replace_tickets(self, tickets: Iterable[Ticket]) -> None:
+        self._conn.execute("DELETE FROM tickets")
+        self._conn.executemany(_INSERT_TICKET, (self._ticket_row(t) for t in tickets))
+
+    def allocate_ticket_ids(self, count: int) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE meta SET value = value + ? WHERE key = 'next_ticket_id'",
+                (count,),
+            )
+            (value,) = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'next_ticket_id'"
+            ).fetchone()
+        return int(value) - count
+
+    def record_bookings(
+        self, bookings: List[Tuple[Bus, Ticket]], atomic: bool = False
+    ) -> List[Optional[str]]:
+        errors: List[Optional[str]] = []
+        with self._lock, self._conn:
+            for bus, ticket in bookings:
+                errors.append(self._take_seats(self._bus_params(bus), ticket))
+            if atomic and any(errors):
+                self._conn.rollback()
+                return errors
+            self._conn.executemany(
+                _INSERT_TICKET,
+                (self._ticket_row(t) for (_, t), e in zip(bookings, errors) if not e),
+            )
+        return errors
+
+    def _take_seats(
+        self, params: Tuple[str, str, str, str], ticket: Ticket
+    ) -> Optional[str]:
+        key = ticket_trip_key(ticket.to_dict())
+        if ticket.travel_date:
+            row = self._conn.execute(
+                "SELECT COALESCE((SELECT seat_map FROM trips WHERE travel_date = ? "
+                f"AND trip_key = ?), ''), total_seats FROM buses WHERE {_BUS_ROW}",
+                (ticket.travel_date, key, *params),
+            ).fetchone()
+        else:
+            row = self._conn.execute(
+                f"SELECT seat_map, total_seats FROM buses WHERE {_BUS_ROW}",
+                params,
+            ).fetchone()
+        if row is None:
+            return "Bus not found"
+        taken, total_seats = decode_seats(row[0]), row[1]
+        if ticket.travel_date and not ticket.seats:
+            # A dated trip's seat map is its inventory, so every ticket on it
+            # needs seat numbers.
+            ticket.seats = seat_numbers(
+                pick_seats(taken, total_seats, ticket.seat_count)
+            )
+        wanted = seat_bits(ticket.seats)
+        if taken & wanted:
+            return "Seat already taken"
+        bits = encode_seats(wanted)
+        if ticket.travel_date:
+            cur = self._conn.execute(
+                _RESERVE_TRIP,
+                (
+                    ticket.travel_date,
+                    key,
+                    ticket.seat_count,
+                    bits,
+                    ticket.seat_count,
+                    *params,
+                    *params,
+                ),
+            )
+        else:
+            cur = self._conn.execute(
+                _TAKE_BUS_SEATS,
+                (
+                    ticket.seat_count,
+                    bits,
+                    *params,
+                    ticket.seat_count,
+                    bits,
+                ),
+            )
+        return None if cur.rowcount == 1 else "Insufficient available seats"
+
+    def upsert_buses(self, buses: List[Bus]) -> List[Optional[str]]:
+        errors: List[Optional[str]] = []
+        with self._lock, self._conn:
+            for bus in buses:
+                # Narrowed by name_key first so each lookup uses its index.
+                row = self._conn.execute(
+                    "SELECT id, total_seats, available_seats, seat_map FROM buses "
+                    "WHERE name_key = ? AND name = ? AND origin = ? "
+                    "AND destination = ? AND departure_time = ? ORDER BY id LIMIT 1",
+                    (bus.name.lower(), *self._bus_params(bus)),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(_INSERT_BUS, self._bus_row(bus))
+                    errors.append(None)
+                    continue
+                bus_id = row[0]
+                stored = dict(
+                    zip(("total_seats", "available_seats", "seat_map"), row[1:])
+                )
+                # Trips are keyed by date first, so this scans them; only a
+                # shrinking bus reads it.
+                seat_maps = (
+                    seat_map
+                    for (seat_map,) in self._conn.execute(
+                        "SELECT seat_map FROM trips WHERE trip_key = ?",
+                        (bus_trip_key(bus),),
+                    )
+                )
+                error = update_bus(stored, bus.to_dict(), seat_maps)
+                if error is None:
+                    self._conn.execute(
+                        "UPDATE buses SET total_seats = ?, available_seats = ?, "
+                        "price_per_ticket = ? WHERE id = ?",
+                        (
+                            stored["total_seats"],
+                            stored["available_seats"],
+                            stored["price_per_ticket"],
+                            bus_id,
+                        ),
+                    )
+                errors.append(error)
+        return errors
+
+    def import_tickets(self, tickets: List[Ticket]) -> List[Optional[str]]:
+        today = date.today().isoformat()
+        errors: List[Optional[str]] = []
+        capacities: Dict[Tuple[str, str, str, str], Optional[int]] = {}
+        with self._lock, self._conn:
+            for ticket in tickets:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM tickets WHERE ticket_id = ?", (ticket.ticket_id,)
+                ).fetchone()
+                if exists:
+                    errors.append("Ticket ID already exists")
+                    continue
+                params = self._ticket_bus_params(ticket)
+                error = None
+                if ticket.seats:
+                    if params not in capacities:
+                        row = self._conn.execute(
+                            f"SELECT total_seats FROM buses WHERE {_BUS_ROW}", params
+                        ).fetchone()
+                        capacities[params] = row[0] if row else None
+                    error = seat_numbers_error(
+                        ticket.seats, ticket.seat_count, capacities[params]
+                    )
+                if error is None and not is_past_ticket(ticket, today):
+                    error = self._take_seats(params, ticket)
+                if error is None:
+                    self._conn.execute(_INSERT_TICKET, self._ticket_row(ticket))
+                errors.append(error)
+            if None in errors:
+                self._conn.execute(
+                    "UPDATE meta SET value = MAX(value, ?) WHERE key = 'next_ticket_id'",
+                    (max(t.ticket_id for t, e in zip(tickets, errors) if not e) + 1,),
+                )
+        return errors
+
+    def record_cancellations(
+        self, cancellations: List[Tuple[Optional[Bus], Ticket]]
+    ) -> List[bool]:
+        cancelled = []
+        with self._lock, self._conn:
+            for bus, ticket in cancellations:
+                cur = self._conn.execute(
+                    "DELETE FROM tickets WHERE ticket_id = ?", (ticket.ticket_id,)
+                )
+                cancelled.append(cur.rowcount == 1)
+                if cur.rowcount != 1 or bus is None:
+                    continue
+                if ticket.travel_date:
+                    self._release_trip(ticket)
+                else:
+                    self._conn.execute(
+                        "UPDATE buses SET available_seats = "
+                        "MIN(total_seats, available_seats + ?), "
+                        f"seat_map = seats_clear(seat_map, ?) WHERE {_BUS_ROW}",
+                        (
+                            ticket.seat_count,
+                            encode_seats(seat_bits(ticket.seats)),
+                            *self._bus_params(bus),
+                        ),
+                    )
+        return cancelled
+
+    def _release_trip(self, ticket: Ticket) -> None:
+        params = (ticket.travel_date, ticket_trip_key(ticket.to_dict()))
+        self._conn.execute(
+            "UPDATE trips SET sold = sold - ?, seat_map = seats_clear(seat_map, ?) "
+            "WHERE travel_date = ? AND trip_key = ?",
+            (ticket.seat_count, encode_seats(seat_bits(ticket.seats)), *params),
+        )
+        self._conn.execute(
+            "DELETE FROM trips WHERE travel_date = ? AND trip_key = ? AND sold <= 0",
+            params,
+        )
+
+    def load_trip_inventory(self, since: str = "") -> Dict[str, Dict[str, str]]:
+        # The primary key orders trips by date, so this is a range scan.
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT travel_date, trip_key, seat_map FROM trips "
+                "WHERE travel_date >= ?",
+                (since,),
+            ).fetchall()
+        trips: Dict[str, Dict[str, str]] = {}
+        for day, key, seat_map in rows:
+            trips.setdefault(day, {})[key] = seat_map
+        return trips
+
+    def list_available_buses(self) -> List[Bus]:
+        return self._query_buses("WHERE available_seats > 0")
+
+    def search_buses(self, origin: str, destination: str) -> List[Bus]:
+        return self._query_buses(
+            "WHERE origin_key = ? AND destination_key = ?",
+            (origin.strip().lower(), destination.strip().lower()),
+        )
+
+    def search_routes(self, origin: str, destination: str) -> List[Bus]:
+        origin, destination = origin.strip().lower(), destination.strip().lower()
+        return self._query_buses(
+            "WHERE origin_key >= ? AND origin_key < ? "
+            "AND destination_key >= ? AND destination_key < ?",
+            (origin, origin + "\U0010ffff", destination, destination + "\U0010ffff"),
+        )
+
+    def load_sales(self) -> SalesTotals:
+        totals: Dict[str, Dict[str, List[int]]] = {d: {} for d in DIMENSIONS}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dimension, key, tickets, seats, revenue FROM sales"
+            ).fetchall()
+        for dimension, key, tickets, seats, revenue in rows:
+            totals.setdefault(dimension, {})[str(key)] = [tickets, seats, revenue]
+        return SalesTotals(totals)
+
+    def _query_waitlist(
+        self, where: str = "", params: Tuple = ()
+    ) -> List[WaitlistEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_WAITLIST_COLUMNS} FROM waitlist {where}", params
+            ).fetchall()
+        return [WaitlistEntry(*row) for row in rows]
+
+    def load_waitlist(self) -> List[WaitlistEntry]:
+        return self._query_waitlist("ORDER BY entry_id")
+
+    def waitlist_head(
+        self, trip: str, travel_date: str, limit: int
+    ) -> List[WaitlistEntry]:
+        # Walks idx_waitlist_departure, so only the rows returned are read.
+        return self._query_waitlist(
+            "WHERE trip_key = ? AND travel_date = ? "
+            "ORDER BY priority DESC, entry_id LIMIT ?",
+            (trip, travel_date, limit),
+        )
+
+    def add_to_waitlist(self, entries: List[WaitlistEntry]) -> List[WaitlistEntry]:
+        with self._lock, self._conn:
+            for entry in entries:
+                cur = self._conn.execute(
+                    f"INSERT INTO waitlist ({_WAITLIST_COLUMNS}, trip_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.entry_id or None,
+                        entry.bus_name,
+                        entry.origin,
+                        entry.destination,
+                        entry.departure_time,
+                        entry.travel_date,
+                        entry.passenger_name,
+                        entry.contact_number,
+                        entry.seat_count,
+                        entry.seat_preference,
+                        entry.priority,
+                        entry.joined_at,
+                        entry.trip_key,
+                    ),
+                )
+                entry.entry_id = int(cur.lastrowid)
+        return entries
+
+    def remove_from_waitlist(self, entry_ids: Iterable[int]) -> List[bool]:
+        with self._lock, self._conn:
+            return [
+                self._conn.execute(
+                    "DELETE FROM waitlist WHERE entry_id = ?", (int(entry_id),)
+                ).rowcount
+                == 1
+                for entry_id in entry_ids
+            ]
+
+    def expire_waitlist(self, before: str) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM waitlist WHERE travel_date != '' AND travel_date < ?",
+                (before,),
+            ).rowcount
+
+    def find_ticket(self, ticket_id: int) -> Optional[Ticket]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE ticket_id = ?",
+                (int(ticket_id),),
+            ).fetchone()
+        return _ticket(row) if row else None
+
+    def find_tickets(
+        self, contact: str = "", passenger: str = "", limit: Optional[int] = None
+    ) -> List[Ticket]:
+        where: List[str] = []
+        params: List = []
+        if contact:
+            where.append("contact_key = ?")
+            params.append(contact_key(contact))
+        key = name_key(passenger)
+        if len(key) >= 3 and self._name_search:
+            where.append(
+                "ticket_id IN (SELECT rowid FROM ticket_names "
+                "WHERE ticket_names MATCH ?)"
+            )
+            params.append('"' + key.replace('"', '""') + '"')
+        elif len(key) >= 3:
+            where.append("instr(passenger_key, ?) > 0")
+            params.append(key)
+        elif key:
+            # Too short for a trigram: match the start of the name instead.
+            where.append("passenger_key >= ? AND passenger_key < ?")
+            params += [key, key + "\U0010ffff"]
+        if not where:
+            return []
+        sql = f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE {' AND '.join(where)} "
+        sql += "ORDER BY ticket_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_ticket(row) for row in rows]
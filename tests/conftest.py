@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import sys
+from typing import Callable, Iterator, List
+
+import pytest
+
+# The modules live at the top of the repository, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_system import STORE_BACKENDS, BookingSystem, make_store  # noqa: E402
+
+# A demo bus with 40 seats; every test starts from the demo schedule.
+BUS = "Ena Transport"
+
+
+@pytest.fixture(params=STORE_BACKENDS)
+def backend(request: pytest.FixtureRequest) -> str:
+    return request.param
+
+
+@pytest.fixture
+def store_path(tmp_path: str, backend: str) -> str:
+    return os.path.join(tmp_path, "store.db" if backend == "sqlite" else "store.json")
+
+
+@pytest.fixture
+def open_system(
+    backend: str, store_path: str
+) -> Iterator[Callable[..., BookingSystem]]:
+    """Opens BookingSystems on the test's store, as separate processes or
+    windows would, and closes them afterwards."""
+    systems: List[BookingSystem] = []
+
+    def open_(**kwargs: object) -> BookingSystem:
+        system = BookingSystem(make_store(backend, store_path), **kwargs)
+        systems.append(system)
+        return system
+
+    yield open_
+    for system in systems:
+        close = getattr(system.store, "close", None)
+        if close:
+            close()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from typing import List
+
+import pytest
+
+from booking_system import BookingRequest, BookingSystem
+from conftest import BUS
+
+
+def _request(contact: str, seats: List[int]) -> BookingRequest:
+    return BookingRequest(BUS, "Group", contact, len(seats), seats=seats)
+
+
+def _seats_left(system: BookingSystem) -> int:
+    return system.get_bus_by_name(BUS).available_seats
+
+
+def test_partial_batch_books_the_good_requests(open_system):
+    system = open_system()
+    results = system.book_many(
+        [
+            _request("01700000001", [1, 2]),
+            BookingRequest("No Such Bus", "Group", "01700000002", 1),
+            _request("01700000003", [3]),
+        ]
+    )
+    assert [r.error for r in results] == [None, "Bus not found", None]
+    assert [r.ticket.seats for r in results if r.ticket] == [[1, 2], [3]]
+    assert _seats_left(open_system()) == 37
+
+
+def test_atomic_batch_with_an_invalid_request_books_nothing(open_system):
+    system = open_system()
+    results = system.book_many(
+        [_request("01700000001", [1]), BookingRequest(BUS, "", "", 1)],
+        atomic=True,
+    )
+    assert results[0].error == "Batch aborted"
+    assert results[1].error and results[1].error != "Batch aborted"
+    assert all(r.ticket is None for r in results)
+    assert _seats_left(system) == 40
+    assert _seats_left(open_system()) == 40
+
+
+def test_atomic_batch_rolls_back_seats_when_two_requests_clash(open_system):
+    system = open_system()
+    results = system.book_many(
+        [_request("01700000001", [1, 2]), _request("01700000002", [2])],
+        atomic=True,
+    )
+    assert [r.error for r in results] == ["Batch aborted", "Seat already taken"]
+    assert _seats_left(system) == 40
+    assert system.book_ticket(BUS, "Later", "01700000003", 2, seats=[1, 2])
+
+
+def test_atomic_batch_rolls_back_when_the_store_refuses_a_seat(open_system):
+    system, other = open_system(), open_system()
+    other.book_ticket(BUS, "Elsewhere", "01799999999", 1, seats=[5])
+    # ``system`` has not seen seat 5 go, so only the store catches it.
+    results = system.book_many(
+        [_request("01700000001", [1, 2]), _request("01700000002", [5])],
+        atomic=True,
+    )
+    assert all(r.error for r in results)
+    assert all(r.ticket is None for r in results)
+    fresh = open_system()
+    assert _seats_left(fresh) == 39
+    assert fresh.find_tickets("01700000001", "", 10) == []
+    assert system.book_ticket(BUS, "Later", "01700000003", 2, seats=[1, 2])
+
+
+def test_batch_releases_seats_when_the_store_write_fails(open_system, monkeypatch):
+    system = open_system()
+
+    def fail(*args: object) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(system.store, "record_bookings", fail)
+    with pytest.raises(OSError):
+        system.book_many([_request("01700000001", [1, 2])], atomic=True)
+    assert _seats_left(system) == 40
+    monkeypatch.undo()
+    assert system.book_ticket(BUS, "Later", "01700000003", 2, seats=[1, 2])
+
+
+def test_atomic_cancellation_with_an_unknown_ticket_cancels_nothing(open_system):
+    system = open_system()
+    ticket = system.book_ticket(BUS, "Kept", "01700000001", 2)
+    results = system.cancel_many([ticket.ticket_id, 999_999], atomic=True)
+    assert [r.error for r in results] == ["Batch aborted", "Ticket not found"]
+    assert open_system().store.find_ticket(ticket.ticket_id) is not None
+    assert _seats_left(system) == 38
+
+
+def test_cancel_many_reports_each_ticket(open_system):
+    system = open_system()
+    tickets = [system.book_ticket(BUS, "P", f"0170000000{i}", 1) for i in range(3)]
+    ids = [t.ticket_id for t in tickets]
+    results = system.cancel_many(ids + [ids[0]])
+    assert [r.ok for r in results] == [True, True, True, False]
+    assert _seats_left(open_system()) == 40
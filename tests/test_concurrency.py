@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from typing import Any, List
+
+import pytest
+
+from booking_system import BookingSystem, make_store
+from conftest import BUS
+
+
+def _in_process(
+    backend: str, path: str, start: Any, results: Any, op: str, arg: int
+) -> None:
+    system = BookingSystem(make_store(backend, path))
+    start.wait()
+    try:
+        if op == "book":
+            results.put(system.book_ticket(BUS, "Racer", "01700000000", arg).seats)
+        else:
+            results.put(system.cancel_ticket(arg))
+    except ValueError as e:
+        results.put(str(e))
+    finally:
+        close = getattr(system.store, "close", None)
+        if close:
+            close()
+
+
+def _race(backend: str, path: str, op: str, arg: int, processes: int = 2) -> List[Any]:
+    """Run ``op`` in several processes at once, each with its own system."""
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Barrier(processes), context.Queue()
+    workers = [
+        context.Process(
+            target=_in_process, args=(backend, path, start, results, op, arg)
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    return outcomes
+
+
+def _route_revenue(system: BookingSystem) -> int:
+    bus = system.get_bus_by_name(BUS)
+    assert bus is not None
+    return sum(
+        r.revenue
+        for r in system.sales_report().revenue_by_route()
+        if (r.origin, r.destination) == (bus.origin, bus.destination)
+    )
+
+
+def test_processes_race_for_the_last_seat(open_system, backend, store_path):
+    system = open_system()
+    system.book_ticket(BUS, "Early", "01711111111", 39)
+    outcomes = _race(backend, store_path, "book", 1, processes=4)
+    booked = [o for o in outcomes if isinstance(o, list)]
+    failed = [o for o in outcomes if isinstance(o, str)]
+    assert booked == [[40]]
+    assert set(failed) <= {"Seat already taken", "Insufficient available seats"}
+    assert len(failed) == 3
+    fresh = open_system()
+    assert fresh.get_bus_by_name(BUS).available_seats == 0
+    assert len(fresh.find_tickets("01700000000", "", 10)) == 1
+
+
+def test_store_refuses_a_seat_sold_by_another_system(open_system):
+    first, second = open_system(), open_system()
+    first.book_ticket(BUS, "Early", "01711111111", 40)
+    # The second system still believes every seat is free.
+    assert second.get_bus_by_name(BUS).available_seats == 40
+    with pytest.raises(ValueError, match="Seat already taken|Insufficient"):
+        second.book_ticket(BUS, "Late", "01722222222", 1)
+    assert len(open_system().find_tickets("01722222222", "", 10)) == 0
+
+
+def test_threads_race_for_the_last_seat(open_system):
+    system = open_system()
+    system.book_ticket(BUS, "Early", "01711111111", 39)
+    start, booked, failed = threading.Barrier(8), [], []
+
+    def book() -> None:
+        start.wait()
+        try:
+            booked.append(system.book_ticket(BUS, "Racer", "01700000000", 1))
+        except ValueError as e:
+            failed.append(str(e))
+
+    threads = [threading.Thread(target=book) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [t.seats for t in booked] == [[40]]
+    assert len(failed) == 7
+    assert open_system().get_bus_by_name(BUS).available_seats == 0
+
+
+def test_processes_cancelling_one_ticket_refund_it_once(
+    open_system, backend, store_path
+):
+    system = open_system()
+    kept = system.book_ticket(BUS, "Kept", "01711111111", 1)
+    ticket = system.book_ticket(BUS, "Twice", "01722222222", 1)
+    outcomes = _race(backend, store_path, "cancel", ticket.ticket_id)
+    assert sorted(outcomes) == [False, True]
+    fresh = open_system()
+    assert fresh.get_bus_by_name(BUS).available_seats == 39
+    assert fresh.store.find_ticket(ticket.ticket_id) is None
+    assert _route_revenue(fresh) == kept.price_paid
+
+
+def test_threads_cancelling_one_ticket_refund_it_once(open_system):
+    system = open_system()
+    kept = system.book_ticket(BUS, "Kept", "01711111111", 1)
+    ticket = system.book_ticket(BUS, "Twice", "01722222222", 2)
+    start, outcomes = threading.Barrier(4), []
+
+    def cancel() -> None:
+        start.wait()
+        outcomes.append(system.cancel_ticket(ticket.ticket_id))
+
+    threads = [threading.Thread(target=cancel) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes) == [False, False, False, True]
+    assert system.get_bus_by_name(BUS).available_seats == 39
+    fresh = open_system()
+    assert fresh.get_bus_by_name(BUS).available_seats == 39
+    assert _route_revenue(fresh) == kept.price_paid
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import List
+
+import pytest
+
+from booking_system import BookingSystem
+from conftest import BUS
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _book(system: BookingSystem, contact: str, seat_count: int) -> int:
+    return system.book_ticket(BUS, "Buyer", contact, seat_count, DAY).ticket_id
+
+
+def _seats(system: BookingSystem, contact: str) -> int:
+    return sum(t.seat_count for t in system.find_tickets(contact, "", 10))
+
+
+def _waiting(system: BookingSystem) -> List[str]:
+    return [e.passenger_name for e in system.waitlist()]
+
+
+def test_joining_needs_a_sold_out_departure(open_system):
+    system = open_system()
+    with pytest.raises(ValueError, match="Seats are available"):
+        system.join_waitlist(BUS, "Early", "01711111111", 1, DAY)
+
+
+def test_cancellation_promotes_by_priority_then_joining_order(open_system):
+    system = open_system()
+    _book(system, "01700000001", 37)
+    freed = _book(system, "01700000002", 3)
+    system.join_waitlist(BUS, "First", "01711111111", 1, DAY)
+    system.join_waitlist(BUS, "Second", "01722222222", 1, DAY)
+    system.join_waitlist(BUS, "Urgent", "01733333333", 1, DAY, priority=1)
+    system.join_waitlist(BUS, "Last", "01744444444", 1, DAY)
+
+    assert system.cancel_ticket(freed)
+
+    assert [_seats(system, c) for c in ("01733333333", "01711111111")] == [1, 1]
+    assert _seats(system, "01722222222") == 1
+    assert _seats(system, "01744444444") == 0
+    assert _waiting(system) == ["Last"]
+
+
+def test_a_party_that_does_not_fit_is_not_overtaken(open_system):
+    system = open_system()
+    _book(system, "01700000001", 38)
+    freed = _book(system, "01700000002", 2)
+    system.join_waitlist(BUS, "Family", "01711111111", 3, DAY)
+    system.join_waitlist(BUS, "Single", "01722222222", 1, DAY)
+
+    assert system.cancel_ticket(freed)
+
+    assert _seats(system, "01722222222") == 0
+    assert _waiting(system) == ["Family", "Single"]
+
+
+def test_the_waitlist_survives_a_restart(open_system):
+    system = open_system()
+    sold = _book(system, "01700000001", 40)
+    entry = system.join_waitlist(BUS, "Waiting", "01711111111", 2, DAY)
+
+    restarted = open_system()
+    assert [e.entry_id for e in restarted.waitlist()] == [entry.entry_id]
+    assert restarted.cancel_ticket(sold)
+    assert _seats(restarted, "01711111111") == 2
+    assert restarted.waitlist() == []
+
+
+def test_a_promotion_that_loses_its_seats_goes_back_in_line(open_system):
+    stale, current = open_system(), open_system()
+    sold = _book(current, "01700000001", 40)
+    entry = current.join_waitlist(BUS, "Waiting", "01711111111", 1, DAY)
+
+    # ``stale`` still sees 40 free seats, so releasing a hold promotes the
+    # entry there and the store refuses the booking.
+    hold = stale.hold_seats(BUS, 1, DAY)
+    assert stale.release_hold(hold.hold_id)
+    assert _seats(stale, "01711111111") == 0
+    assert [e.entry_id for e in stale.waitlist()] == [entry.entry_id]
+
+    assert current.cancel_ticket(sold)
+    assert _seats(current, "01711111111") == 1
+    assert current.waitlist() == []
@@ -1,11 +1,29 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Any
+from sys import intern
+from typing import Dict, Any, Iterable, List, Optional
 
 
 @dataclass
 class Ticket:
+    # Slotted: a loaded history holds one of these per ticket, and the
+    # field defaults live on __init__ because slots cannot have them.
+    __slots__ = (
+        "ticket_id",
+        "bus_id",
+        "passenger_name",
+        "contact_number",
+        "bus_name",
+        "origin",
+        "destination",
+        "departure_time",
+        "seat_count",
+        "price_paid",
+        "travel_date",
+        "seats",
+    )
+
     ticket_id: int
     bus_id: str
     passenger_name: str
@@ -16,6 +34,8 @@ class Ticket:
     departure_time: str
     seat_count: int
     price_paid: int
+    travel_date: str
+    seats: List[int]
 
     def __init__(
         self,
@@ -29,6 +49,8 @@ class Ticket:
         departure_time: str,
         seat_count: int,
         price_paid: int,
+        travel_date: str = "",
+        seats: Optional[Iterable[int]] = None,
     ) -> None:
         if seat_count <= 0:
             raise ValueError("Seat count must be positive")
@@ -45,6 +67,8 @@ class Ticket:
         self.departure_time = departure_time.strip()
         self.seat_count = int(seat_count)
         self.price_paid = int(price_paid)
+        self.travel_date = (travel_date or "").strip()
+        self.seats = sorted(int(s) for s in seats or ())
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -58,10 +82,61 @@ class Ticket:
             "departure_time": self.departure_time,
             "seat_count": self.seat_count,
             "price_paid": self.price_paid,
+            "travel_date": self.travel_date,
+            "seats": self.seats,
         }
 
     @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "Ticket":
+    def trusted(
+        ticket_id: int,
+        bus_id: str,
+        passenger_name: str,
+        contact_number: str,
+        bus_name: str,
+        origin: str,
+        destination: str,
+        departure_time: str,
+        seat_count: int,
+        price_paid: int,
+        travel_date: str = "",
+        seats: Iterable[int] = (),
+    ) -> "Ticket":
+        """Rebuild a ticket a store wrote itself, skipping validation.
+
+        Bus and route strings are interned so a large history shares them.
+        """
+        t = object.__new__(Ticket)
+        t.ticket_id = ticket_id
+        t.bus_id = intern(bus_id)
+        t.passenger_name = passenger_name
+        t.contact_number = contact_number
+        t.bus_name = intern(bus_name)
+        t.origin = intern(origin)
+        t.destination = intern(destination)
+        t.departure_time = intern(departure_time)
+        t.seat_count = seat_count
+        t.price_paid = price_paid
+        t.travel_date = intern(travel_date)
+        t.seats = list(seats)
+        return t
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any], trusted: bool = False) -> "Ticket":
+        if trusted:
+            return Ticket.trusted(
+                data["ticket_id"],
+                data["bus_id"],
+                data["passenger_name"],
+                data["contact_number"],
+                data["bus_name"],
+                data["origin"],
+                data["destination"],
+                data["departure_time"],
+                data["seat_count"],
+                data["price_paid"],
+                data.get("travel_date") or "",
+                data.get("seats") or (),
+            )
         return Ticket(
             ticket_id=int(data["ticket_id"]),
             bus_id=data["bus_id"],
@@ -73,6 +148,6 @@ class Ticket:
             departure_time=data["departure_time"],
             seat_count=int(data["seat_count"]),
             price_paid=int(data["price_paid"]),
+            travel_date=data.get("travel_date", ""),
+            seats=data.get("seats", []),
         )
-
-
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Set
+
+from ticket_table import TicketTable
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def contact_key(contact: str) -> str:
+    # Phone numbers compare by their digits (keeping a leading +), so
+    # "017-1234 5678" finds "01712345678".
+    contact = contact.strip()
+    digits = _NON_DIGITS.sub("", contact)
+    if not digits:
+        return contact.casefold()
+    return "+" + digits if contact.startswith("+") else digits
+
+
+def name_key(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+def _grams(key: str) -> Set[str]:
+    # Trigrams for substring queries, plus "^"-marked one- and two-character
+    # prefixes for queries too short to have a trigram.
+    grams = {key[i : i + 3] for i in range(len(key) - 2)}
+    grams.update("^" + key[:n] for n in (1, 2) if key)
+    return grams
+
+
+class TicketIndex:
+    """Tickets by contact number and passenger name.
+
+    Rows sit in a TicketTable. Contacts map straight to ticket IDs. Each
+    distinct passenger name gets an id, and its trigrams point back at it,
+    so a query of three or more characters matches anywhere in a name by
+    checking only the names sharing its rarest trigram; shorter queries
+    match the start of the name.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()) -> None:
+        self.table = TicketTable()
+        self._by_contact: Dict[str, List[int]] = {}
+        self._name_ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._name_tickets: List[List[int]] = []
+        self._grams: Dict[str, List[int]] = {}
+        for row in rows:
+            self.add(row)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        ticket_id = int(row["ticket_id"])
+        self.remove(ticket_id)
+        self.table.put_row(ticket_id, row)
+        contact = contact_key(row["contact_number"])
+        self._by_contact.setdefault(contact, []).append(ticket_id)
+        self._name_tickets[self._name_id(row["passenger_name"])].append(ticket_id)
+
+    def _name_id(self, name: str) -> int:
+        key = name_key(name)
+        name_id = self._name_ids.get(key)
+        if name_id is None:
+            name_id = self._name_ids[key] = len(self._names)
+            self._names.append(key)
+            self._name_tickets.append([])
+            for gram in _grams(key):
+                self._grams.setdefault(gram, []).append(name_id)
+        return name_id
+
+    def remove(self, ticket_id: int) -> None:
+        ticket = self.table.pop(ticket_id)
+        if ticket is None:
+            return
+        contact = contact_key(ticket.contact_number)
+        ids = self._by_contact[contact]
+        ids.remove(ticket_id)
+        if not ids:
+            del self._by_contact[contact]
+        # Names keep their id once seen; an empty name simply matches nothing.
+        self._name_tickets[self._name_ids[name_key(ticket.passenger_name)]].remove(
+            ticket_id
+        )
+
+    def remove_range(self, first: int, stop: int) -> None:
+        ids = self.table.column("ticket_id")
+        for ticket_id in ids[bisect_left(ids, first) : bisect_left(ids, stop)]:
+            self.remove(ticket_id)
+
+    def find(self, contact: str = "", passenger: str = "") -> List[int]:
+        if not contact and not passenger:
+            return []
+        found: Set[int] = set()
+        if contact:
+            found = set(self._by_contact.get(contact_key(contact), ()))
+        if passenger:
+            by_name: Set[int] = set()
+            for name_id in self._matching_names(name_key(passenger)):
+                by_name.update(self._name_tickets[name_id])
+            found = found & by_name if contact else by_name
+        return sorted(found)
+
+    def _matching_names(self, key: str) -> List[int]:
+        if not key:
+            return []
+        if len(key) < 3:
+            return self._grams.get("^" + key, [])
+        candidates = []
+        for gram in _grams(key):
+            if gram.startswith("^"):
+                continue
+            names = self._grams.get(gram)
+            if not names:
+                return []
+            candidates.append(names)
+        rarest = min(candidates, key=len)
+        return [n for n in rarest if key in self._names[n]]
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class TicketLog:
+    """Tickets as JSON lines, split into chunk files by ticket ID.
+
+    A booking appends a line to its chunk and a cancellation rewrites only
+    that chunk, so neither touches the rest of the history. Reads stream
+    one chunk at a time, and a lookup by ID reads a single chunk. Callers
+    serialize writes (the stores hold their file lock); readers need no
+    lock because chunks are replaced by rename and torn lines are skipped.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = 1000) -> None:
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, chunk: int) -> str:
+        return os.path.join(self.directory, f"{chunk:08d}.jsonl")
+
+    def _marker(self) -> str:
+        return os.path.join(self.directory, "version")
+
+    def version(self) -> Tuple:
+        # Touched after every write, so a reader that saw this token before
+        # looking at the chunks can tell whether it may have missed one.
+        try:
+            return (os.stat(self._marker()).st_mtime_ns,)
+        except FileNotFoundError:
+            return ()
+
+    def _touch(self) -> None:
+        path = self._marker()
+        ns = time.time_ns()
+        try:
+            ns = max(ns, os.stat(path).st_mtime_ns + 1)
+        except FileNotFoundError:
+            open(path, "w").close()
+        os.utime(path, ns=(ns, ns))
+
+    def chunk_of(self, ticket_id: int) -> int:
+        return ticket_id // self.chunk_size
+
+    def chunk_stats(self) -> Dict[int, Tuple[int, int, int]]:
+        """Inode, size and mtime of every chunk; rewrites and appends change it."""
+        stats = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.endswith(".jsonl") and name[:-6].isdigit():
+                    stats[int(name[:-6])] = _stat_key(entry.stat())
+        return stats
+
+    def chunk_stat(self, chunk: int) -> Optional[Tuple[int, int, int]]:
+        try:
+            return _stat_key(os.stat(self._path(chunk)))
+        except FileNotFoundError:
+            return None
+
+    def chunk_rows(self, chunk: int) -> Iterator[Dict[str, Any]]:
+        return self._read(self._path(chunk))
+
+    def _chunks(self) -> List[int]:
+        return sorted(
+            int(name[:-6])
+            for name in os.listdir(self.directory)
+            if name.endswith(".jsonl") and name[:-6].isdigit()
+        )
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Torn append from a crash; the next append drops it.
+                    break
+                yield json.loads(raw)
+
+    def _rewrite(self, chunk: int, rows: List[Dict[str, Any]]) -> None:
+        path = self._path(chunk)
+        if not rows:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(_line(row) for row in rows)
+        os.replace(tmp_path, path)
+
+    def _group(self, rows: Iterable[Dict[str, Any]]) -> Dict[int, List[Dict]]:
+        chunks: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            chunk = self.chunk_of(int(row["ticket_id"]))
+            chunks.setdefault(chunk, []).append(row)
+        return chunks
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for chunk in self._chunks():
+            yield from self._read(self._path(chunk))
+
+    def rows_after(self, ticket_id: int) -> Iterator[Dict[str, Any]]:
+        """Rows with higher IDs, in ID order, skipping the chunks below."""
+        first = self.chunk_of(ticket_id + 1)
+        for chunk in self._chunks():
+            if chunk < first:
+                continue
+            rows = sorted(
+                self._read(self._path(chunk)), key=lambda row: int(row["ticket_id"])
+            )
+            for row in rows:
+                if int(row["ticket_id"]) > ticket_id:
+                    yield row
+
+    def _by_chunk(self, ticket_ids: Iterable[int]) -> Dict[int, Set[int]]:
+        wanted: Dict[int, Set[int]] = {}
+        for ticket_id in ticket_ids:
+            wanted.setdefault(self.chunk_of(ticket_id), set()).add(ticket_id)
+        return wanted
+
+    def existing(self, ticket_ids: Iterable[int]) -> Set[int]:
+        """The given IDs that are in the log, reading only their chunks."""
+        found = set()
+        for chunk, ids in self._by_chunk(ticket_ids).items():
+            for row in self._read(self._path(chunk)):
+                if int(row["ticket_id"]) in ids:
+                    found.add(int(row["ticket_id"]))
+        return found
+
+    def get(self, ticket_id: int) -> Optional[Dict[str, Any]]:
+        for row in self._read(self._path(self.chunk_of(ticket_id))):
+            if int(row["ticket_id"]) == ticket_id:
+                return row
+        return None
+
+    def append(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for chunk, group in self._group(rows).items():
+            with open(self._path(chunk), "ab+") as f:
+                end = f.tell()
+                if end:
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        f.seek(0)
+                        f.truncate(f.read().rfind(b"\n") + 1)
+                        f.seek(0, os.SEEK_END)
+                f.write("".join(_line(row) for row in group).encode("utf-8"))
+        self._touch()
+
+    def remove(self, ticket_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Drop tickets by ID and return the rows that were there."""
+        removed: Dict[int, Dict[str, Any]] = {}
+        for chunk, ids in self._by_chunk(ticket_ids).items():
+            kept = []
+            for row in self._read(self._path(chunk)):
+                ticket_id = int(row["ticket_id"])
+                if ticket_id in ids:
+                    removed[ticket_id] = row
+                else:
+                    kept.append(row)
+            if any(i in removed for i in ids):
+                self._rewrite(chunk, kept)
+        if removed:
+            self._touch()
+        return removed
+
+    def replace_all(self, rows: Iterable[Dict[str, Any]]) -> None:
+        chunks = self._group(rows)
+        for chunk in self._chunks():
+            if chunk not in chunks:
+                self._rewrite(chunk, [])
+        for chunk, group in chunks.items():
+            self._rewrite(chunk, group)
+        self._touch()
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _line(row: Dict[str, Any]) -> str:
+    return json.dumps(row, separators=(",", ":")) + "\n"
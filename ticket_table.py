@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from seat_map import seat_bits, seat_numbers
+from ticket import Ticket
+
+# Columns holding one of a few hundred distinct strings (bus names, routes,
+# times, dates) store an index into a shared pool instead of the string.
+_POOLED = (
+    "bus_id",
+    "bus_name",
+    "origin",
+    "destination",
+    "departure_time",
+    "travel_date",
+)
+_NUMERIC = {"ticket_id": "q", "seat_count": "i", "price_paid": "q"}
+
+
+class _StringPool:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        idx = self._index.get(value)
+        if idx is None:
+            idx = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+
+class TicketTable:
+    """Tickets stored column by column, ordered by ticket ID.
+
+    Numbers and pooled string indexes live in ``array`` columns; passenger
+    names and contacts, which rarely repeat, stay in lists. A ``Ticket`` is
+    only built when one is looked up or iterated. It quacks like the
+    ``{ticket_id: Ticket}`` dict BookingSystem otherwise keeps.
+    """
+
+    def __init__(self, tickets: Iterable[Ticket] = ()) -> None:
+        self._pool = _StringPool()
+        self._numbers: Dict[str, array] = {k: array(t) for k, t in _NUMERIC.items()}
+        self._pooled: Dict[str, array] = {k: array("i") for k in _POOLED}
+        self._passengers: List[str] = []
+        self._contacts: List[str] = []
+        self._seats: List[int] = []
+        for t in tickets:
+            self[t.ticket_id] = t
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, Any]]) -> "TicketTable":
+        # Straight from a store's ticket dicts, without building Tickets.
+        table = cls()
+        for data in rows:
+            table.put_row(int(data["ticket_id"]), data)
+        return table
+
+    def __len__(self) -> int:
+        return len(self._numbers["ticket_id"])
+
+    def __contains__(self, ticket_id: object) -> bool:
+        return self._row(ticket_id) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._numbers["ticket_id"])
+
+    def _row(self, ticket_id: object) -> Optional[int]:
+        ids = self._numbers["ticket_id"]
+        row = bisect_left(ids, ticket_id)
+        if row < len(ids) and ids[row] == ticket_id:
+            return row
+        return None
+
+    def column(self, name: str) -> Any:
+        """A numeric or pooled column, e.g. for ``numpy.frombuffer``."""
+        if name in self._numbers:
+            return self._numbers[name]
+        return self._pooled[name]
+
+    @property
+    def strings(self) -> List[str]:
+        return self._pool.strings
+
+    def _insert(self, row: int, data: Dict[str, Any]) -> None:
+        for name, col in self._numbers.items():
+            col.insert(row, int(data[name]))
+        for name, col in self._pooled.items():
+            col.insert(row, self._pool.add(data.get(name) or ""))
+        self._passengers.insert(row, data["passenger_name"])
+        self._contacts.insert(row, data["contact_number"])
+        self._seats.insert(row, seat_bits(data.get("seats") or ()))
+
+    def _delete(self, row: int) -> None:
+        for col in self._numbers.values():
+            del col[row]
+        for col in self._pooled.values():
+            del col[row]
+        del self._passengers[row]
+        del self._contacts[row]
+        del self._seats[row]
+
+    def _ticket(self, row: int) -> Ticket:
+        strings = self._pool.strings
+        pooled = self._pooled
+        return Ticket.trusted(
+            self._numbers["ticket_id"][row],
+            strings[pooled["bus_id"][row]],
+            self._passengers[row],
+            self._contacts[row],
+            strings[pooled["bus_name"][row]],
+            strings[pooled["origin"][row]],
+            strings[pooled["destination"][row]],
+            strings[pooled["departure_time"][row]],
+            self._numbers["seat_count"][row],
+            self._numbers["price_paid"][row],
+            strings[pooled["travel_date"][row]],
+            seat_numbers(self._seats[row]),
+        )
+
+    def __getitem__(self, ticket_id: int) -> Ticket:
+        row = self._row(ticket_id)
+        if row is None:
+            raise KeyError(ticket_id)
+        return self._ticket(row)
+
+    def __setitem__(self, ticket_id: int, ticket: Ticket) -> None:
+        self.put_row(ticket_id, ticket.to_dict())
+
+    def put_row(self, ticket_id: int, data: Dict[str, Any]) -> None:
+        # IDs come from ascending blocks, so this is nearly always an append.
+        ids = self._numbers["ticket_id"]
+        if ids and ids[-1] < ticket_id:
+            row = len(ids)
+        else:
+            row = bisect_left(ids, ticket_id)
+            if row < len(ids) and ids[row] == ticket_id:
+                self._delete(row)
+        self._insert(row, data)
+
+    def get(self, ticket_id: int, default: Optional[Ticket] = None) -> Optional[Ticket]:
+        row = self._row(ticket_id)
+        return default if row is None else self._ticket(row)
+
+    def pop(self, ticket_id: int, default: Optional[Ticket] = None) -> Optional[Ticket]:
+        row = self._row(ticket_id)
+        if row is None:
+            return default
+        ticket = self._ticket(row)
+        self._delete(row)
+        return ticket
+
+    def values(self) -> Iterator[Ticket]:
+        return (self._ticket(row) for row in range(len(self)))
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import functools
+import gzip
+import itertools
+import json
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from booking_system import STORE_BACKENDS, DataStore, make_store, seat_numbers_error
+from bus import Bus
+from ticket import Ticket
+from trips import parse_travel_date
+
+FORMATS = ("csv", "jsonl")
+BUS_FIELDS = (
+    "name",
+    "origin",
+    "destination",
+    "departure_time",
+    "total_seats",
+    "price_per_ticket",
+)
+TICKET_FIELDS = (
+    "ticket_id",
+    "bus_id",
+    "passenger_name",
+    "contact_number",
+    "bus_name",
+    "origin",
+    "destination",
+    "departure_time",
+    "seat_count",
+    "price_paid",
+    "travel_date",
+    "seats",
+)
+DEFAULT_BATCH_SIZE = 1000
+
+Row = Tuple[int, Any, Optional[str]]
+BusKey = Tuple[str, str, str, str]
+
+
+def file_format(path: str, given: Optional[str] = None) -> str:
+    """``given``, else guessed from the extension (``.gz`` aside); JSON lines
+    unless the name ends in ``.csv``."""
+    if given:
+        return given
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+
+def open_text(path: str, mode: str) -> IO[str]:
+    """A file, gzip-compressed if it ends in ``.gz``; ``-`` is stdin/stdout."""
+    if path == "-":
+        stream = sys.stdin if mode == "r" else sys.stdout
+        # Not ours to close.
+        return open(stream.fileno(), mode, encoding="utf-8", newline="", closefd=False)
+    if path.endswith(".gz"):
+        # gzip's own default level: much faster than 9 for a little more size.
+        return gzip.open(
+            path, mode + "t", compresslevel=6, encoding="utf-8", newline=""
+        )
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def parse_bus(row: Dict[str, Any]) -> Bus:
+    # A timetable row: seats sold are restored by importing the tickets.
+    return Bus.from_dict({field: row[field] for field in BUS_FIELDS})
+
+
+def parse_ticket(
+    row: Dict[str, Any], capacities: Optional[Dict[BusKey, int]] = None
+) -> Ticket:
+    """A ticket row, with its seat numbers checked against the bus's size
+    when ``capacities`` (total seats by bus) knows the bus."""
+    seats = row.get("seats")
+    if isinstance(seats, str):
+        row["seats"] = seats.replace(",", " ").split()
+    ticket = Ticket.from_dict(row)
+    if ticket.ticket_id <= 0:
+        raise ValueError("Ticket ID must be positive")
+    if ticket.travel_date:
+        ticket.travel_date = parse_travel_date(ticket.travel_date).isoformat()
+    if ticket.seats:
+        key = (
+            ticket.bus_name,
+            ticket.origin,
+            ticket.destination,
+            ticket.departure_time,
+        )
+        total = capacities.get(key) if capacities else None
+        error = seat_numbers_error(ticket.seats, ticket.seat_count, total)
+        if error:
+            raise ValueError(error)
+    return ticket
+
+
+def bus_capacities(store: DataStore) -> Dict[BusKey, int]:
+    return {
+        (b.name, b.origin, b.destination, b.departure_time): b.total_seats
+        for b in store.load_buses()
+    }
+
+
+def read_rows(
+    f: IO[str], fmt: str, parse: Callable[[Dict[str, Any]], Any]
+) -> Iterator[Row]:
+    """``(line, parsed, None)`` for each good row and ``(line, None, reason)``
+    for each bad one, reading one row at a time."""
+    rows: Iterable[Tuple[int, Any]]
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        # Empty cells are missing fields, so their defaults apply.
+        rows = (
+            (reader.line_num, {k: v for k, v in row.items() if k and v})
+            for row in reader
+        )
+    else:
+        rows = ((n, line) for n, line in enumerate(f, start=1) if line.strip())
+    for line, row in rows:
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            yield line, parse(row), None
+        except KeyError as e:
+            yield line, None, f"Missing field {e}"
+        except (ValueError, TypeError, AttributeError) as e:
+            yield line, None, str(e) or type(e).__name__
+
+
+def batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_rows(
+    rows: Iterable[Row],
+    write: Callable[[List[Any]], List[Optional[str]]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    report: Optional[Callable[[int, str], None]] = None,
+) -> Tuple[int, int]:
+    """Hand parsed rows to ``write`` (a store's ``upsert_buses`` or
+    ``import_tickets``) ``batch_size`` at a time, so only one batch is in
+    memory and the store is written once per batch. Returns the number of
+    rows imported and rejected; ``report`` gets the line and reason for each
+    rejected row."""
+    imported = rejected = 0
+    for batch in batches(rows, batch_size):
+        good = [(line, item) for line, item, error in batch if error is None]
+        errors: List[Tuple[int, str]] = [
+            (line, error) for line, _, error in batch if error is not None
+        ]
+        results = write([item for _, item in good]) if good else []
+        for (line, _), error in zip(good, results):
+            if error:
+                errors.append((line, error))
+            else:
+                imported += 1
+        rejected += len(errors)
+        if report:
+            for line, error in sorted(errors):
+                report(line, error)
+    return imported, rejected
+
+
+def row_writer(f: IO[str], fmt: str, fields: Tuple[str, ...]) -> Callable[[Dict], None]:
+    if fmt == "jsonl":
+        return lambda row: f.write(
+            json.dumps({k: row[k] for k in fields}, separators=(",", ":")) + "\n"
+        )
+    writer = csv.DictWriter(f, fields, extrasaction="ignore")
+    writer.writeheader()
+
+    def write(row: Dict) -> None:
+        if "seats" in row:
+            row = dict(row, seats=" ".join(str(s) for s in row["seats"]))
+        writer.writerow(row)
+
+    return write
+
+
+def export_tickets(
+    store: DataStore, f: IO[str], fmt: str, since: int = 0
+) -> Tuple[int, int]:
+    """Stream tickets with IDs above ``since`` to ``f`` in ID order. Returns
+    how many were written and the last ID, to pass as ``since`` next time."""
+    write = row_writer(f, fmt, TICKET_FIELDS)
+    count, last = 0, since
+    for ticket in store.iter_tickets(since=since):
+        write(ticket.to_dict())
+        count += 1
+        last = ticket.ticket_id
+    return count, last
+
+
+def export_buses(store: DataStore, f: IO[str], fmt: str) -> int:
+    write = row_writer(f, fmt, BUS_FIELDS)
+    buses = store.load_buses()
+    for bus in buses:
+        write(bus.to_dict())
+    return len(buses)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Bulk import and export of buses and tickets as CSV or "
+        "JSON lines (gzipped if the file name ends in .gz)."
+    )
+    parser.add_argument("--backend", choices=STORE_BACKENDS, default="json")
+    parser.add_argument("--store", help="Path to the data store file")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the extension")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, description in (
+        ("buses", "Add buses, updating those already stored"),
+        ("tickets", "Add tickets under their own IDs"),
+    ):
+        sub = commands.add_parser(f"import-{name}", help=description)
+        sub.add_argument("file", help="input file, or - for stdin")
+        sub.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    sub = commands.add_parser("export-buses", help="Write every bus")
+    sub.add_argument("file", nargs="?", default="-")
+    sub = commands.add_parser("export-tickets", help="Write tickets in ID order")
+    sub.add_argument("file", nargs="?", default="-")
+    sub.add_argument(
+        "--since", type=int, default=0, help="only tickets with higher IDs"
+    )
+    args = parser.parse_args(argv)
+    if getattr(args, "batch_size", 1) <= 0:
+        parser.error("--batch-size must be positive")
+
+    try:
+        store = make_store(args.backend, args.store)
+        # The JSON stores only parse the file when first read.
+        store.load_buses()
+    except (OSError, ValueError, sqlite3.DatabaseError) as e:
+        print(f"Cannot open the {args.backend} store: {e}", file=sys.stderr)
+        return 2
+    fmt = file_format(args.file, args.format)
+    try:
+        if args.command.startswith("import-"):
+            parse: Callable[[Dict[str, Any]], Any]
+            if args.command == "import-buses":
+                parse, write = parse_bus, store.upsert_buses
+            else:
+                parse = functools.partial(
+                    parse_ticket, capacities=bus_capacities(store)
+                )
+                write = store.import_tickets
+
+            def report(line: int, error: str) -> None:
+                print(f"{args.file}:{line}: {error}", file=sys.stderr)
+
+            with open_text(args.file, "r") as f:
+                imported, rejected = import_rows(
+                    read_rows(f, fmt, parse), write, args.batch_size, report
+                )
+            print(f"Imported {imported}, rejected {rejected}", file=sys.stderr)
+            return 1 if rejected else 0
+        with open_text(args.file, "w") as f:
+            if args.command == "export-buses":
+                count = export_buses(store, f, fmt)
+                print(f"Exported {count} buses", file=sys.stderr)
+            else:
+                count, last = export_tickets(store, f, fmt, args.since)
+                print(f"Exported {count} tickets, last ID {last}", file=sys.stderr)
+        return 0
+    finally:
+        close = getattr(store, "close", None)
+        if close:
+            close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Dict, Optional, Union
+
+from bus import Bus
+from seat_map import count_seats, decode_seats, encode_seats, full_mask
+
+
+def trip_key(name: str, origin: str, destination: str, departure_time: str) -> str:
+    return "|".join((name, origin, destination, departure_time))
+
+
+def bus_trip_key(bus: Bus) -> str:
+    return trip_key(bus.name, bus.origin, bus.destination, bus.departure_time)
+
+
+def ticket_trip_key(ticket: Dict[str, Any]) -> str:
+    return trip_key(
+        ticket["bus_name"],
+        ticket["origin"],
+        ticket["destination"],
+        ticket["departure_time"],
+    )
+
+
+def parse_travel_date(value: Union[date, str]) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError("Travel date must be in YYYY-MM-DD format")
+
+
+@dataclass
+class Trip:
+    bus: Bus
+    travel_date: date
+    available_seats: int
+
+    @property
+    def departure(self) -> datetime:
+        try:
+            hour, minute = (int(p) for p in self.bus.departure_time.split(":"))
+            return datetime.combine(self.travel_date, time(hour, minute))
+        except ValueError:
+            return datetime.combine(self.travel_date, time())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bus_name": self.bus.name,
+            "origin": self.bus.origin,
+            "destination": self.bus.destination,
+            "travel_date": self.travel_date.isoformat(),
+            "departure_time": self.bus.departure_time,
+            "total_seats": self.bus.total_seats,
+            "price_per_ticket": self.bus.price_per_ticket,
+            "available_seats": self.available_seats,
+        }
+
+
+class TripInventory:
+    """Seat maps of dated departures, bucketed by travel date.
+
+    Each map is an int with one bit per taken seat (see ``seat_map``).
+    Departures with nothing sold have no entry, so memory grows with
+    bookings rather than with fleet size times the booking horizon.
+    """
+
+    def __init__(self, seat_maps: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+        self._taken: Dict[str, Dict[str, int]] = {
+            day: {key: decode_seats(bits) for key, bits in trips.items()}
+            for day, trips in (seat_maps or {}).items()
+        }
+
+    def taken(self, bus: Bus, day: str) -> int:
+        return self._taken.get(day, {}).get(bus_trip_key(bus), 0)
+
+    def available(self, bus: Bus, day: str) -> int:
+        return bus.total_seats - count_seats(self.taken(bus, day))
+
+    def reserve(self, bus: Bus, day: str, bits: int) -> bool:
+        taken = self.taken(bus, day)
+        if not bits or taken & bits or bits > full_mask(bus.total_seats):
+            return False
+        self._taken.setdefault(day, {})[bus_trip_key(bus)] = taken | bits
+        return True
+
+    def release(self, bus: Bus, day: str, bits: int) -> None:
+        bucket = self._taken.get(day, {})
+        key = bus_trip_key(bus)
+        remaining = bucket.get(key, 0) & ~bits
+        if remaining:
+            bucket[key] = remaining
+        else:
+            _drop(self._taken, day, key)
+
+
+def take_trip_seats(
+    trips: Dict[str, Dict[str, str]], day: str, key: str, bits: int
+) -> None:
+    bucket = trips.setdefault(day, {})
+    bucket[key] = encode_seats(decode_seats(bucket.get(key, "")) | bits)
+
+
+def release_trip(
+    trips: Dict[str, Dict[str, str]], day: str, key: str, bits: int
+) -> None:
+    remaining = decode_seats(trips.get(day, {}).get(key, "")) & ~bits
+    if remaining:
+        trips[day][key] = encode_seats(remaining)
+    else:
+        _drop(trips, day, key)
+
+
+def _drop(trips: Dict[str, Dict[str, Any]], day: str, key: str) -> None:
+    bucket = trips.get(day)
+    if bucket is not None:
+        bucket.pop(key, None)
+        if not bucket:
+            del trips[day]
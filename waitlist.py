@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from trips import trip_key
+
+
+@dataclass
+class WaitlistEntry:
+    """A booking waiting for seats on one departure of a bus."""
+
+    entry_id: int
+    bus_name: str
+    origin: str
+    destination: str
+    departure_time: str
+    travel_date: str
+    passenger_name: str
+    contact_number: str
+    seat_count: int
+    seat_preference: str = ""
+    # Higher goes first; equal priorities are served in joining order.
+    priority: int = 0
+    joined_at: float = 0.0
+
+    @property
+    def trip_key(self) -> str:
+        return trip_key(
+            self.bus_name, self.origin, self.destination, self.departure_time
+        )
+
+    @property
+    def rank(self) -> Tuple[int, int]:
+        return (-self.priority, self.entry_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "WaitlistEntry":
+        return WaitlistEntry(**data)
+
+
+class WaitlistQueues:
+    """Waiting entries grouped by departure (trip key and travel date).
+
+    Each departure's entries are kept sorted by rank, so finding who to
+    promote when seats free up reads only that departure's queue, and only
+    as far as the freed seats reach.
+    """
+
+    def __init__(self, entries: Iterable[WaitlistEntry] = ()) -> None:
+        self._entries: Dict[int, WaitlistEntry] = {}
+        self._queues: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entry_id: int) -> bool:
+        return entry_id in self._entries
+
+    def add(self, entry: WaitlistEntry) -> None:
+        self.remove(entry.entry_id)
+        self._entries[entry.entry_id] = entry
+        queue = self._queues.setdefault((entry.trip_key, entry.travel_date), [])
+        bisect.insort(queue, entry.rank)
+
+    def remove(self, entry_id: int) -> Optional[WaitlistEntry]:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return None
+        key = (entry.trip_key, entry.travel_date)
+        queue = self._queues[key]
+        del queue[bisect.bisect_left(queue, entry.rank)]
+        if not queue:
+            del self._queues[key]
+        return entry
+
+    def head(self, trip: str, travel_date: str, limit: int) -> List[WaitlistEntry]:
+        """Up to ``limit`` entries for a departure, next to promote first."""
+        queue = self._queues.get((trip, travel_date), [])
+        return [self._entries[entry_id] for _, entry_id in queue[:limit]]
+
+    def entries(self) -> List[WaitlistEntry]:
+        return sorted(self._entries.values(), key=lambda e: e.entry_id)
+
+    def departures(self) -> List[Tuple[str, str]]:
+        return list(self._queues)
+
+
+class WaitlistLog:
+    """The JSON stores' waitlist: a JSON-lines file of joins and removals
+    beside the store file.
+
+    Each process keeps the queues in memory and replays only the lines
+    appended since it last looked. Once removals outnumber the waiting
+    entries, the file is rewritten with just those entries. Callers hold
+    the store's lock for every call.
+    """
+
+    def __init__(self, path: str, compact_after: int = 1000) -> None:
+        self.path = path
+        self.compact_after = compact_after
+        self.queues = WaitlistQueues()
+        self._next_id = 1
+        self._offset = 0
+        self._lines = 0
+        self._inode: Optional[int] = None
+
+    def sync(self) -> WaitlistQueues:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._inode or st.st_size < self._offset:
+            # New or rewritten file: start over from its first line.
+            self.queues = WaitlistQueues()
+            self._next_id = 1
+            self._offset = 0
+            self._lines = 0
+            self._inode = st.st_ino if st is not None else None
+        if st is None or st.st_size == self._offset:
+            return self.queues
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Torn write from a crash; the next append drops it.
+                    break
+                self._offset += len(raw)
+                self._lines += 1
+                self._apply(json.loads(raw))
+        return self.queues
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        if record["op"] == "add":
+            entry = WaitlistEntry.from_dict(record["entry"])
+            self.queues.add(entry)
+            self._next_id = max(self._next_id, entry.entry_id + 1)
+        elif record["op"] == "remove":
+            for entry_id in record["ids"]:
+                self.queues.remove(entry_id)
+        elif record["op"] == "next":
+            self._next_id = max(self._next_id, record["next"])
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        raw = "".join(_line(r) for r in records).encode("utf-8")
+        with open(self.path, "ab") as f:
+            if f.tell() > self._offset:
+                f.truncate(self._offset)
+            f.write(raw)
+        self.sync()
+
+    def add(self, entries: List[WaitlistEntry]) -> List[WaitlistEntry]:
+        """Queue entries; those with ``entry_id`` 0 get the next free IDs,
+        others (put back after a failed promotion) keep theirs."""
+        self.sync()
+        for entry in entries:
+            if not entry.entry_id:
+                entry.entry_id = self._next_id
+                self._next_id += 1
+        self._append([{"op": "add", "entry": e.to_dict()} for e in entries])
+        return entries
+
+    def remove(self, entry_ids: Iterable[int]) -> List[bool]:
+        """Dequeue entries, reporting which were still waiting. Another
+        process may have promoted or removed the rest already."""
+        queues = self.sync()
+        removed: Dict[int, None] = {}
+        found = []
+        for entry_id in entry_ids:
+            waiting = entry_id in queues and entry_id not in removed
+            found.append(waiting)
+            if waiting:
+                removed[entry_id] = None
+        if removed:
+            self._append([{"op": "remove", "ids": list(removed)}])
+            if self._lines >= self.compact_after and self._lines > 2 * len(self.queues):
+                self._compact()
+        return found
+
+    def _compact(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_line({"op": "next", "next": self._next_id}))
+            for entry in self.queues.entries():
+                f.write(_line({"op": "add", "entry": entry.to_dict()}))
+        os.replace(tmp_path, self.path)
+        self.sync()
+
+
+def _line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"